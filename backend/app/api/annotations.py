@@ -1,14 +1,23 @@
+import os
+import tempfile
 from datetime import datetime, timezone
 from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel, Field
 
 from app.db import get_database
 from app.db.repositories.annotation_repo import AnnotationRepository
 from app.db.repositories.annotation_version_repo import AnnotationVersionRepository
-from app.utils.permissions import get_current_user, require_permission
+from app.db.repositories.template_repo import TemplateRepository
+from app.services.annotation_import_service import (
+    IMPORT_MODES,
+    detect_format,
+    import_jobs,
+    run_import_job,
+)
+from app.utils.permissions import get_current_user, has_permission, require_permission
 
 router = APIRouter(prefix="/api/annotations", tags=["标注"])
 
@@ -65,6 +74,77 @@ def _serialize_version(version: Dict, *, current_user_id: Optional[str]) -> Dict
     }
 
 
+@router.post("/import")
+@require_permission("annotations.create")
+async def import_annotations(
+    request: Request,
+    file: UploadFile = File(...),
+    template_id: str = Form(..., alias="templateId"),
+    fmt: Optional[str] = Form(None, alias="format"),
+    mode: str = Form("replace"),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+) -> Dict:
+    """上传 CSV/JSONL 批量导入标注，后台执行并返回任务ID"""
+
+    current_user = get_current_user(request)
+    user_id = current_user.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="未认证用户无法导入标注")
+
+    if mode not in IMPORT_MODES:
+        raise HTTPException(status_code=400, detail=f"不支持的导入模式: {mode}")
+
+    try:
+        import_format = detect_format(file.filename or "", fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    template = await TemplateRepository(db).find_by_id(template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    # 上传文件在请求结束后会被关闭，先落盘供后台任务读取
+    fd, tmp_path = tempfile.mkstemp(suffix=f".{import_format}")
+    with os.fdopen(fd, "wb") as out:
+        while chunk := await file.read(1 << 20):
+            out.write(chunk)
+
+    job = import_jobs.create(
+        file_name=file.filename or tmp_path,
+        template_id=template_id,
+        user_id=user_id,
+        mode=mode,
+    )
+    import_jobs.start(
+        job,
+        run_import_job(
+            db,
+            job,
+            path=tmp_path,
+            fmt=import_format,
+            template=template,
+            username=current_user.get("username"),
+        ),
+    )
+    return job.to_dict()
+
+
+@router.get("/import/{job_id}")
+@require_permission("annotations.create")
+async def get_import_job(job_id: str, request: Request) -> Dict:
+    """查询导入任务进度"""
+
+    job = import_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+
+    current_user = get_current_user(request)
+    if job.user_id != current_user.get("user_id"):
+        raise HTTPException(status_code=403, detail="仅任务发起者可查看")
+
+    return job.to_dict()
+
+
 @router.get("/{file_id:path}/trials/{trial_index}")
 @require_permission("annotations.view")
 async def get_annotations(
@@ -245,7 +325,7 @@ async def delete_version(
         raise HTTPException(status_code=404, detail="未找到目标版本")
 
     # 允许拥有者或具备删除权限的角色执行
-    if version.get("userId") != user_id and "annotations.delete" not in current_user.get("permissions", []):
+    if version.get("userId") != user_id and not has_permission(request, "annotations.delete"):
         raise HTTPException(status_code=403, detail="仅拥有者可删除该版本")
 
     await annotation_repo.delete_by_version(version_id)
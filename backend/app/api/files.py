@@ -1,16 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.config import settings
 from app.db import get_database
-from app.db.repositories.trial_metadata_repo import TrialMetadataRepository
+from app.db.repositories.trial_metadata_repo import (
+    LIGHTWEIGHT_FIELD_GROUPS,
+    TrialMetadataRepository,
+    parse_trial_fields,
+    project_trial_metadata,
+)
 from app.db.repositories.annotation_version_repo import AnnotationVersionRepository
 from app.db.repositories.annotation_repo import AnnotationRepository
 from app.services import h5_service
-from typing import List, Dict
+from app.services.metadata_revalidation_service import metadata_revalidator
+from app.services.dataset_catalog_service import dataset_catalog
+from app.services.admission_service import (
+    WAVEFORM_BYTES_PER_SAMPLE,
+    WAVEFORM_COMPACT_BYTES_PER_SAMPLE,
+    AdmissionTicket,
+    admission_controller,
+    derived_cost_bytes,
+    metadata_cost_bytes,
+)
+from app.services.single_flight import request_coalescer
+from app.services.sparkline_service import IncompleteRender, sparkline_service
+from app.services.trial_features import parse_trial_filters, parse_trial_sort
+from app.utils.http_cache import (
+    REVALIDATE_CACHE_CONTROL,
+    cache_headers,
+    etag_matches,
+    make_etag,
+    not_modified,
+    query_fingerprint,
+)
+from app.utils.responses import ORJSONResponse, dumps
+from app.utils.sparkline import render_png, render_sprite_png, render_svg
+from app.utils.waveform_encoding import encode_waveform
+from typing import AsyncIterator, List, Dict, Optional, Set, Tuple
 from pathlib import Path
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 router = APIRouter(prefix="/api/files", tags=["files"])
 
+# 单次批量波形请求最多包含的Trial数
+BATCH_WAVEFORM_MAX_TRIALS = 64
+# 缩略图雪碧图单次最多包含的Trial数
+SPARKLINE_SPRITE_MAX_TRIALS = 200
+SPARKLINE_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
 
 class FileStatusUpdate(BaseModel):
     finished: bool
@@ -20,11 +59,23 @@ class TrialStatusUpdate(BaseModel):
     finished: bool
 
 
+class BatchWaveformRequest(BaseModel):
+    """批量视口波形请求：窗口与降采样参数对所有Trial相同"""
+    trialIndices: List[int] = Field(..., min_length=1, max_length=BATCH_WAVEFORM_MAX_TRIALS)
+    start: Optional[float] = None
+    end: Optional[float] = None
+    maxPoints: Optional[int] = Field(2000, ge=16, le=200000)
+    method: str = Field("lttb", pattern="^(lttb|m4)$")
+    precision: str = Field("float64", pattern="^(float64|float32|int16)$")
+    delta: int = Field(1, ge=0, le=2)
+
+
 @router.get("")
 async def list_files(db: AsyncIOMotorDatabase = Depends(get_database)) -> List[Dict]:
     """获取所有H5文件列表"""
     try:
-        files = h5_service.scan_files()
+        # 文件清单与Trial数量来自持久化目录，请求路径上不遍历目录也不打开H5文件
+        files = await dataset_catalog.list_files(db)
 
         repo = TrialMetadataRepository(db)
         annotation_repo = AnnotationRepository(db)
@@ -33,9 +84,7 @@ async def list_files(db: AsyncIOMotorDatabase = Depends(get_database)) -> List[D
         status_map = await repo.get_status_map(file_ids)
         annotation_map = await annotation_repo.count_by_files(file_ids)
 
-        # 为每个文件添加trial数量
         for file_info in files:
-            file_info['trialCount'] = h5_service.load_trial_count(file_info['fullPath'])
             stats = status_map.get(file_info['fileId'], {
                 'totalTrials': 0,
                 'finishedTrials': 0
@@ -49,7 +98,7 @@ async def list_files(db: AsyncIOMotorDatabase = Depends(get_database)) -> List[D
             )
             file_info['hasStarted'] = any(count > 0 for count in annotation_counts.values())
 
-        return files
+        return ORJSONResponse(files)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to scan files: {str(e)}")
@@ -58,10 +107,40 @@ async def list_files(db: AsyncIOMotorDatabase = Depends(get_database)) -> List[D
 @router.get("/{file_id:path}/trials")
 async def list_trials(
     file_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = Query(
+        None,
+        description="逗号分隔的字段组：status,summary,counts,features,thumbnail,thumbnail.raw,thumbnail.filtered",
+    ),
+    sort: Optional[str] = Query(
+        None,
+        description="按特征排序，前缀 - 为降序：rms,peakToPeak,dominantFrequency,keypointCount,"
+                    "saturationFraction,flatlineFraction,duration,trialIndex",
+    ),
+    filters: Optional[List[str]] = Query(
+        None,
+        alias="filter",
+        description="特征筛选条件 (可重复或逗号分隔)，如 rms>=0.5、flatlineFraction<0.1",
+    ),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ) -> List[Dict]:
-    """获取文件的所有Trial元数据 (含缩略图)"""
+    """获取文件的Trial元数据 (默认全部且含缩略图，可分页与按字段组投影)
+
+    指定 sort 或 filter 时只查询已索引的特征，offset/limit 作用于排序后的结果；特征在后台计算，
+    尚无特征的Trial按序号排在已排序结果之后并标记 featuresPending (无法判断是否满足筛选条件)。
+    X-Total-Count 为两者之和，X-Ranked-Count 为已排序部分的数量，
+    X-Features-Pending 为排队计算的Trial数 (为 0 前排序可能变化)。
+    """
     try:
+        try:
+            groups = parse_trial_fields(fields)
+            sort_spec = parse_trial_sort(sort)
+            filter_query = parse_trial_filters(filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
         # 构建完整文件路径
         data_root = Path(h5_service.data_root)
         file_path = data_root / file_id
@@ -70,36 +149,52 @@ async def list_trials(
             raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
 
         # 获取trial数量
-        trial_count = h5_service.load_trial_count(str(file_path))
+        trial_count = await h5_service.get_trial_count(str(file_path))
+        end = trial_count if limit is None else min(trial_count, offset + limit)
 
-        if trial_count == 0:
+        if offset >= end:
             return []
 
-        # 创建Repository
-        repo = TrialMetadataRepository(db)
-        annotation_repo = AnnotationRepository(db)
-        version_repo = AnnotationVersionRepository(db)
-        annotation_map = await annotation_repo.count_by_files([file_id])
-        annotation_counts = annotation_map.get(file_id, {})
+        # 文件内容、处理参数与标注状态均未变化时直接返回304
+        fingerprint = h5_service.file_fingerprint(str(file_path))
+        etag = make_etag(
+            "trials",
+            file_id,
+            fingerprint,
+            h5_service.processing_fingerprint(),
+            await TrialMetadataRepository(db).get_file_state(file_id),
+            await AnnotationVersionRepository(db).get_file_state(file_id),
+            query_fingerprint(request),
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag)
 
-        # 加载所有trials的元数据 (使用缓存)
-        trials = []
-        for i in range(trial_count):
-            metadata = await repo.find_or_create(
-                file_id,
-                i,
-                lambda idx=i: h5_service.load_trial_metadata(str(file_path), idx)
+        if sort_spec is not None or filter_query:
+            # 排序与筛选只读数据库中的特征索引，不在请求时计算
+            trials, ranked, total, pending = await _load_ranked_trials(
+                db, file_id, str(file_path), trial_count, sort_spec, filter_query, offset, limit, groups
             )
-            metadata['annotationCount'] = annotation_counts.get(i, 0)
-            # 计算版本数量（每个Trial一个用户最多1个版本，但总体可能多人多版本）
-            try:
-                versions = await version_repo.list_versions(file_id, i)
-                metadata['versionCount'] = len(versions)
-            except Exception:
-                metadata['versionCount'] = 0
-            trials.append(metadata)
+            headers = cache_headers(etag)
+            headers["X-Total-Count"] = str(total)
+            headers["X-Ranked-Count"] = str(ranked)
+            headers["X-Features-Pending"] = str(pending)
+            return ORJSONResponse(trials, headers=headers)
+
+        if groups is not None and groups <= LIGHTWEIGHT_FIELD_GROUPS:
+            # 仅状态与数量：只读数据库，无需准入与H5计算
+            trials = await _load_trials(db, file_id, str(file_path), offset, end, groups)
+            return ORJSONResponse(trials, headers=cache_headers(etag))
 
-        return trials
+        samples = await _estimate_trial_samples(db, file_id, str(file_path))
+
+        async with admission_controller.admit("trials", metadata_cost_bytes(samples)):
+            # 同一文件的并发列表请求合并为一次计算
+            trials = await request_coalescer.do(
+                ("trials", file_id, fingerprint, offset, end, fields),
+                lambda: _load_trials(db, file_id, str(file_path), offset, end, groups),
+            )
+
+        return ORJSONResponse(trials, headers=cache_headers(etag))
 
     except HTTPException:
         raise
@@ -110,6 +205,305 @@ async def list_trials(
         )
 
 
+@router.get("/{file_id:path}/trials/stream")
+async def stream_trials(
+    file_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """以NDJSON逐行返回Trial元数据：已缓存的先返回，其余计算完成后依次返回
+
+    有未缓存的Trial时在返回响应前准入，服务繁忙时返回 503 与 Retry-After。
+    """
+    try:
+        data_root = Path(h5_service.data_root)
+        file_path = data_root / file_id
+
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
+
+        trial_count = await h5_service.get_trial_count(str(file_path))
+        end = trial_count if limit is None else min(trial_count, offset + limit)
+        indices = list(range(offset, end))
+
+        etag = make_etag(
+            "trials-stream",
+            file_id,
+            h5_service.file_fingerprint(str(file_path)),
+            h5_service.processing_fingerprint(),
+            await TrialMetadataRepository(db).get_file_state(file_id),
+            await AnnotationVersionRepository(db).get_file_state(file_id),
+            query_fingerprint(request),
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        headers = cache_headers(etag)
+        headers["X-Trial-Count"] = str(trial_count)
+        # 关闭反向代理缓冲，保证每行立即到达浏览器
+        headers["X-Accel-Buffering"] = "no"
+
+        cached = await TrialMetadataRepository(db).find_many(file_id, indices)
+        missing = [index for index in indices if index not in cached]
+        ticket = None
+        background = None
+        if missing:
+            workers = min(h5_service.compute_workers, len(missing))
+            samples = await _estimate_trial_samples(db, file_id, str(file_path), missing[0])
+            ticket = await admission_controller.acquire("trials", metadata_cost_bytes(samples) * workers)
+            # 生成器未启动 (客户端提前断开) 时由响应结束后的后台任务归还额度
+            background = BackgroundTask(ticket.release)
+
+        return StreamingResponse(
+            _stream_trials(db, file_id, str(file_path), indices, cached, ticket),
+            media_type="application/x-ndjson",
+            headers=headers,
+            background=background,
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to stream trials: {str(e)}"
+        )
+
+
+async def _stream_trials(
+    db: AsyncIOMotorDatabase,
+    file_id: str,
+    file_path: str,
+    indices: List[int],
+    cached: Dict[int, Dict],
+    ticket: Optional[AdmissionTicket],
+) -> AsyncIterator[bytes]:
+    """逐行输出Trial元数据；未缓存的Trial按计算线程数并发生成，结束或客户端断开时归还准入额度"""
+    try:
+        async for line in _stream_trial_lines(db, file_id, file_path, indices, cached):
+            yield line
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+
+async def _stream_trial_lines(
+    db: AsyncIOMotorDatabase,
+    file_id: str,
+    file_path: str,
+    indices: List[int],
+    cached: Dict[int, Dict],
+) -> AsyncIterator[bytes]:
+    repo = TrialMetadataRepository(db)
+    annotation_map = await AnnotationRepository(db).count_by_files([file_id])
+    annotation_counts = annotation_map.get(file_id, {})
+    version_counts = await AnnotationVersionRepository(db).count_by_trials(file_id)
+
+    def encode(metadata: Dict) -> bytes:
+        index = metadata['trialIndex']
+        metadata['annotationCount'] = annotation_counts.get(index, 0)
+        metadata['versionCount'] = version_counts.get(index, 0)
+        return dumps(metadata) + b"\n"
+
+    for index in indices:
+        if index in cached:
+            yield encode(cached[index])
+
+    stamp = h5_service.metadata_stamp(file_path)
+    if cached:
+        # 过期的缓存先照常返回，后台按当前文件与参数重算
+        stale = await repo.find_stale_indices(file_id, stamp, indices[0], indices[-1] + 1)
+        metadata_revalidator.schedule(db, file_id, file_path, stale, stamp)
+
+    missing = [index for index in indices if index not in cached]
+    if not missing:
+        return
+
+    semaphore = asyncio.Semaphore(min(h5_service.compute_workers, len(missing)))
+
+    async def compute(index: int) -> Dict:
+        async with semaphore:
+            try:
+                return await repo.find_or_create(
+                    file_id,
+                    index,
+                    lambda: h5_service.get_trial_metadata(file_path, index),
+                    stamp
+                )
+            except Exception as e:
+                print(f"❌ Error streaming trial {index} of {file_id}: {e}")
+                return {"trialIndex": index, "error": str(e)}
+
+    tasks = [asyncio.ensure_future(compute(index)) for index in missing]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            metadata = await next_done
+            if 'error' in metadata:
+                yield dumps(metadata) + b"\n"
+            else:
+                yield encode(metadata)
+    finally:
+        # 客户端断开时取消尚未开始的计算
+        for task in tasks:
+            task.cancel()
+
+
+async def _estimate_trial_samples(
+    db: AsyncIOMotorDatabase,
+    file_id: str,
+    file_path: str,
+    trial_index: Optional[int] = None,
+) -> int:
+    """预估Trial采样点数，优先读取元数据；未指定Trial时取文件内最长Trial"""
+    repo = TrialMetadataRepository(db)
+
+    if trial_index is None:
+        samples = await repo.max_data_points(file_id)
+        trial_index = 0
+    else:
+        lengths = await repo.get_trial_lengths(file_id, [trial_index])
+        samples = lengths.get(trial_index, {}).get("dataPoints")
+
+    if samples is None:
+        try:
+            samples = await asyncio.to_thread(h5_service.get_trial_length, file_path, trial_index)
+        except ValueError:
+            samples = 0
+
+    return int(samples)
+
+
+async def _load_ranked_trials(
+    db: AsyncIOMotorDatabase,
+    file_id: str,
+    file_path: str,
+    trial_count: int,
+    sort: Optional[Tuple[str, int]],
+    filters: Dict,
+    offset: int,
+    limit: Optional[int],
+    groups: Optional[Set[str]] = None,
+) -> Tuple[List[Dict], int, int, int]:
+    """按特征排序与筛选的一页Trial、满足条件的Trial数、总数 (含尚无特征的Trial) 与待计算特征的Trial数
+
+    过期的特征照常使用；缺少或过期的特征在后台计算，不阻塞本次请求。
+    尚无特征的Trial接在已排序结果之后 (按序号，标记 featuresPending)，结果不会因特征未算完而显得完整。
+    """
+    repo = TrialMetadataRepository(db)
+    include_counts = groups is None or "counts" in groups
+    include_status = groups is None or "status" in groups
+
+    stamp = h5_service.metadata_stamp(file_path)
+    stale = await repo.find_stale_indices(file_id, stamp)
+    metadata_revalidator.schedule(db, file_id, file_path, stale, stamp)
+    pending = await repo.find_feature_pending(file_id)
+    metadata_revalidator.schedule_features(db, file_id, file_path, pending)
+
+    ranked = await repo.count_ranked(file_id, filters)
+    trials = []
+    if offset < ranked:
+        trials = await repo.find_ranked(file_id, sort, filters, offset=offset, limit=limit, fields=groups)
+
+    unranked = await repo.find_unranked_indices(file_id, trial_count)
+    remaining = None if limit is None else limit - len(trials)
+    if remaining is None or remaining > 0:
+        start = max(0, offset - ranked)
+        page = unranked[start:] if remaining is None else unranked[start:start + remaining]
+        stored = await repo.find_many(file_id, page)
+        for index in page:
+            metadata = stored.get(index)
+            if metadata is None:
+                metadata = {"trialIndex": index, "fileId": file_id}
+            elif groups is not None:
+                metadata = project_trial_metadata(metadata, groups)
+            metadata['featuresPending'] = True
+            trials.append(metadata)
+
+    if include_counts:
+        annotation_map = await AnnotationRepository(db).count_by_files([file_id])
+        annotation_counts = annotation_map.get(file_id, {})
+        version_counts = await AnnotationVersionRepository(db).count_by_trials(file_id)
+
+    for metadata in trials:
+        if groups is None:
+            repo.normalize_metadata(metadata)
+        index = int(metadata['trialIndex'])
+        if include_status:
+            metadata.setdefault('finished', False)
+            metadata.setdefault('finishedAt', None)
+        if include_counts:
+            metadata['annotationCount'] = annotation_counts.get(index, 0)
+            metadata['versionCount'] = version_counts.get(index, 0)
+
+    return trials, ranked, ranked + len(unranked), len(pending)
+
+
+async def _load_trials(
+    db: AsyncIOMotorDatabase,
+    file_id: str,
+    file_path: str,
+    start: int,
+    end: int,
+    groups: Optional[Set[str]] = None,
+) -> List[Dict]:
+    """加载 [start, end) 区间Trial的元数据与标注统计，groups 为 None 时返回完整元数据"""
+    # 创建Repository
+    repo = TrialMetadataRepository(db)
+    include_counts = groups is None or "counts" in groups
+    include_status = groups is None or "status" in groups
+    needs_compute = groups is None or not groups <= LIGHTWEIGHT_FIELD_GROUPS
+
+    if include_counts:
+        annotation_map = await AnnotationRepository(db).count_by_files([file_id])
+        annotation_counts = annotation_map.get(file_id, {})
+        # 计算版本数量（每个Trial一个用户最多1个版本，但总体可能多人多版本）
+        version_counts = await AnnotationVersionRepository(db).count_by_trials(file_id)
+
+    # 一次查询读取区间内已缓存的元数据
+    stored = {
+        int(item['trialIndex']): item
+        for item in await repo.find_by_file(file_id, offset=start, limit=end - start, fields=groups)
+    }
+
+    stamp = None
+    if needs_compute:
+        stamp = h5_service.metadata_stamp(file_path)
+        if stored:
+            # 过期的缓存先照常返回，后台按当前文件与参数重算
+            stale = await repo.find_stale_indices(file_id, stamp, start, end)
+            metadata_revalidator.schedule(db, file_id, file_path, stale, stamp)
+
+    trials = []
+    for i in range(start, end):
+        metadata = stored.get(i)
+        if metadata is not None:
+            if groups is None:
+                metadata = repo.normalize_metadata(metadata)
+        elif needs_compute:
+            metadata = await repo.find_or_create(
+                file_id,
+                i,
+                lambda idx=i: h5_service.get_trial_metadata(file_path, idx),
+                stamp
+            )
+            if groups is not None:
+                metadata = project_trial_metadata(metadata, groups)
+        else:
+            metadata = {"trialIndex": i, "fileId": file_id}
+
+        if include_status:
+            metadata.setdefault('finished', False)
+            metadata.setdefault('finishedAt', None)
+        if include_counts:
+            metadata['annotationCount'] = annotation_counts.get(i, 0)
+            metadata['versionCount'] = version_counts.get(i, 0)
+        trials.append(metadata)
+
+    return trials
+
+
 @router.patch("/{file_id:path}/trials/{trial_index}/status")
 async def update_trial_status(
     file_id: str,
@@ -125,7 +519,7 @@ async def update_trial_status(
         if not file_path.exists():
             raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
 
-        trial_count = h5_service.load_trial_count(str(file_path))
+        trial_count = await h5_service.get_trial_count(str(file_path))
         if trial_index < 0 or trial_index >= trial_count:
             raise HTTPException(status_code=404, detail=f"Trial index {trial_index} out of range")
 
@@ -134,7 +528,8 @@ async def update_trial_status(
         await repo.find_or_create(
             file_id,
             trial_index,
-            lambda idx=trial_index: h5_service.load_trial_metadata(str(file_path), idx)
+            lambda idx=trial_index: h5_service.get_trial_metadata(str(file_path), idx),
+            h5_service.metadata_stamp(str(file_path))
         )
 
         updated = await repo.set_trial_finished(file_id, trial_index, payload.finished)
@@ -178,16 +573,18 @@ async def update_file_status(
         if not file_path.exists():
             raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
 
-        trial_count = h5_service.load_trial_count(str(file_path))
+        trial_count = await h5_service.get_trial_count(str(file_path))
 
         repo = TrialMetadataRepository(db)
 
         # 确保所有Trial的元数据已创建
+        stamp = h5_service.metadata_stamp(str(file_path))
         for i in range(trial_count):
             await repo.find_or_create(
                 file_id,
                 i,
-                lambda idx=i: h5_service.load_trial_metadata(str(file_path), idx)
+                lambda idx=i: h5_service.get_trial_metadata(str(file_path), idx),
+                stamp
             )
 
         modified = await repo.set_file_finished(file_id, payload.finished)
@@ -214,10 +611,39 @@ async def update_file_status(
 async def get_waveform(
     file_id: str,
     trial_index: int,
+    request: Request,
+    timestamps: str = Query(
+        "full",
+        pattern="^(full|compact)$",
+        description="full: raw/filtered 各带逐采样时间戳；compact: 仅返回 timeAxis (t0+采样率或断点对)",
+    ),
+    precision: str = Query(
+        "float64",
+        pattern="^(float64|float32|int16)$",
+        description="数值精度：float32/int16 以 base64 二进制返回并附误差报告",
+    ),
+    delta: int = Query(1, ge=0, le=2, description="int16 编码的差分阶数 (滤波信号较平滑，2 阶压缩率更高)"),
+    start: Optional[float] = Query(None, description="视口起始时间 (秒)"),
+    end: Optional[float] = Query(None, description="视口结束时间 (秒)"),
+    max_points: Optional[int] = Query(
+        None,
+        ge=16,
+        le=200000,
+        description="每条序列最多返回的点数，通常取图表宽度 (像素) 的 1~4 倍",
+    ),
+    method: str = Query("lttb", pattern="^(lttb|m4)$", description="降采样算法：lttb 或 m4 (每像素列首/末/最小/最大)"),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ) -> Dict:
-    """获取Trial的完整波形数据 (已预处理)"""
+    """获取Trial的完整波形数据 (已预处理)
+
+    指定 start/end/max_points 任一参数时返回视口波形：窗口内点数超过 max_points 时降采样，
+    否则返回窗口内的原始采样；各序列附带采样下标，timestamps 参数不再生效。
+    """
     try:
+        if start is not None and end is not None and end <= start:
+            raise HTTPException(status_code=400, detail="end must be greater than start")
+        windowed = start is not None or end is not None or max_points is not None
+
         # 构建完整文件路径
         data_root = Path(h5_service.data_root)
         file_path = data_root / file_id
@@ -225,10 +651,37 @@ async def get_waveform(
         if not file_path.exists():
             raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
 
-        # 预处理波形
-        waveform = h5_service.preprocess_waveform(str(file_path), trial_index)
+        # 波形只随文件与处理参数变化，命中时仅需一次 stat
+        etag = make_etag(
+            "waveform",
+            file_id,
+            trial_index,
+            h5_service.file_fingerprint(str(file_path)),
+            h5_service.processing_fingerprint(),
+            query_fingerprint(request),
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag)
 
-        return waveform
+        samples = await _estimate_trial_samples(db, file_id, str(file_path), trial_index)
+
+        # 预处理波形 (按Trial长度预估内存占用后准入)
+        bytes_per_sample = (
+            WAVEFORM_COMPACT_BYTES_PER_SAMPLE
+            if timestamps == "compact" or windowed
+            else WAVEFORM_BYTES_PER_SAMPLE
+        )
+        async with admission_controller.admit("waveform", samples * bytes_per_sample):
+            if windowed:
+                waveform = await h5_service.get_waveform_window(
+                    str(file_path), trial_index, start, end, max_points, method
+                )
+            else:
+                waveform = await h5_service.get_waveform(str(file_path), trial_index, timestamps)
+            if precision != "float64":
+                waveform = await asyncio.to_thread(encode_waveform, waveform, precision, delta)
+            # 波形中的numpy数组由 orjson 直接序列化
+            return ORJSONResponse(waveform, headers=cache_headers(etag))
 
     except HTTPException:
         raise
@@ -241,6 +694,340 @@ async def get_waveform(
         )
 
 
+@router.get("/{file_id:path}/trials/{trial_index}/tiles")
+async def get_tile_layout(file_id: str, trial_index: int, request: Request) -> Dict:
+    """获取Trial的瓦片布局与当前瓦片版本 (请求瓦片时以 v 参数携带)"""
+    try:
+        file_path = Path(h5_service.data_root) / file_id
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
+
+        version = h5_service.tile_version(str(file_path))
+        etag = make_etag("tile-layout", file_id, trial_index, version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        layout = await asyncio.to_thread(h5_service.get_tile_layout, str(file_path), trial_index)
+        return ORJSONResponse(layout, headers=cache_headers(etag))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to load tile layout: {str(e)}"
+        )
+
+
+@router.get("/{file_id:path}/trials/{trial_index}/tiles/{level}/{tile_index}")
+async def get_waveform_tile(
+    file_id: str,
+    trial_index: int,
+    level: int,
+    tile_index: int,
+    request: Request,
+    v: Optional[str] = Query(None, description="瓦片版本 (来自瓦片布局)，携带时响应可永久缓存"),
+    precision: str = Query(
+        "float64",
+        pattern="^(float64|float32|int16)$",
+        description="数值精度：float32/int16 以 base64 二进制返回并附误差报告",
+    ),
+    delta: int = Query(1, ge=0, le=2, description="int16 编码的差分阶数"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+) -> Dict:
+    """获取 min/max 金字塔的固定点数瓦片
+
+    瓦片地址由版本 (文件指纹 + 预处理参数) 确定内容，版本过期时返回 409，客户端应重新获取布局。
+    瓦片按切片读取，开销与瓦片大小成正比；Trial的派生数据尚未生成时，首个请求经 waveform 准入后生成。
+    """
+    try:
+        file_path = Path(h5_service.data_root) / file_id
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
+
+        version = h5_service.tile_version(str(file_path))
+        if v is not None and v != version:
+            raise HTTPException(status_code=409, detail="Tile version is stale, reload the tile layout")
+
+        cache_control = settings.TILE_CACHE_CONTROL if v else REVALIDATE_CACHE_CONTROL
+        etag = make_etag("tile", file_id, trial_index, level, tile_index, version, query_fingerprint(request))
+        if etag_matches(request, etag):
+            return not_modified(etag, cache_control)
+
+        tile = await h5_service.get_cached_tile(str(file_path), trial_index, level, tile_index)
+        if tile is None:
+            if not await asyncio.to_thread(h5_service.derived_ready, str(file_path), trial_index):
+                # 生成派生数据需要整段预处理，与波形接口共用准入
+                samples = await _estimate_trial_samples(db, file_id, str(file_path), trial_index)
+                async with admission_controller.admit("waveform", derived_cost_bytes(samples)):
+                    await h5_service.build_derived(str(file_path), trial_index)
+            tile = await h5_service.get_tile(str(file_path), trial_index, level, tile_index)
+        if precision != "float64":
+            tile = await asyncio.to_thread(encode_waveform, tile, precision, delta)
+        return ORJSONResponse(tile, headers=cache_headers(etag, cache_control))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to load waveform tile: {str(e)}"
+        )
+
+
+@router.get("/{file_id:path}/trials/{trial_index}/sparkline")
+async def get_trial_sparkline(
+    file_id: str,
+    trial_index: int,
+    request: Request,
+    width: int = Query(160, ge=16, le=1024, description="图片宽度 (像素)"),
+    height: int = Query(40, ge=8, le=512, description="图片高度 (像素)"),
+    format: str = Query("png", pattern="^(png|svg)$", description="png: 抗锯齿位图；svg: 矢量折线"),
+    v: Optional[str] = Query(None, description="缩略图版本 (来自 X-Content-Version)，携带时响应可永久缓存"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+) -> Response:
+    """获取Trial缩略图的服务端渲染图片，体积远小于 thumbnail 的 JSON 数组
+
+    版本过期时返回 409；渲染结果按版本与参数缓存在磁盘上。
+    """
+    try:
+        file_path = Path(h5_service.data_root) / file_id
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
+
+        version = sparkline_service.version(str(file_path))
+        if v is not None and v != version:
+            raise HTTPException(status_code=409, detail="Sparkline version is stale")
+
+        cache_control = settings.TILE_CACHE_CONTROL if v else REVALIDATE_CACHE_CONTROL
+        etag = make_etag("sparkline", file_id, trial_index, version, width, height, format)
+        if etag_matches(request, etag):
+            return not_modified(etag, cache_control)
+
+        async def render() -> bytes:
+            thumbnails, _ = await _load_thumbnails(db, file_id, str(file_path), [trial_index], strict=True)
+            renderer = render_svg if format == "svg" else render_png
+            return await h5_service.run_compute(renderer, thumbnails[0] or {}, width, height)
+
+        name = f"trial-{trial_index}-{width}x{height}.{format}"
+        content = await sparkline_service.get(str(file_path), version, name, render)
+        headers = cache_headers(etag, cache_control)
+        headers["X-Content-Version"] = version
+        return Response(content, media_type=SPARKLINE_MEDIA_TYPES[format], headers=headers)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to render sparkline: {str(e)}"
+        )
+
+
+@router.get("/{file_id:path}/sparklines")
+async def get_sparkline_sprite(
+    file_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0, description="起始Trial序号"),
+    limit: int = Query(50, ge=1, le=SPARKLINE_SPRITE_MAX_TRIALS, description="Trial数量"),
+    width: int = Query(160, ge=16, le=1024, description="每个缩略图的宽度 (像素)"),
+    height: int = Query(40, ge=8, le=512, description="每个缩略图的高度 (像素)"),
+    v: Optional[str] = Query(None, description="缩略图版本 (来自 X-Content-Version)，携带时响应可永久缓存"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+) -> Response:
+    """一页Trial缩略图拼成的 PNG 雪碧图，第 i 行 (高 height) 对应 offset + i 号Trial
+
+    列表页一次请求代替逐Trial的缩略图数据；X-Trial-Count 为实际包含的Trial数。
+    有Trial加载失败时对应行为空，X-Failed-Trials 列出这些Trial，响应不缓存 (之后的请求重试)。
+    """
+    try:
+        file_path = Path(h5_service.data_root) / file_id
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
+
+        version = sparkline_service.version(str(file_path))
+        if v is not None and v != version:
+            raise HTTPException(status_code=409, detail="Sparkline version is stale")
+
+        total = await h5_service.get_trial_count(str(file_path))
+        end = min(offset + limit, total)
+        if offset >= end:
+            raise HTTPException(status_code=404, detail=f"Trial offset {offset} out of range")
+
+        cache_control = settings.TILE_CACHE_CONTROL if v else REVALIDATE_CACHE_CONTROL
+        etag = make_etag("sparkline-sprite", file_id, offset, end, version, width, height)
+        if etag_matches(request, etag):
+            return not_modified(etag, cache_control)
+
+        async def render() -> bytes:
+            thumbnails, failed = await _load_thumbnails(db, file_id, str(file_path), list(range(offset, end)))
+            content = await h5_service.run_compute(render_sprite_png, thumbnails, width, height)
+            if failed:
+                raise IncompleteRender(content, failed)
+            return content
+
+        name = f"sprite-{offset}-{end}-{width}x{height}.png"
+        try:
+            content = await sparkline_service.get(str(file_path), version, name, render)
+            headers = cache_headers(etag, cache_control)
+        except IncompleteRender as e:
+            # 空行不能写入磁盘缓存或被浏览器永久缓存，否则失败的Trial再也不会恢复
+            content = e.content
+            headers = cache_headers(None, "no-store")
+            headers["X-Failed-Trials"] = ",".join(str(index) for index in e.failed)
+        headers["X-Content-Version"] = version
+        headers["X-Trial-Count"] = str(end - offset)
+        return Response(content, media_type="image/png", headers=headers)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to render sparklines: {str(e)}"
+        )
+
+
+async def _load_thumbnails(
+    db: AsyncIOMotorDatabase,
+    file_id: str,
+    file_path: str,
+    indices: List[int],
+    strict: bool = False,
+) -> Tuple[List[Optional[Dict]], List[int]]:
+    """按当前文件读取缩略图数据与加载失败的Trial
+
+    优先用未过期的元数据缓存，过期的按当前文件计算并在后台刷新缓存；需要计算的Trial经 trials 准入后
+    按计算线程数并发生成。strict 为 False 时单个Trial失败只记录日志，对应位置为 None (雪碧图中为空行)。
+    """
+    repo = TrialMetadataRepository(db)
+    stamp = h5_service.metadata_stamp(file_path)
+    cached = await repo.find_many(file_id, indices)
+    stale: List[int] = []
+    if cached:
+        stale = await repo.find_stale_indices(file_id, stamp, indices[0], indices[-1] + 1)
+        metadata_revalidator.schedule(db, file_id, file_path, stale, stamp)
+
+    thumbnails: Dict[int, Optional[Dict]] = {
+        index: cached[index].get("thumbnail")
+        for index in indices
+        if index in cached and index not in stale
+    }
+    missing = [index for index in indices if index not in thumbnails]
+    failed: List[int] = []
+    if not missing:
+        return [thumbnails[index] for index in indices], failed
+
+    workers = min(h5_service.compute_workers, len(missing))
+    samples = await _estimate_trial_samples(db, file_id, file_path, missing[0])
+    semaphore = asyncio.Semaphore(workers)
+
+    async def compute(index: int) -> None:
+        async with semaphore:
+            try:
+                if index in cached:
+                    # 缓存的缩略图来自旧文件，不能写进新版本的图片
+                    metadata = await h5_service.get_trial_metadata(file_path, index)
+                else:
+                    metadata = await repo.find_or_create(
+                        file_id,
+                        index,
+                        lambda: h5_service.get_trial_metadata(file_path, index),
+                        stamp
+                    )
+            except Exception as e:
+                if strict:
+                    raise
+                print(f"❌ Error loading thumbnail {index} of {file_id}: {e}")
+                failed.append(index)
+                metadata = {}
+        thumbnails[index] = metadata.get("thumbnail")
+
+    async with admission_controller.admit("trials", metadata_cost_bytes(samples) * workers):
+        await asyncio.gather(*(compute(index) for index in missing))
+    return [thumbnails.get(index) for index in indices], sorted(failed)
+
+
+@router.post("/{file_id:path}/waveforms")
+async def get_waveforms(
+    file_id: str,
+    payload: BatchWaveformRequest,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """批量获取多个Trial的视口波形，以NDJSON逐行返回 (按完成顺序，每行带 trialIndex)
+
+    未缓存的Trial通过同一个文件句柄读取后在计算线程中并行处理；单个Trial失败时该行为 error。
+    准入在返回响应前完成，服务繁忙时返回 503 与 Retry-After。
+    float32/int16 数值以 base64 嵌在各行 JSON 中 (与单Trial接口格式一致)，不单独使用二进制分帧。
+    """
+    try:
+        if payload.start is not None and payload.end is not None and payload.end <= payload.start:
+            raise HTTPException(status_code=400, detail="end must be greater than start")
+
+        file_path = Path(h5_service.data_root) / file_id
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
+
+        indices = list(dict.fromkeys(payload.trialIndices))
+        headers = cache_headers(None, "no-store")
+        headers["X-Trial-Count"] = str(len(indices))
+        headers["X-Accel-Buffering"] = "no"
+
+        # 按文件内最长Trial与并行数预估内存后准入
+        samples = await _estimate_trial_samples(db, file_id, str(file_path))
+        workers = min(h5_service.compute_workers, len(indices))
+        ticket = await admission_controller.acquire("waveform", samples * WAVEFORM_COMPACT_BYTES_PER_SAMPLE * workers)
+
+        # 生成器结束时归还额度；生成器未启动 (客户端提前断开) 时由响应结束后的后台任务归还
+        return StreamingResponse(
+            _stream_waveforms(file_id, str(file_path), indices, payload, ticket),
+            media_type="application/x-ndjson",
+            headers=headers,
+            background=BackgroundTask(ticket.release),
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to load waveforms: {str(e)}"
+        )
+
+
+async def _stream_waveforms(
+    file_id: str,
+    file_path: str,
+    indices: List[int],
+    payload: BatchWaveformRequest,
+    ticket: AdmissionTicket,
+) -> AsyncIterator[bytes]:
+    """逐行输出批量波形，结束或客户端断开时归还准入额度"""
+    try:
+        windows = h5_service.iter_waveform_windows(
+            file_path, indices, payload.start, payload.end, payload.maxPoints, payload.method
+        )
+        async for index, waveform in windows:
+            if isinstance(waveform, Exception):
+                print(f"❌ Error loading waveform {index} of {file_id}: {waveform}")
+                yield dumps({"trialIndex": index, "error": str(waveform)}) + b"\n"
+                continue
+            if payload.precision != "float64":
+                waveform = await asyncio.to_thread(encode_waveform, waveform, payload.precision, payload.delta)
+            waveform["trialIndex"] = index
+            yield dumps(waveform) + b"\n"
+    finally:
+        ticket.release()
+
+
 async def _load_metadata_async(file_path: str, trial_index: int) -> Dict:
     """异步加载元数据 (用于缓存模式)"""
     return h5_service.load_trial_metadata(file_path, trial_index)
@@ -8,7 +8,7 @@ from pydantic import BaseModel
 
 from app.config.permissions import ALL_PERMISSIONS
 from app.db.mongodb import get_database
-from app.db.repositories.role_repo import RoleRepository
+from app.db.repositories.role_repo import RoleRepository, role_cache
 from app.utils.permissions import require_permission
 
 router = APIRouter(prefix="/api/roles", tags=["角色管理"])
@@ -135,6 +135,7 @@ async def update_role(
         return {"message": "没有需要更新的字段"}
 
     success = await role_repo.update(role_id, update_data)
+    role_cache.invalidate(role_id)
     if not success:
         raise HTTPException(status_code=500, detail="角色更新失败")
 
@@ -160,6 +161,7 @@ async def delete_role(
         raise HTTPException(status_code=400, detail="系统预设角色不可删除")
 
     success = await role_repo.delete(role_id)
+    role_cache.invalidate(role_id)
     if not success:
         raise HTTPException(status_code=500, detail="角色删除失败")
 
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from typing import Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.db import get_database
+from app.services.admission_service import admission_controller
+from app.services.dataset_catalog_service import dataset_catalog
+from app.services.metadata_revalidation_service import metadata_revalidator
+from app.services.single_flight import request_coalescer
+from app.utils.permissions import require_permission
+
+router = APIRouter(prefix="/api/system", tags=["系统"])
+
+
+@router.get("/stats")
+@require_permission("system.logs")
+async def get_runtime_stats(request: Request) -> Dict:
+    """运行时统计 (当前worker进程)"""
+
+    return {
+        "coalescing": request_coalescer.stats(),
+        "admission": admission_controller.stats(),
+        "metadataRevalidation": metadata_revalidator.stats(),
+        "datasetCatalog": dataset_catalog.stats(),
+    }
+
+
+@router.post("/metadata/revalidate", status_code=202)
+@require_permission("system.settings")
+async def revalidate_trial_metadata(
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+) -> Dict:
+    """后台校验所有文件的Trial元数据，重算源文件或处理参数已变化的Trial"""
+
+    if not metadata_revalidator.start_revalidation(db):
+        raise HTTPException(status_code=409, detail="元数据校验任务正在运行")
+    return {"started": True, "lastRun": metadata_revalidator.last_run}
+
+
+@router.post("/catalog/rescan")
+@require_permission("system.settings")
+async def rescan_dataset_catalog(
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+) -> Dict:
+    """立即重扫数据集目录 (新增、删除或替换H5文件后无需等待后台周期)"""
+
+    try:
+        return await dataset_catalog.rescan(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to rescan dataset: {str(e)}")
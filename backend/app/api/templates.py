@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.db import get_database
 from app.db.repositories.template_repo import TemplateRepository
 from app.models.event_template import EventTemplateCreate, EventTemplateUpdate
+from app.utils.http_cache import etag_matches, make_etag, not_modified, set_cache_headers
 from app.utils.permissions import require_permission
 from typing import List, Dict
 
@@ -13,12 +14,22 @@ router = APIRouter(prefix="/api/templates", tags=["templates"])
 @require_permission("templates.view")
 async def list_templates(
     request: Request,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_database)
 ) -> List[Dict]:
     """获取模板列表"""
     try:
         repo = TemplateRepository(db)
         templates = await repo.find_all()
+
+        etag = make_etag(
+            "templates",
+            [(template.get('_id'), str(template.get('updatedAt'))) for template in templates],
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_cache_headers(response, etag)
+
         return templates
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch templates: {str(e)}")
@@ -29,6 +40,7 @@ async def list_templates(
 async def get_template(
     template_id: str,
     request: Request,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_database)
 ) -> Dict:
     """获取单个模板"""
@@ -38,7 +50,12 @@ async def get_template(
         
         if not template:
             raise HTTPException(status_code=404, detail="Template not found")
-        
+
+        etag = make_etag("template", template.get('_id'), str(template.get('updatedAt')))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_cache_headers(response, etag)
+
         return template
     except HTTPException:
         raise
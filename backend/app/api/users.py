@@ -7,9 +7,9 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel, EmailStr
 
 from app.db.mongodb import get_database
-from app.db.repositories.role_repo import RoleRepository
+from app.db.repositories.role_repo import RoleRepository, role_cache
 from app.db.repositories.user_repo import UserRepository
-from app.utils.permissions import get_current_user, require_permission
+from app.utils.permissions import get_current_user, has_permission, require_permission
 
 router = APIRouter(prefix="/api/users", tags=["用户管理"])
 
@@ -44,15 +44,30 @@ async def list_users(
     user_repo = UserRepository(db)
     role_repo = RoleRepository(db)
 
-    total, users = await user_repo.list_with_pagination(
-        page=page,
-        page_size=page_size,
-        role=role,
-        is_active=is_active,
-    )
+    if role_cache.enabled:
+        # 角色变更较少，整页只需对缓存未命中的角色做一次批量查询
+        total, users = await user_repo.list_with_pagination(
+            page=page,
+            page_size=page_size,
+            role=role,
+            is_active=is_active,
+        )
+        roles = await role_repo.find_by_ids(user["role_id"] for user in users)
+    else:
+        # 未启用缓存时通过 $lookup 一次性返回用户与角色
+        total, users = await user_repo.list_with_roles(
+            page=page,
+            page_size=page_size,
+            role=role,
+            is_active=is_active,
+        )
+        roles = {}
+        for user in users:
+            for role_doc in user.pop("role_docs", []):
+                roles[str(role_doc["_id"])] = role_doc
 
     for user in users:
-        role_obj = await role_repo.find_by_id(user["role_id"])
+        role_obj = roles.get(user["role_id"])
         user["role"] = {
             "id": str(role_obj["_id"]),
             "name": role_obj["name"],
@@ -79,7 +94,7 @@ async def get_user(
 
     current_user = get_current_user(request)
     if user_id != current_user["user_id"]:
-        if "users.view" not in current_user["permissions"]:
+        if not has_permission(request, "users.view"):
             raise HTTPException(status_code=403, detail="权限不足")
 
     user_repo = UserRepository(db)
@@ -89,7 +104,7 @@ async def get_user(
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
 
-    role = await role_repo.find_by_id(user["role_id"])
+    role = await role_repo.find_by_id_cached(user["role_id"])
 
     user["id"] = str(user.pop("_id"))
     user["role"] = {
@@ -156,7 +171,7 @@ async def update_user(
 
     current_user = get_current_user(request)
     is_self = user_id == current_user["user_id"]
-    can_update_others = "users.update" in current_user["permissions"]
+    can_update_others = has_permission(request, "users.update")
 
     if not is_self and not can_update_others:
         raise HTTPException(status_code=403, detail="权限不足")
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+import tempfile
 from typing import List
 
 from pydantic_settings import BaseSettings
@@ -18,14 +19,79 @@ class Settings(BaseSettings):
 
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://:Qq1970251968@117.50.201.9:26739")
 
+    # 缓存后端：memory（进程内）/ redis（多worker共享）/ local（fakeredis 本地替身）
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_KEY_PREFIX: str = os.getenv("CACHE_KEY_PREFIX", "wfas:")
+    CACHE_TTL_SECONDS: int = int(os.getenv("CACHE_TTL_SECONDS", "86400"))
+    CACHE_MEMORY_MAX_BYTES: int = int(os.getenv("CACHE_MEMORY_MAX_BYTES", str(256 * 1024 * 1024)))
+
     JWT_SECRET_KEY: str = os.getenv(
         "JWT_SECRET_KEY",
         "your-secret-key-change-in-production-please",
     )
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
     JWT_EXPIRATION_DAYS: int = int(os.getenv("JWT_EXPIRATION_DAYS", "7"))
+    # 已验签令牌缓存条目上限，0 表示每次请求都重新验签
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+
+    # bcrypt 计算成本；调整后用户下次登录时自动重新哈希
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    # 密码哈希专用线程池大小，同时限制并发的 bcrypt 计算数量
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
+    # 角色缓存有效期（秒），0 表示禁用进程内缓存
+    ROLE_CACHE_TTL_SECONDS: int = int(os.getenv("ROLE_CACHE_TTL_SECONDS", "60"))
+    # 模板列表缓存有效期（秒），0 表示不缓存；进程内缓存只在处理写请求的worker中失效，其它worker最多延迟该时间
+    TEMPLATE_CACHE_TTL_SECONDS: int = int(os.getenv("TEMPLATE_CACHE_TTL_SECONDS", "30"))
 
     H5_DATA_PATH: str = os.getenv("H5_DATA_PATH", "../dataset")
+    # 波形预处理专用线程池，与轻量接口使用的默认线程池隔离
+    H5_COMPUTE_WORKERS: int = int(os.getenv("H5_COMPUTE_WORKERS", "4"))
+    # 允许把预处理结果持久化到 DERIVED_CACHE_DIR 下的单Trial派生数据文件 (源H5文件不被修改)；
+    # 写入源文件的 trial_*/derived/ 组只由离线脚本 scripts/build_derived_data.py 完成
+    ENABLE_DATASET_WRITE: bool = os.getenv("ENABLE_DATASET_WRITE", "false").lower() == "true"
+    # 采样点数达到该值的Trial改用分块预处理，峰值内存由分块大小决定
+    STREAMING_PREPROCESS_MIN_SAMPLES: int = int(os.getenv("STREAMING_PREPROCESS_MIN_SAMPLES", "10000000"))
+    PREPROCESS_CHUNK_SAMPLES: int = int(os.getenv("PREPROCESS_CHUNK_SAMPLES", "1000000"))
+    # 单Trial派生数据文件 (分块预处理、瓦片金字塔与在线写回的结果) 的存放目录
+    DERIVED_CACHE_DIR: str = os.getenv(
+        "DERIVED_CACHE_DIR",
+        os.path.join(tempfile.gettempdir(), "waveform-derived"),
+    )
+    # 单Trial派生数据目录容量上限 (字节)，超出后删除最旧的文件 (之后按需重新生成)
+    DERIVED_CACHE_MAX_BYTES: int = int(os.getenv("DERIVED_CACHE_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+    # 带版本号的瓦片内容不可变；接口需要令牌，反向代理已做鉴权时可改为 public
+    TILE_CACHE_CONTROL: str = os.getenv("TILE_CACHE_CONTROL", "private, max-age=31536000, immutable")
+    # 服务端渲染的缩略图磁盘缓存目录 (按文件指纹与参数命名)
+    SPARKLINE_CACHE_DIR: str = os.getenv(
+        "SPARKLINE_CACHE_DIR",
+        os.path.join(tempfile.gettempdir(), "waveform-sparklines"),
+    )
+    # 缩略图磁盘缓存容量上限 (字节)，超出后删除最旧的文件
+    SPARKLINE_CACHE_MAX_BYTES: int = int(os.getenv("SPARKLINE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+    # 过期Trial元数据的后台重算并发数，低于计算线程数以免挤占前台请求
+    METADATA_REFRESH_CONCURRENCY: int = int(os.getenv("METADATA_REFRESH_CONCURRENCY", "2"))
+
+    # 数据集目录后台重扫间隔（秒），0 表示只在首次请求时扫描
+    CATALOG_RESCAN_SECONDS: float = float(os.getenv("CATALOG_RESCAN_SECONDS", "300"))
+    # 重扫时并行 stat 的线程数
+    CATALOG_STAT_WORKERS: int = int(os.getenv("CATALOG_STAT_WORKERS", "16"))
+
+    # 重型接口准入控制
+    WAVEFORM_MAX_CONCURRENCY: int = int(os.getenv("WAVEFORM_MAX_CONCURRENCY", "4"))
+    TRIALS_MAX_CONCURRENCY: int = int(os.getenv("TRIALS_MAX_CONCURRENCY", "2"))
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "16"))
+    ADMISSION_MAX_WAIT_SECONDS: float = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "15"))
+    ADMISSION_RETRY_AFTER_SECONDS: int = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5"))
+    ADMISSION_MEMORY_BUDGET_MB: int = int(os.getenv("ADMISSION_MEMORY_BUDGET_MB", "2048"))
+
+    # 响应压缩：小于阈值的响应不压缩；取较低级别换取动态内容的压缩速度
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    # 超过该大小的响应在线程中压缩，避免阻塞事件循环
+    COMPRESSION_THREAD_MIN_SIZE: int = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", str(64 * 1024)))
+    GZIP_COMPRESS_LEVEL: int = int(os.getenv("GZIP_COMPRESS_LEVEL", "4"))
+    BROTLI_QUALITY: int = int(os.getenv("BROTLI_QUALITY", "4"))
 
     CORS_ORIGINS: List[str] = ["http://localhost:5173"]
 
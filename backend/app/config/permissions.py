@@ -1,3 +1,5 @@
+# 注意：令牌中的权限位按此处的定义顺序编码，新增权限只能追加在末尾；
+# 调整顺序或删除权限时必须同时递增 PERMISSION_ENCODING_VERSION
 ALL_PERMISSIONS = {
     "users.view": {"description": "查看用户列表", "category": "用户管理"},
     "users.create": {"description": "创建用户", "category": "用户管理"},
@@ -23,6 +25,10 @@ ALL_PERMISSIONS = {
     "system.logs": {"description": "系统日志", "category": "系统管理"},
 }
 
+PERMISSION_ENCODING_VERSION = 1
+
+PERMISSION_BITS = {key: 1 << index for index, key in enumerate(ALL_PERMISSIONS)}
+
 ROLE_PRESETS = {
     "admin": list(ALL_PERMISSIONS.keys()),
     "annotator": [
@@ -1,5 +1,6 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from app.config import settings
+from app.services.trial_features import FEATURE_PATHS
 
 class Database:
     client: AsyncIOMotorClient = None
@@ -25,6 +26,14 @@ async def connect_to_mongo():
         # 测试连接
         await database.db.command("ping")
         print(f"✅ Connected to MongoDB: {settings.MONGODB_DATABASE}")
+
+        # Trial列表按文件分页查询，依赖 (fileId, trialIndex) 索引
+        await database.db.trial_metadata.create_index([("fileId", 1), ("trialIndex", 1)])
+        # Trial列表按特征排序与筛选
+        for path in FEATURE_PATHS.values():
+            if path != "trialIndex":
+                await database.db.trial_metadata.create_index([("fileId", 1), (path, 1), ("trialIndex", 1)])
+        await database.db.dataset_catalog.create_index("fileId", unique=True)
     except Exception as e:
         print(f"❌ Failed to connect to MongoDB: {e}")
         raise
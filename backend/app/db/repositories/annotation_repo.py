@@ -2,6 +2,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import Dict, List, Optional
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import InsertOne
 
 
 class AnnotationRepository:
@@ -143,6 +144,25 @@ class AnnotationRepository:
         if docs:
             await self.collection.insert_many(docs)
 
+    async def delete_by_versions(self, version_ids: List[str]) -> int:
+        """批量删除多个版本下的标注"""
+        if not version_ids:
+            return 0
+        result = await self.collection.delete_many({
+            "versionId": {"$in": version_ids},
+        })
+        return result.deleted_count
+
+    async def bulk_insert(self, docs: List[Dict]) -> int:
+        """无序批量插入标注，单次往返写入整批文档"""
+        if not docs:
+            return 0
+        result = await self.collection.bulk_write(
+            [InsertOne(doc) for doc in docs],
+            ordered=False,
+        )
+        return result.inserted_count
+
     async def count_by_files(self, file_ids: Optional[List[str]] = None) -> Dict[str, Dict[int, int]]:
         """统计多个文件下每个Trial的标注数量"""
         pipeline = []
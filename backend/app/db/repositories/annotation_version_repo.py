@@ -1,11 +1,11 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+from pymongo import ReturnDocument, UpdateOne
 
 
 class AnnotationVersionRepository:
@@ -34,6 +34,36 @@ class AnnotationVersionRepository:
                 item["updatedAt"] = updated_at.isoformat()
         return versions
 
+    async def count_by_trials(self, file_id: str) -> Dict[int, int]:
+        """统计文件下每个Trial的版本数量"""
+        cursor = self.collection.aggregate([
+            {"$match": {"fileId": file_id}},
+            {"$group": {"_id": "$trialIndex", "count": {"$sum": 1}}},
+        ])
+        counts: Dict[int, int] = {}
+        async for item in cursor:
+            if item["_id"] is not None:
+                counts[int(item["_id"])] = int(item["count"])
+        return counts
+
+    async def get_file_state(self, file_id: str) -> Dict:
+        """文件下版本的变更摘要 (数量、最近更新时间)，用于生成ETag"""
+        cursor = self.collection.aggregate([
+            {"$match": {"fileId": file_id}},
+            {
+                "$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "lastUpdated": {"$max": "$updatedAt"},
+                }
+            },
+        ])
+        items = await cursor.to_list(length=1)
+        if not items:
+            return {"count": 0, "lastUpdated": None}
+        items[0].pop("_id", None)
+        return items[0]
+
     async def find_by_id(self, version_id: str) -> Optional[Dict]:
         try:
             raw = await self.collection.find_one({"_id": ObjectId(version_id)})
@@ -114,3 +144,78 @@ class AnnotationVersionRepository:
             return result.deleted_count > 0
         except Exception:
             return False
+
+    async def bulk_upsert_versions(
+        self,
+        *,
+        keys: Iterable[Tuple[str, int]],
+        user_id: str,
+        username: Optional[str],
+        reset_counts: bool,
+        status: str = "active",
+    ) -> Dict[Tuple[str, int], str]:
+        """批量创建或激活用户在多个Trial上的版本，返回 (fileId, trialIndex) -> versionId"""
+
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        now = datetime.now(timezone.utc)
+        operations = []
+        for file_id, trial_index in keys:
+            update: Dict = {
+                "$set": {
+                    "username": username,
+                    "status": status,
+                    "updatedAt": now,
+                },
+                "$setOnInsert": {
+                    "createdAt": now,
+                },
+            }
+            if reset_counts:
+                update["$set"]["segmentCount"] = 0
+            else:
+                update["$setOnInsert"]["segmentCount"] = 0
+            operations.append(
+                UpdateOne(
+                    {"fileId": file_id, "trialIndex": trial_index, "userId": user_id},
+                    update,
+                    upsert=True,
+                )
+            )
+
+        await self.collection.bulk_write(operations, ordered=False)
+
+        cursor = self.collection.find(
+            {
+                "userId": user_id,
+                "$or": [
+                    {"fileId": file_id, "trialIndex": trial_index}
+                    for file_id, trial_index in keys
+                ],
+            },
+            projection={"fileId": 1, "trialIndex": 1},
+        )
+        version_ids: Dict[Tuple[str, int], str] = {}
+        async for item in cursor:
+            version_ids[(item["fileId"], int(item["trialIndex"]))] = str(item["_id"])
+        return version_ids
+
+    async def bulk_increment_segment_counts(self, counts: Dict[str, int]) -> None:
+        """按版本累加标注数量"""
+
+        if not counts:
+            return
+
+        now = datetime.now(timezone.utc)
+        operations = [
+            UpdateOne(
+                {"_id": ObjectId(version_id)},
+                {"$inc": {"segmentCount": count}, "$set": {"updatedAt": now}},
+            )
+            for version_id, count in counts.items()
+            if count
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
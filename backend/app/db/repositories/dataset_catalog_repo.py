@@ -0,0 +1,27 @@
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DeleteMany, ReplaceOne
+
+
+class DatasetCatalogRepository:
+    """数据集文件目录数据访问层"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.collection = db.dataset_catalog
+
+    async def find_all(self) -> List[Dict]:
+        """读取全部目录条目"""
+        cursor = self.collection.find({}, projection={"_id": 0})
+        return await cursor.to_list(length=None)
+
+    async def apply_changes(self, upserts: List[Dict], removed: List[str]) -> None:
+        """一次批量写入新增/变化的条目并删除已不存在的文件"""
+        operations: List = [
+            ReplaceOne({"fileId": entry["fileId"]}, entry, upsert=True)
+            for entry in upserts
+        ]
+        if removed:
+            operations.append(DeleteMany({"fileId": {"$in": removed}}))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
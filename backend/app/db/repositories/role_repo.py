@@ -1,11 +1,52 @@
 from __future__ import annotations
 
+import copy
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from app.config import settings
+
+
+class RoleCache:
+    """进程内角色缓存（TTL + 显式失效），多进程部署时由TTL兜底一致性"""
+
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def get(self, role_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(role_id)
+        if entry is None:
+            return None
+        expires_at, role = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(role_id, None)
+            return None
+        # 返回副本，避免调用方修改缓存内容
+        return copy.deepcopy(role)
+
+    def set(self, role_id: str, role: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        self._entries[role_id] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(role))
+
+    def invalidate(self, role_id: Optional[str] = None) -> None:
+        if role_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(role_id, None)
+
+
+role_cache = RoleCache(ttl_seconds=settings.ROLE_CACHE_TTL_SECONDS)
+
 
 class RoleRepository:
     """角色数据仓储"""
@@ -19,6 +60,38 @@ class RoleRepository:
         except Exception:
             return None
 
+    async def find_by_id_cached(self, role_id: str) -> Optional[Dict[str, Any]]:
+        """优先读取进程内缓存的角色"""
+        cached = role_cache.get(role_id)
+        if cached is not None:
+            return cached
+
+        role = await self.find_by_id(role_id)
+        if role:
+            role_cache.set(role_id, role)
+        return role
+
+    async def find_by_ids(self, role_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """批量获取角色，缓存未命中部分合并为一次 $in 查询"""
+        roles: Dict[str, Dict[str, Any]] = {}
+        missing: List[ObjectId] = []
+
+        for role_id in set(role_ids):
+            cached = role_cache.get(role_id)
+            if cached is not None:
+                roles[role_id] = cached
+            elif ObjectId.is_valid(role_id):
+                missing.append(ObjectId(role_id))
+
+        if missing:
+            cursor = self.collection.find({"_id": {"$in": missing}})
+            async for role in cursor:
+                role_id = str(role["_id"])
+                role_cache.set(role_id, role)
+                roles[role_id] = role
+
+        return roles
+
     async def find_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         return await self.collection.find_one({"name": name})
 
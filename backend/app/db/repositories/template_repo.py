@@ -3,6 +3,11 @@ from bson import ObjectId
 from typing import List, Dict, Optional
 from datetime import datetime
 
+from app.config import settings
+from app.services.cache_service import cache_backend
+
+# 全局模板列表在共享缓存中的键，写操作后失效；有效期较短，其它worker的进程内缓存也能及时更新
+TEMPLATE_LIST_CACHE_KEY = "templates:global"
 
 class TemplateRepository:
     """模板Repository"""
@@ -13,6 +18,10 @@ class TemplateRepository:
     async def find_all(self) -> List[Dict]:
         """获取所有全局模板列表"""
 
+        cached = await cache_backend.get(TEMPLATE_LIST_CACHE_KEY)
+        if cached is not None:
+            return cached
+
         cursor = self.collection.find({'isGlobal': True}).sort('createdAt', -1)
         templates = await cursor.to_list(length=100)
 
@@ -22,6 +31,8 @@ class TemplateRepository:
             created_by = template.get('createdBy')
             template['createdBy'] = str(created_by) if created_by else None
 
+        if settings.TEMPLATE_CACHE_TTL_SECONDS > 0:
+            await cache_backend.set(TEMPLATE_LIST_CACHE_KEY, templates, ttl=settings.TEMPLATE_CACHE_TTL_SECONDS)
         return templates
 
     async def find_by_id(self, template_id: str) -> Optional[Dict]:
@@ -46,6 +57,7 @@ class TemplateRepository:
         data['updatedAt'] = now
 
         result = await self.collection.insert_one(data)
+        await cache_backend.delete(TEMPLATE_LIST_CACHE_KEY)
         return str(result.inserted_id)
 
     async def update_one(self, template_id: str, updates: Dict) -> bool:
@@ -56,6 +68,7 @@ class TemplateRepository:
                 {'_id': ObjectId(template_id), 'isGlobal': True},
                 {'$set': updates}
             )
+            await cache_backend.delete(TEMPLATE_LIST_CACHE_KEY)
             return result.modified_count > 0
         except Exception as e:
             print(f"Error updating template: {e}")
@@ -65,6 +78,7 @@ class TemplateRepository:
         """删除模板"""
         try:
             result = await self.collection.delete_one({'_id': ObjectId(template_id), 'isGlobal': True})
+            await cache_backend.delete(TEMPLATE_LIST_CACHE_KEY)
             return result.deleted_count > 0
         except Exception as e:
             print(f"Error deleting template: {e}")
@@ -1,6 +1,108 @@
+import inspect
+import numpy as np
+from bson import Binary
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import Dict, Optional, List
+from typing import Dict, Iterable, Optional, List, Set, Tuple
 from datetime import datetime
+
+from app.services.trial_features import FEATURES_VERSION
+
+# 缩略图每条序列存为一个 float32 小端二进制，体积约为 BSON double 数组的 1/4，
+# 且各序列仍可按 thumbnail.<序列> 单独投影
+THUMBNAIL_SERIES = ("timestamps", "raw", "filtered")
+THUMBNAIL_DTYPE = "<f4"
+
+# Trial列表 fields 参数可选的字段组；trialIndex 与 fileId 总会返回
+TRIAL_FIELD_GROUPS: Dict[str, tuple] = {
+    "status": ("finished", "finishedAt"),
+    "summary": ("duration", "sampleRate", "dataPoints"),
+    "thumbnail": ("thumbnail",),
+    "thumbnail.timestamps": ("thumbnail.timestamps",),
+    "thumbnail.raw": ("thumbnail.timestamps", "thumbnail.raw"),
+    "thumbnail.filtered": ("thumbnail.timestamps", "thumbnail.filtered"),
+    # 特征向量 (见 app.services.trial_features)
+    "features": ("features",),
+    # 标注与版本数量不在该集合中，由接口层汇总
+    "counts": (),
+}
+TRIAL_KEY_FIELDS = ("trialIndex", "fileId")
+# 来源标记 (见 H5Service.metadata_stamp)，仅用于过期判断，不返回给前端
+STAMP_FIELDS = ("sourceMtimeNs", "sourceSize", "processingFingerprint", "metadataVersion")
+# 重算时覆盖的字段；完成状态等人工数据保持不变
+COMPUTED_FIELDS = ("duration", "sampleRate", "dataPoints", "thumbnail")
+# 只需状态与数量时，缺失的元数据无需读取H5即可补全
+LIGHTWEIGHT_FIELD_GROUPS = {"status", "counts"}
+
+
+def parse_trial_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """解析逗号分隔的字段组，None 表示返回完整文档"""
+    if fields is None or not fields.strip():
+        return None
+    groups = {item.strip() for item in fields.split(",") if item.strip()}
+    unknown = groups - TRIAL_FIELD_GROUPS.keys()
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(unknown))}; "
+            f"expected any of {', '.join(TRIAL_FIELD_GROUPS)}"
+        )
+    return groups
+
+
+def trial_field_paths(groups: Iterable[str]) -> List[str]:
+    """字段组展开为文档路径，已包含父字段时去掉子路径以免投影冲突"""
+    paths = {path for group in groups for path in TRIAL_FIELD_GROUPS[group]}
+    return sorted(
+        path for path in paths
+        if "." not in path or path.split(".", 1)[0] not in paths
+    )
+
+
+def project_trial_metadata(metadata: Dict, groups: Iterable[str]) -> Dict:
+    """在内存中按字段组裁剪元数据 (用于刚计算出的Trial)"""
+    result = {key: metadata[key] for key in TRIAL_KEY_FIELDS if key in metadata}
+    for path in trial_field_paths(groups):
+        head, _, tail = path.partition(".")
+        if head not in metadata:
+            continue
+        if tail:
+            result.setdefault(head, {})[tail] = (metadata[head] or {}).get(tail)
+        else:
+            result[head] = metadata[head]
+    return result
+
+
+def pack_thumbnail(thumbnail: Optional[Dict]) -> Optional[Dict]:
+    """缩略图序列 (列表或numpy数组) 编码为 float32 二进制"""
+    if not thumbnail:
+        return thumbnail
+    packed: Dict = {"dtype": THUMBNAIL_DTYPE}
+    for name in THUMBNAIL_SERIES:
+        values = thumbnail.get(name)
+        if values is None:
+            continue
+        if isinstance(values, bytes):
+            packed[name] = Binary(values)
+        else:
+            packed[name] = Binary(np.ascontiguousarray(values, dtype=THUMBNAIL_DTYPE).tobytes())
+    return packed
+
+
+def unpack_thumbnail(thumbnail: Optional[Dict]) -> Optional[Dict]:
+    """解码为只读numpy数组 (零拷贝)；兼容尚未迁移的 double 数组"""
+    if not thumbnail:
+        return thumbnail
+    dtype = thumbnail.get("dtype", THUMBNAIL_DTYPE)
+    result: Dict = {}
+    for name in THUMBNAIL_SERIES:
+        values = thumbnail.get(name)
+        if values is None:
+            continue
+        if isinstance(values, bytes):
+            result[name] = np.frombuffer(values, dtype=dtype)
+        else:
+            result[name] = np.asarray(values, dtype=np.float64)
+    return result
+
 
 class TrialMetadataRepository:
     """Trial元数据数据访问层"""
@@ -10,30 +112,213 @@ class TrialMetadataRepository:
 
     async def find_one(self, file_id: str, trial_index: int) -> Optional[Dict]:
         """查找单个Trial元数据"""
-        return await self.collection.find_one({
+        return self._decode(await self.collection.find_one({
             "fileId": file_id,
             "trialIndex": trial_index
-        })
+        }))
 
     async def insert_one(self, metadata: Dict) -> str:
         """插入Trial元数据"""
         metadata['createdAt'] = datetime.utcnow()
+        if 'thumbnail' in metadata:
+            metadata['thumbnail'] = pack_thumbnail(metadata['thumbnail'])
         result = await self.collection.insert_one(metadata)
         return str(result.inserted_id)
 
     async def update_one(self, file_id: str, trial_index: int, metadata: Dict) -> bool:
         """更新Trial元数据"""
         metadata['updatedAt'] = datetime.utcnow()
+        if 'thumbnail' in metadata:
+            metadata['thumbnail'] = pack_thumbnail(metadata['thumbnail'])
         result = await self.collection.update_one(
             {"fileId": file_id, "trialIndex": trial_index},
             {"$set": metadata}
         )
         return result.modified_count > 0
 
-    async def find_by_file(self, file_id: str) -> list:
-        """查找文件的所有Trial元数据"""
-        cursor = self.collection.find({"fileId": file_id}).sort("trialIndex", 1)
-        return await cursor.to_list(length=None)
+    async def find_by_file(
+        self,
+        file_id: str,
+        *,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        fields: Optional[Set[str]] = None,
+    ) -> list:
+        """按 trialIndex 顺序查找文件的Trial元数据
+
+        offset/limit 作用于 trialIndex 区间 [offset, offset + limit)，缺失元数据的Trial不占位；
+        fields 为字段组集合，指定时仅投影所需字段并去掉 _id。
+        """
+        query: Dict = {"fileId": file_id}
+        if offset or limit is not None:
+            index_range: Dict = {"$gte": offset}
+            if limit is not None:
+                index_range["$lt"] = offset + limit
+            query["trialIndex"] = index_range
+
+        projection = None
+        if fields is not None:
+            projection = {"_id": 0, **{key: 1 for key in TRIAL_KEY_FIELDS}}
+            projection.update({path: 1 for path in trial_field_paths(fields)})
+
+        cursor = self.collection.find(query, projection).sort("trialIndex", 1)
+        return [self._decode(item) async for item in cursor]
+
+    async def find_ranked(
+        self,
+        file_id: str,
+        sort: Optional[Tuple[str, int]],
+        filters: Dict,
+        *,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        fields: Optional[Set[str]] = None,
+    ) -> List[Dict]:
+        """按特征排序与筛选 (依赖 (fileId, 特征, trialIndex) 索引)，offset/limit 作用于排序后的结果
+
+        只包含已计算特征的Trial；同值时按 trialIndex 与排序方向一致的顺序排列。
+        """
+        path, direction = sort or ("trialIndex", 1)
+        projection = None
+        if fields is not None:
+            projection = {"_id": 0, **{key: 1 for key in TRIAL_KEY_FIELDS}}
+            projection.update({field_path: 1 for field_path in trial_field_paths(fields)})
+
+        cursor = self.collection.find(self._ranked_query(file_id, filters), projection).sort(
+            [(path, direction), ("trialIndex", direction)]
+        ).skip(offset)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return [self._decode(item) async for item in cursor]
+
+    async def count_ranked(self, file_id: str, filters: Dict) -> int:
+        """满足筛选条件 (且已计算特征) 的Trial数量"""
+        return int(await self.collection.count_documents(self._ranked_query(file_id, filters)))
+
+    async def find_unranked_indices(self, file_id: str, trial_count: int) -> List[int]:
+        """尚无特征 (含尚无元数据文档) 的Trial序号，按 trialIndex 升序；只读取 (fileId, trialIndex)"""
+        cursor = self.collection.find(
+            {"fileId": file_id, "features": {"$exists": True}},
+            projection={"_id": 0, "trialIndex": 1},
+        )
+        ranked = {int(item["trialIndex"]) async for item in cursor}
+        return [index for index in range(trial_count) if index not in ranked]
+
+    @staticmethod
+    def _ranked_query(file_id: str, filters: Dict) -> Dict:
+        return {"fileId": file_id, "features": {"$exists": True}, **filters}
+
+    async def find_many(self, file_id: str, trial_indices: List[int]) -> Dict[int, Dict]:
+        """批量读取已缓存的Trial元数据，返回 trialIndex -> 元数据"""
+        if not trial_indices:
+            return {}
+        cursor = self.collection.find({"fileId": file_id, "trialIndex": {"$in": trial_indices}})
+        found: Dict[int, Dict] = {}
+        async for item in cursor:
+            found[int(item["trialIndex"])] = self.normalize_metadata(self._decode(item))
+        return found
+
+    async def find_stale_indices(
+        self,
+        file_id: str,
+        stamp: Dict,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> List[int]:
+        """来源标记与当前不一致的Trial序号 (未标记的旧文档同样视为过期)"""
+        query: Dict = {
+            "fileId": file_id,
+            "$or": [{field: {"$ne": stamp[field]}} for field in STAMP_FIELDS],
+        }
+        if start or end is not None:
+            index_range: Dict = {"$gte": start}
+            if end is not None:
+                index_range["$lt"] = end
+            query["trialIndex"] = index_range
+        cursor = self.collection.find(query, projection={"_id": 0, "trialIndex": 1}).sort("trialIndex", 1)
+        return [int(item["trialIndex"]) async for item in cursor]
+
+    async def refresh(self, file_id: str, trial_index: int, metadata: Dict, stamp: Dict) -> bool:
+        """用重新计算的结果覆盖过期字段并更新来源标记；特征标记为待重算 (旧值在重算前照常参与排序)"""
+        updates = {field: metadata[field] for field in COMPUTED_FIELDS if field in metadata}
+        if 'thumbnail' in updates:
+            updates['thumbnail'] = pack_thumbnail(updates['thumbnail'])
+        updates.update({field: stamp[field] for field in STAMP_FIELDS})
+        updates['updatedAt'] = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"fileId": file_id, "trialIndex": trial_index},
+            {"$set": updates, "$unset": {"featuresVersion": ""}},
+        )
+        return result.modified_count > 0
+
+    async def find_feature_pending(self, file_id: str) -> List[int]:
+        """尚未计算特征、特征算法已更新或元数据重算后的Trial序号"""
+        cursor = self.collection.find(
+            {"fileId": file_id, "featuresVersion": {"$ne": FEATURES_VERSION}},
+            projection={"_id": 0, "trialIndex": 1},
+        ).sort("trialIndex", 1)
+        return [int(item["trialIndex"]) async for item in cursor]
+
+    async def set_features(self, file_id: str, trial_index: int, features: Dict) -> bool:
+        """写入后台计算的特征向量"""
+        result = await self.collection.update_one(
+            {"fileId": file_id, "trialIndex": trial_index},
+            {"$set": {"features": features, "featuresVersion": FEATURES_VERSION, "updatedAt": datetime.utcnow()}},
+        )
+        return result.modified_count > 0
+
+    async def delete_beyond(self, file_id: str, trial_count: int) -> int:
+        """删除超出当前Trial数量的元数据 (文件被替换为更少的Trial)"""
+        result = await self.collection.delete_many({"fileId": file_id, "trialIndex": {"$gte": trial_count}})
+        return result.deleted_count
+
+    async def get_trial_lengths(self, file_id: str, trial_indices: List[int]) -> Dict[int, Dict]:
+        """批量读取Trial的采样点数与采样率 (仅投影所需字段)"""
+        if not trial_indices:
+            return {}
+        cursor = self.collection.find(
+            {"fileId": file_id, "trialIndex": {"$in": trial_indices}},
+            projection={"_id": 0, "trialIndex": 1, "dataPoints": 1, "sampleRate": 1},
+        )
+        lengths: Dict[int, Dict] = {}
+        async for item in cursor:
+            lengths[int(item["trialIndex"])] = {
+                "dataPoints": int(item.get("dataPoints", 0)),
+                "sampleRate": item.get("sampleRate"),
+            }
+        return lengths
+
+    async def get_file_state(self, file_id: str) -> Dict:
+        """文件下元数据的变更摘要 (数量、完成数、最近更新时间)，用于生成ETag"""
+        cursor = self.collection.aggregate([
+            {"$match": {"fileId": file_id}},
+            {
+                "$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "finished": {"$sum": {"$cond": [{"$eq": ["$finished", True]}, 1, 0]}},
+                    "lastUpdated": {"$max": {"$ifNull": ["$updatedAt", "$createdAt"]}},
+                }
+            },
+        ])
+        items = await cursor.to_list(length=1)
+        if not items:
+            return {"count": 0, "finished": 0, "lastUpdated": None}
+        items[0].pop("_id", None)
+        return items[0]
+
+    async def max_data_points(self, file_id: str) -> Optional[int]:
+        """文件内最长Trial的采样点数 (用于内存预估)"""
+        cursor = (
+            self.collection
+            .find({"fileId": file_id}, projection={"_id": 0, "dataPoints": 1})
+            .sort("dataPoints", -1)
+            .limit(1)
+        )
+        items = await cursor.to_list(length=1)
+        if not items or items[0].get("dataPoints") is None:
+            return None
+        return int(items[0]["dataPoints"])
 
     async def delete_by_file(self, file_id: str) -> int:
         """删除文件的所有Trial元数据"""
@@ -44,35 +329,52 @@ class TrialMetadataRepository:
         self,
         file_id: str,
         trial_index: int,
-        create_func
+        create_func,
+        stamp: Optional[Dict] = None
     ) -> Dict:
-        """查找或创建Trial元数据 (缓存模式)"""
+        """查找或创建Trial元数据 (缓存模式)，新建时写入来源标记"""
         # 先查询MongoDB
         metadata = await self.find_one(file_id, trial_index)
 
         if metadata:
-            # 确保存在finished字段
-            if 'finished' not in metadata:
-                metadata['finished'] = False
-            if 'finishedAt' not in metadata:
-                metadata['finishedAt'] = None
-
-            # 移除MongoDB的_id字段和其他不需要的字段
-            metadata.pop('_id', None)
-            metadata.pop('createdAt', None)
-            metadata.pop('updatedAt', None)
-            return metadata
+            return self.normalize_metadata(metadata)
 
         # 如果不存在，调用create_func生成
-        metadata = create_func()  # create_func是同步函数，不需要await
+        metadata = create_func()
+        if inspect.isawaitable(metadata):
+            metadata = await metadata
         metadata['fileId'] = file_id
         metadata['trialIndex'] = trial_index
         metadata['finished'] = False
         metadata['finishedAt'] = None
 
-        # 插入MongoDB
-        await self.insert_one(metadata.copy())  # 使用copy避免修改原数据
+        # 插入MongoDB (使用副本避免修改原数据)
+        await self.insert_one({**metadata, **(stamp or {})})
+
+        return metadata
+
+    @staticmethod
+    def _decode(metadata: Optional[Dict]) -> Optional[Dict]:
+        if metadata and metadata.get('thumbnail'):
+            metadata['thumbnail'] = unpack_thumbnail(metadata['thumbnail'])
+        return metadata
+
+    @staticmethod
+    def normalize_metadata(metadata: Dict) -> Dict:
+        """补全完成状态字段并移除不返回给前端的字段"""
+        # 确保存在finished字段
+        if 'finished' not in metadata:
+            metadata['finished'] = False
+        if 'finishedAt' not in metadata:
+            metadata['finishedAt'] = None
 
+        # 移除MongoDB的_id字段和其他不需要的字段
+        metadata.pop('_id', None)
+        metadata.pop('createdAt', None)
+        metadata.pop('updatedAt', None)
+        for field in STAMP_FIELDS:
+            metadata.pop(field, None)
+        metadata.pop('featuresVersion', None)
         return metadata
 
     async def count_status_by_file(self, file_id: str) -> Dict[str, int]:
@@ -3,10 +3,11 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
-import bcrypt
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from app.services.password_service import password_hasher
+
 
 class UserRepository:
     """用户数据仓储"""
@@ -43,10 +44,7 @@ class UserRepository:
             key: value for key, value in user_data.items() if value is not None
         }
 
-        user_data["password_hash"] = bcrypt.hashpw(
-            password.encode(),
-            bcrypt.gensalt(),
-        ).decode()
+        user_data["password_hash"] = await password_hasher.hash(password)
 
         now = datetime.utcnow()
         user_data["created_at"] = now
@@ -76,10 +74,24 @@ class UserRepository:
         user = await self.find_by_username(username)
         if not user:
             return False
-        return bcrypt.checkpw(
-            password.encode(),
-            user["password_hash"].encode(),
-        )
+        return await self.verify_user_password(user, password)
+
+    async def verify_user_password(self, user: Dict[str, Any], password: str) -> bool:
+        """校验已查询到的用户密码，成本配置变化时透明地重新哈希"""
+        password_hash = user.get("password_hash")
+        if not password_hash:
+            return False
+        if not await password_hasher.verify(password, password_hash):
+            return False
+
+        if password_hasher.needs_rehash(password_hash):
+            new_hash = await password_hasher.hash(password)
+            await self.collection.update_one(
+                {"_id": user["_id"], "password_hash": password_hash},
+                {"$set": {"password_hash": new_hash}},
+            )
+            user["password_hash"] = new_hash
+        return True
 
     async def update_last_login(self, user_id: str) -> bool:
         result = await self.collection.update_one(
@@ -108,11 +120,56 @@ class UserRepository:
         users = await cursor.to_list(length=page_size)
         return total, users
 
+    async def list_with_roles(
+        self,
+        page: int = 1,
+        page_size: int = 20,
+        role: Optional[str] = None,
+        is_active: Optional[bool] = None,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """分页查询用户，并通过 $lookup 在同一次查询中关联角色"""
+        query: Dict[str, Any] = {"is_deleted": False}
+        if role:
+            query["role_id"] = role
+        if is_active is not None:
+            query["is_active"] = is_active
+
+        total = await self.collection.count_documents(query)
+        skip = (page - 1) * page_size
+
+        pipeline = [
+            {"$match": query},
+            {"$skip": skip},
+            {"$limit": page_size},
+            {
+                "$lookup": {
+                    "from": "roles",
+                    "let": {
+                        "roleId": {
+                            "$convert": {
+                                "input": "$role_id",
+                                "to": "objectId",
+                                "onError": None,
+                                "onNull": None,
+                            }
+                        }
+                    },
+                    "pipeline": [
+                        {"$match": {"$expr": {"$eq": ["$_id", "$$roleId"]}}},
+                        {"$project": {"name": 1, "display_name": 1}},
+                    ],
+                    "as": "role_docs",
+                }
+            },
+            {"$project": {"password_hash": 0}},
+        ]
+
+        cursor = self.collection.aggregate(pipeline)
+        users = await cursor.to_list(length=page_size)
+        return total, users
+
     async def change_password(self, user_id: str, new_password: str) -> bool:
-        password_hash = bcrypt.hashpw(
-            new_password.encode(),
-            bcrypt.gensalt(),
-        ).decode()
+        password_hash = await password_hasher.hash(new_password)
 
         result = await self.collection.update_one(
             {"_id": ObjectId(user_id)},
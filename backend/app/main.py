@@ -3,12 +3,23 @@ from __future__ import annotations
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api import annotations, auth, files, roles, templates, users
+from app.api import annotations, auth, files, roles, system, templates, users
 from app.config import settings
 from app.db.mongodb import close_mongo_connection, connect_to_mongo
-from app.middleware.auth import AuthMiddleware
+from app.middleware import AuthMiddleware, CompressionMiddleware
+from app.services import h5_service
+from app.services.cache_service import cache_backend
+from app.services.dataset_catalog_service import dataset_catalog
+from app.services.metadata_revalidation_service import metadata_revalidator
+from app.services.password_service import password_hasher
+from app.utils.responses import ORJSONResponse
+
+app = FastAPI(
+    title="Waveform Annotation System",
+    default_response_class=ORJSONResponse,
+)
 
-app = FastAPI(title="Waveform Annotation System")
+app.add_middleware(CompressionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,7 +32,13 @@ app.add_middleware(
 app.add_middleware(AuthMiddleware)
 
 app.add_event_handler("startup", connect_to_mongo)
+app.add_event_handler("startup", dataset_catalog.start)
 app.add_event_handler("shutdown", close_mongo_connection)
+app.add_event_handler("shutdown", password_hasher.shutdown)
+app.add_event_handler("shutdown", cache_backend.close)
+app.add_event_handler("shutdown", h5_service.shutdown)
+app.add_event_handler("shutdown", metadata_revalidator.shutdown)
+app.add_event_handler("shutdown", dataset_catalog.shutdown)
 
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -29,6 +46,7 @@ app.include_router(roles.router)
 app.include_router(files.router)
 app.include_router(annotations.router)
 app.include_router(templates.router)
+app.include_router(system.router)
 
 
 @app.get("/")
@@ -1,4 +1,5 @@
 """中间件模块"""
-from .auth import AuthMiddleware
+from .auth import AuthMiddleware, TokenCache
+from .compression import CompressionMiddleware
 
-__all__ = ["AuthMiddleware"]
+__all__ = ["AuthMiddleware", "CompressionMiddleware", "TokenCache"]
@@ -1,15 +1,55 @@
 from __future__ import annotations
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from app.config import settings
 from app.services.auth_service import AuthService
 
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    """JWT认证中间件"""
+class TokenCache:
+    """已验签令牌的LRU缓存，按令牌自身的 exp 过期"""
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        expires_at, claims = entry
+        if expires_at <= time.time():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return claims
+
+    def set(self, token: str, claims: Dict[str, Any]) -> None:
+        if self.maxsize <= 0:
+            return
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)):
+            return
+        self._entries[token] = (float(exp), claims)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class AuthMiddleware:
+    """JWT认证中间件（纯ASGI实现）"""
 
     EXCLUDE_PATHS = [
         "/",
@@ -19,33 +59,67 @@ class AuthMiddleware(BaseHTTPMiddleware):
         "/api/auth/login",
         "/api/auth/register",
     ]
+    EXCLUDE_PREFIXES = ["/docs"]
 
-    async def dispatch(self, request: Request, call_next):  # type: ignore[override]
-        if request.url.path in self.EXCLUDE_PATHS or request.url.path.startswith("/docs"):
-            return await call_next(request)
-
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            return JSONResponse(status_code=401, content={"detail": "未提供认证令牌"})
-
-        token = auth_header.split(" ")[1]
-        auth_service = AuthService(
+    def __init__(self, app: ASGIApp, token_cache_size: Optional[int] = None) -> None:
+        self.app = app
+        self.auth_service = AuthService(
             secret_key=settings.JWT_SECRET_KEY,
             algorithm=settings.JWT_ALGORITHM,
             expiration_days=settings.JWT_EXPIRATION_DAYS,
         )
+        self.token_cache = TokenCache(
+            settings.AUTH_TOKEN_CACHE_SIZE if token_cache_size is None else token_cache_size
+        )
+        # 启动时预编译免认证路径
+        self._exclude_pattern = re.compile(
+            "^(?:"
+            + "|".join(re.escape(path) for path in self.EXCLUDE_PATHS)
+            + ("|" if self.EXCLUDE_PREFIXES else "")
+            + "|".join(re.escape(prefix) + ".*" for prefix in self.EXCLUDE_PREFIXES)
+            + ")$"
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._exclude_pattern.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        auth_header = self._get_authorization(scope)
+        if not auth_header or not auth_header.startswith("Bearer "):
+            response = JSONResponse(status_code=401, content={"detail": "未提供认证令牌"})
+            await response(scope, receive, send)
+            return
+
+        token = auth_header.split(" ")[1]
+        payload = self.token_cache.get(token)
+        if payload is None:
+            payload = self.auth_service.verify_token(token)
+            if payload:
+                self.token_cache.set(token, payload)
 
-        payload = auth_service.verify_token(token)
         if not payload:
-            return JSONResponse(status_code=401, content={"detail": "令牌无效或已过期"})
+            response = JSONResponse(status_code=401, content={"detail": "令牌无效或已过期"})
+            await response(scope, receive, send)
+            return
+
+        # 与 request.state 共享同一字典
+        state = scope.setdefault("state", {})
+        state["user_id"] = payload["sub"]
+        state["username"] = payload["username"]
+        state["role_id"] = payload["role_id"]
+        state["role_name"] = payload["role_name"]
+        state["permissions"] = payload["permissions"]
+        state["permission_mask"] = payload["permission_mask"]
 
-        request.state.user_id = payload["sub"]
-        request.state.username = payload["username"]
-        request.state.role_id = payload["role_id"]
-        request.state.role_name = payload["role_name"]
-        request.state.permissions = payload["permissions"]
+        await self.app(scope, receive, send)
 
-        return await call_next(request)
+    @staticmethod
+    def _get_authorization(scope: Scope) -> Optional[str]:
+        for key, value in scope.get("headers", ()):
+            if key == b"authorization":
+                return value.decode("latin-1")
+        return None
 
 
-__all__ = ["AuthMiddleware"]
+__all__ = ["AuthMiddleware", "TokenCache"]
@@ -0,0 +1,199 @@
+"""按 Accept-Encoding 协商的响应压缩（brotli 优先，gzip 兜底）"""
+
+from __future__ import annotations
+
+import asyncio
+import zlib
+from typing import Dict, List, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+try:  # brotli 为可选依赖，未安装时只提供 gzip
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "image/svg+xml",
+)
+
+
+def available_encodings() -> List[str]:
+    """服务端偏好顺序"""
+
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: str, supported: Sequence[str]) -> Optional[str]:
+    """按 q 值选择编码，q 相同时按服务端偏好顺序"""
+
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        token, _, params = item.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[token] = q
+
+    best: Optional[str] = None
+    best_q = 0.0
+    for encoding in supported:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Encoder:
+    """统一 gzip 与 brotli 的流式压缩接口"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        """压缩并刷新，保证流式响应的每块能被客户端立即解出"""
+
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.finish()
+        return self._gz.compress(data) + self._gz.flush()
+
+
+class CompressionMiddleware:
+    """纯ASGI压缩中间件；小于阈值或已编码的响应原样返回"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: Optional[int] = None,
+        thread_min_size: Optional[int] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None,
+    ) -> None:
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.thread_min_size = (
+            settings.COMPRESSION_THREAD_MIN_SIZE if thread_min_size is None else thread_min_size
+        )
+        self.gzip_level = settings.GZIP_COMPRESS_LEVEL if gzip_level is None else gzip_level
+        self.brotli_quality = settings.BROTLI_QUALITY if brotli_quality is None else brotli_quality
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", ""),
+            self.encodings,
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.encoder: Optional[_Encoder] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                "content-encoding" in headers
+                or message["status"] in (204, 304)
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                self.passthrough = True
+                await self.downstream(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is not None:
+            data = self.encoder.chunk(body) if more_body else self.encoder.finish(body)
+            await self.downstream({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        if not more_body:
+            await self._send_complete(body)
+            return
+
+        # 流式响应：去掉 Content-Length，逐块压缩并刷新
+        self.encoder = self._create_encoder()
+        headers = self._encoded_headers()
+        del headers["Content-Length"]
+        await self.downstream(self.start_message)
+        await self.downstream(
+            {"type": "http.response.body", "body": self.encoder.chunk(body), "more_body": True}
+        )
+
+    async def _send_complete(self, body: bytes) -> None:
+        if len(body) >= self.middleware.minimum_size:
+            encoder = self._create_encoder()
+            if len(body) >= self.middleware.thread_min_size:
+                compressed = await asyncio.to_thread(encoder.finish, body)
+            else:
+                compressed = encoder.finish(body)
+            if len(compressed) < len(body):
+                headers = self._encoded_headers()
+                headers["Content-Length"] = str(len(compressed))
+                body = compressed
+
+        await self.downstream(self.start_message)
+        await self.downstream({"type": "http.response.body", "body": body})
+
+    def _create_encoder(self) -> _Encoder:
+        return _Encoder(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+
+    def _encoded_headers(self) -> MutableHeaders:
+        headers = MutableHeaders(scope=self.start_message)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        # 压缩后的表示与原始字节不同，强ETag降为弱ETag；If-None-Match 按弱比较仍能命中
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        return headers
@@ -0,0 +1,205 @@
+"""重型接口的准入控制：按接口限制并发、有界排队，并按内存预估做整体预算"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.config import settings
+
+# 单个采样点在完整波形请求中的峰值内存：原始/时间戳/滤波等 float64 副本
+# 加上 orjson 输出的 JSON 文本（时间戳输出两次）
+WAVEFORM_BYTES_PER_SAMPLE = 112
+# timestamps=compact 时既不展开时间戳数组，也不输出两份时间戳 JSON
+WAVEFORM_COMPACT_BYTES_PER_SAMPLE = 64
+# 生成Trial缩略图时只保留 numpy 中间结果
+METADATA_BYTES_PER_SAMPLE = 64
+
+
+def metadata_cost_bytes(samples: int) -> int:
+    """缩略图生成的内存预估；超长Trial走分块预处理，只按分块大小计"""
+    if samples >= settings.STREAMING_PREPROCESS_MIN_SAMPLES:
+        samples = settings.PREPROCESS_CHUNK_SAMPLES
+    return samples * METADATA_BYTES_PER_SAMPLE
+
+
+def derived_cost_bytes(samples: int) -> int:
+    """生成派生数据 (瓦片所需的滤波信号与金字塔) 的内存预估；超长Trial只按分块大小计"""
+    if samples >= settings.STREAMING_PREPROCESS_MIN_SAMPLES:
+        samples = settings.PREPROCESS_CHUNK_SAMPLES
+    return samples * WAVEFORM_COMPACT_BYTES_PER_SAMPLE
+
+
+class AdmissionRejected(HTTPException):
+    """排队已满或等待超时，返回 503 并提示重试时间"""
+
+    def __init__(self, lane: str, retry_after: int) -> None:
+        super().__init__(
+            status_code=503,
+            detail=f"服务繁忙 ({lane})，请稍后重试",
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class AdmissionLane:
+    """单个接口的并发通道"""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int) -> None:
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.active = 0
+        self.waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        self.admitted = 0
+        self.rejected = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": len(self.waiters),
+            "maxConcurrency": self.max_concurrency,
+            "maxQueue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionTicket:
+    """已获准入的额度；release 可重复调用，流式响应可在生成器结束与响应完成时各归还一次"""
+
+    def __init__(self, controller: "AdmissionController", lane: AdmissionLane, cost: int) -> None:
+        self.controller = controller
+        self.lane = lane
+        self.cost = cost
+        self.released = False
+
+    def release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        self.controller._release(self.lane, self.cost)
+
+
+class AdmissionController:
+    """各通道共享同一内存预算；未注册通道的轻量接口不受影响"""
+
+    def __init__(self, memory_budget_bytes: int, max_wait: float, retry_after: int) -> None:
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.used_bytes = 0
+        self.lanes: Dict[str, AdmissionLane] = {}
+
+    def add_lane(self, name: str, max_concurrency: int, max_queue: int) -> AdmissionLane:
+        lane = AdmissionLane(name, max_concurrency, max_queue)
+        self.lanes[name] = lane
+        return lane
+
+    @asynccontextmanager
+    async def admit(self, lane_name: str, cost_bytes: int = 0) -> AsyncIterator[None]:
+        ticket = await self.acquire(lane_name, cost_bytes)
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    async def acquire(self, lane_name: str, cost_bytes: int = 0) -> AdmissionTicket:
+        """获取准入额度，由调用方归还；用于在返回流式响应前准入 (繁忙时仍可返回 503)"""
+        lane = self.lanes[lane_name]
+        cost = max(0, int(cost_bytes))
+        await self._acquire(lane, cost)
+        return AdmissionTicket(self, lane, cost)
+
+    def _fits(self, lane: AdmissionLane, cost: int) -> bool:
+        if lane.active >= lane.max_concurrency:
+            return False
+        # 没有任务运行时总允许一个请求通过，避免超大Trial永远无法处理
+        nothing_running = all(item.active == 0 for item in self.lanes.values())
+        return nothing_running or self.used_bytes + cost <= self.memory_budget_bytes
+
+    def _grant(self, lane: AdmissionLane, cost: int) -> None:
+        lane.active += 1
+        lane.admitted += 1
+        self.used_bytes += cost
+
+    async def _acquire(self, lane: AdmissionLane, cost: int) -> None:
+        if not lane.waiters and self._fits(lane, cost):
+            self._grant(lane, cost)
+            return
+
+        if len(lane.waiters) >= lane.max_queue:
+            lane.rejected += 1
+            raise AdmissionRejected(lane.name, self.retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (cost, future)
+        lane.waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if future.done() and not future.cancelled():
+                # 超时与放行同时发生：归还已分配的额度
+                self._release(lane, cost)
+            else:
+                future.cancel()
+                try:
+                    lane.waiters.remove(entry)
+                except ValueError:
+                    pass
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            lane.rejected += 1
+            raise AdmissionRejected(lane.name, self.retry_after) from None
+
+    def _release(self, lane: AdmissionLane, cost: int) -> None:
+        lane.active -= 1
+        self.used_bytes -= cost
+        self._wake()
+
+    def _wake(self) -> None:
+        for lane in self.lanes.values():
+            while lane.waiters:
+                cost, future = lane.waiters[0]
+                if future.done():
+                    lane.waiters.popleft()
+                    continue
+                if not self._fits(lane, cost):
+                    break
+                lane.waiters.popleft()
+                self._grant(lane, cost)
+                future.set_result(True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memoryBudgetBytes": self.memory_budget_bytes,
+            "memoryInUseBytes": self.used_bytes,
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+        }
+
+
+def create_admission_controller(
+    *,
+    memory_budget_bytes: Optional[int] = None,
+) -> AdmissionController:
+    controller = AdmissionController(
+        memory_budget_bytes=(
+            memory_budget_bytes
+            if memory_budget_bytes is not None
+            else settings.ADMISSION_MEMORY_BUDGET_MB * 1024 * 1024
+        ),
+        max_wait=settings.ADMISSION_MAX_WAIT_SECONDS,
+        retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS,
+    )
+    controller.add_lane("waveform", settings.WAVEFORM_MAX_CONCURRENCY, settings.ADMISSION_QUEUE_SIZE)
+    controller.add_lane("trials", settings.TRIALS_MAX_CONCURRENCY, settings.ADMISSION_QUEUE_SIZE)
+    return controller
+
+
+# 创建全局实例
+admission_controller = create_admission_controller()
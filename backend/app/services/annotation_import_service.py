@@ -0,0 +1,429 @@
+"""标注批量导入服务 (CSV / JSONL)"""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.db.repositories.annotation_repo import AnnotationRepository
+from app.db.repositories.annotation_version_repo import AnnotationVersionRepository
+from app.db.repositories.trial_metadata_repo import TrialMetadataRepository
+from app.services.h5_service import h5_service
+
+SUPPORTED_FORMATS = ("csv", "jsonl")
+IMPORT_MODES = ("replace", "append")
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+MAX_TRACKED_JOBS = 50
+
+TrialKey = Tuple[str, int]
+
+
+class AnnotationImportJob:
+    """导入任务状态，供进度查询接口读取"""
+
+    def __init__(self, *, file_name: str, template_id: str, user_id: str, mode: str) -> None:
+        self.id = uuid.uuid4().hex
+        self.file_name = file_name
+        self.template_id = template_id
+        self.user_id = user_id
+        self.mode = mode
+        self.status = "pending"
+        self.processed_rows = 0
+        self.inserted_segments = 0
+        self.skipped_rows = 0
+        self.version_count = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.message: Optional[str] = None
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+
+    def add_error(self, line: int, message: str) -> None:
+        self.skipped_rows += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "message": message})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "jobId": self.id,
+            "fileName": self.file_name,
+            "templateId": self.template_id,
+            "mode": self.mode,
+            "status": self.status,
+            "processedRows": self.processed_rows,
+            "insertedSegments": self.inserted_segments,
+            "skippedRows": self.skipped_rows,
+            "versionCount": self.version_count,
+            "errors": self.errors,
+            "message": self.message,
+            "createdAt": self.created_at.isoformat(),
+            "finishedAt": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class AnnotationImportJobRegistry:
+    """进程内导入任务登记表，仅保留最近的任务"""
+
+    def __init__(self, max_jobs: int = MAX_TRACKED_JOBS) -> None:
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, AnnotationImportJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def create(self, **kwargs: Any) -> AnnotationImportJob:
+        job = AnnotationImportJob(**kwargs)
+        self._jobs[job.id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[AnnotationImportJob]:
+        return self._jobs.get(job_id)
+
+    def start(self, job: AnnotationImportJob, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+
+    def _prune(self) -> None:
+        if len(self._jobs) <= self.max_jobs:
+            return
+        finished = [
+            job for job in self._jobs.values()
+            if job.status in ("completed", "failed")
+        ]
+        finished.sort(key=lambda job: job.created_at)
+        for job in finished[: len(self._jobs) - self.max_jobs]:
+            self._jobs.pop(job.id, None)
+
+
+def detect_format(file_name: str, fmt: Optional[str] = None) -> str:
+    """根据显式参数或扩展名确定导入格式"""
+
+    if fmt:
+        fmt = fmt.lower()
+    else:
+        suffix = Path(file_name).suffix.lower().lstrip(".")
+        fmt = "jsonl" if suffix in ("jsonl", "ndjson") else suffix
+
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f"不支持的导入格式: {fmt}，仅支持 {', '.join(SUPPORTED_FORMATS)}")
+    return fmt
+
+
+def iter_rows(path: str, fmt: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """逐行读取导入文件，返回 (行号, 原始记录)"""
+
+    with open(path, "r", encoding="utf-8-sig", newline="") as handle:
+        if fmt == "csv":
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+
+        for line_no, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_no, {"__error__": f"JSON解析失败: {exc.msg}"}
+                continue
+            if not isinstance(record, dict):
+                yield line_no, {"__error__": "每行必须是JSON对象"}
+                continue
+            yield line_no, record
+
+
+def _optional(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _as_int(record: Dict[str, Any], field: str, *, required: bool = True) -> Optional[int]:
+    value = _optional(record.get(field))
+    if value is None:
+        if required:
+            raise ValueError(f"缺少字段 {field}")
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"字段 {field} 不是有效整数: {value}") from None
+    if not number.is_integer():
+        raise ValueError(f"字段 {field} 不是有效整数: {value}")
+    return int(number)
+
+
+def _as_float(record: Dict[str, Any], field: str) -> Optional[float]:
+    value = _optional(record.get(field))
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"字段 {field} 不是有效数值: {value}") from None
+
+
+def build_phase_index(template: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """模板阶段索引，同时支持按 id 与名称匹配"""
+
+    index: Dict[str, Dict[str, Any]] = {}
+    for phase in template.get("phases", []):
+        index.setdefault(phase["id"], phase)
+    for phase in template.get("phases", []):
+        index.setdefault(phase["name"], phase)
+    return index
+
+
+def normalize_row(record: Dict[str, Any], phase_index: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """校验单行记录的字段与阶段，返回待写入的标注片段 (长度校验另行进行)"""
+
+    if "__error__" in record:
+        raise ValueError(record["__error__"])
+
+    file_id = _optional(record.get("fileId"))
+    if not file_id:
+        raise ValueError("缺少字段 fileId")
+
+    trial_index = _as_int(record, "trialIndex")
+    start_index = _as_int(record, "startIndex")
+    end_index = _as_int(record, "endIndex")
+    if trial_index < 0:
+        raise ValueError(f"trialIndex 不能为负: {trial_index}")
+    if start_index < 0 or end_index < start_index:
+        raise ValueError(f"无效的索引区间: [{start_index}, {end_index}]")
+
+    phase_key = _optional(record.get("phaseId")) or _optional(record.get("phaseName"))
+    if not phase_key:
+        raise ValueError("缺少字段 phaseId")
+    phase = phase_index.get(str(phase_key))
+    if phase is None:
+        raise ValueError(f"阶段 {phase_key} 不属于所选模板")
+
+    start_time = _as_float(record, "startTime")
+    end_time = _as_float(record, "endTime")
+    if start_time is not None and end_time is not None and end_time < start_time:
+        raise ValueError(f"无效的时间区间: [{start_time}, {end_time}]")
+
+    return {
+        "fileId": str(file_id),
+        "trialIndex": trial_index,
+        "phaseId": phase["id"],
+        "phaseName": _optional(record.get("phaseName")) or phase["name"],
+        "startTime": start_time,
+        "endTime": end_time,
+        "startIndex": start_index,
+        "endIndex": end_index,
+        "eventIndex": _as_int(record, "eventIndex", required=False) or 0,
+        "color": _optional(record.get("color")) or phase.get("color"),
+        "label": _optional(record.get("label")),
+    }
+
+
+class AnnotationImporter:
+    """按批次校验并写入导入的标注，避免逐文档往返"""
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        *,
+        template: Dict[str, Any],
+        user_id: str,
+        username: Optional[str],
+        mode: str = "replace",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        data_root: Optional[Path] = None,
+    ) -> None:
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"不支持的导入模式: {mode}")
+
+        self.annotation_repo = AnnotationRepository(db)
+        self.version_repo = AnnotationVersionRepository(db)
+        self.metadata_repo = TrialMetadataRepository(db)
+        self.phase_index = build_phase_index(template)
+        self.user_id = user_id
+        self.username = username
+        self.mode = mode
+        self.batch_size = max(1, int(batch_size))
+        self.data_root = Path(data_root or h5_service.data_root)
+
+        # (fileId, trialIndex) -> {"dataPoints", "sampleRate"}；None 表示Trial不存在
+        self._trial_info: Dict[TrialKey, Optional[Dict[str, Any]]] = {}
+        self._version_ids: Dict[TrialKey, str] = {}
+
+    async def run(
+        self,
+        rows: Iterator[Tuple[int, Dict[str, Any]]],
+        job: AnnotationImportJob,
+        on_progress: Optional[Callable[[AnnotationImportJob], None]] = None,
+    ) -> AnnotationImportJob:
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+
+        for line_no, record in rows:
+            job.processed_rows += 1
+            try:
+                batch.append((line_no, normalize_row(record, self.phase_index)))
+            except ValueError as exc:
+                job.add_error(line_no, str(exc))
+
+            if len(batch) >= self.batch_size:
+                await self._flush(batch, job)
+                batch = []
+                if on_progress:
+                    on_progress(job)
+
+        if batch:
+            await self._flush(batch, job)
+        if on_progress:
+            on_progress(job)
+
+        job.version_count = len(self._version_ids)
+        return job
+
+    async def _flush(self, batch: List[Tuple[int, Dict[str, Any]]], job: AnnotationImportJob) -> None:
+        await self._load_trial_info({(seg["fileId"], seg["trialIndex"]) for _, seg in batch})
+
+        valid: List[Dict[str, Any]] = []
+        for line_no, segment in batch:
+            key = (segment["fileId"], segment["trialIndex"])
+            info = self._trial_info.get(key)
+            if info is None:
+                job.add_error(line_no, f"Trial不存在: {key[0]}#{key[1]}")
+                continue
+            if segment["endIndex"] >= info["dataPoints"]:
+                job.add_error(
+                    line_no,
+                    f"endIndex {segment['endIndex']} 超出Trial长度 {info['dataPoints']}",
+                )
+                continue
+
+            sample_rate = info.get("sampleRate") or h5_service.default_sample_rate
+            if segment["startTime"] is None:
+                segment["startTime"] = segment["startIndex"] / sample_rate
+            if segment["endTime"] is None:
+                segment["endTime"] = segment["endIndex"] / sample_rate
+            valid.append(segment)
+
+        if not valid:
+            return
+
+        new_keys = {
+            (seg["fileId"], seg["trialIndex"]) for seg in valid
+        } - self._version_ids.keys()
+        if new_keys:
+            created = await self.version_repo.bulk_upsert_versions(
+                keys=sorted(new_keys),
+                user_id=self.user_id,
+                username=self.username,
+                reset_counts=self.mode == "replace",
+            )
+            if self.mode == "replace":
+                await self.annotation_repo.delete_by_versions(list(created.values()))
+            self._version_ids.update(created)
+
+        now = datetime.now(timezone.utc)
+        counts: Dict[str, int] = {}
+        docs = []
+        for segment in valid:
+            version_id = self._version_ids[(segment["fileId"], segment["trialIndex"])]
+            counts[version_id] = counts.get(version_id, 0) + 1
+            docs.append({
+                **segment,
+                "versionId": version_id,
+                "userId": self.user_id,
+                "createdAt": now,
+                "updatedAt": now,
+            })
+
+        job.inserted_segments += await self.annotation_repo.bulk_insert(docs)
+        await self.version_repo.bulk_increment_segment_counts(counts)
+
+    async def _load_trial_info(self, keys) -> None:
+        missing = [key for key in keys if key not in self._trial_info]
+        if not missing:
+            return
+
+        by_file: Dict[str, List[int]] = {}
+        for file_id, trial_index in missing:
+            by_file.setdefault(file_id, []).append(trial_index)
+
+        for file_id, trial_indices in by_file.items():
+            known = await self.metadata_repo.get_trial_lengths(file_id, trial_indices)
+            unknown = [idx for idx in trial_indices if idx not in known]
+            if unknown:
+                # 元数据尚未缓存的Trial直接读取数据集形状
+                known.update(await asyncio.to_thread(self._read_trial_lengths, file_id, unknown))
+            for trial_index in trial_indices:
+                self._trial_info[(file_id, trial_index)] = known.get(trial_index)
+
+    def _read_trial_lengths(self, file_id: str, trial_indices: List[int]) -> Dict[int, Dict[str, Any]]:
+        file_path = (self.data_root / file_id).resolve()
+        if self.data_root.resolve() not in file_path.parents or not file_path.exists():
+            return {}
+
+        lengths: Dict[int, Dict[str, Any]] = {}
+        for trial_index in trial_indices:
+            try:
+                lengths[trial_index] = {
+                    "dataPoints": h5_service.get_trial_length(str(file_path), trial_index),
+                    "sampleRate": None,
+                }
+            except ValueError:
+                continue
+        return lengths
+
+
+async def run_import_job(
+    db: AsyncIOMotorDatabase,
+    job: AnnotationImportJob,
+    *,
+    path: str,
+    fmt: str,
+    template: Dict[str, Any],
+    username: Optional[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    remove_source: bool = True,
+    on_progress: Optional[Callable[[AnnotationImportJob], None]] = None,
+) -> AnnotationImportJob:
+    """执行导入任务并维护任务状态 (供接口后台任务与命令行共用)"""
+
+    job.status = "running"
+    try:
+        importer = AnnotationImporter(
+            db,
+            template=template,
+            user_id=job.user_id,
+            username=username,
+            mode=job.mode,
+            batch_size=batch_size,
+        )
+        await importer.run(iter_rows(path, fmt), job, on_progress=on_progress)
+        job.status = "completed"
+    except Exception as exc:  # noqa: BLE001
+        job.status = "failed"
+        job.message = str(exc)
+        print(f"❌ Annotation import {job.id} failed: {exc}")
+    finally:
+        job.finished_at = datetime.now(timezone.utc)
+        if remove_source:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return job
+
+
+# 创建全局任务登记表
+import_jobs = AnnotationImportJobRegistry()
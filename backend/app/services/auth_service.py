@@ -7,8 +7,10 @@ from jose import JWTError, jwt
 from jose.exceptions import ExpiredSignatureError
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from app.config.permissions import PERMISSION_ENCODING_VERSION
 from app.db.repositories.role_repo import RoleRepository
 from app.db.repositories.user_repo import UserRepository
+from app.utils.permissions import decode_permissions, encode_permissions
 
 
 class AuthService:
@@ -32,7 +34,9 @@ class AuthService:
             "username": username,
             "role_id": role_id,
             "role_name": role_name,
-            "permissions": permissions,
+            # 权限以位掩码编码，显著缩小令牌体积
+            "perm": encode_permissions(permissions),
+            "pv": PERMISSION_ENCODING_VERSION,
             "exp": datetime.utcnow() + timedelta(days=self.expiration_days),
             "iat": datetime.utcnow(),
         }
@@ -40,12 +44,25 @@ class AuthService:
 
     def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
         try:
-            return jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
         except ExpiredSignatureError:
             return None
         except JWTError:
             return None
 
+        if "perm" in payload:
+            # 权限编码版本不一致时位含义可能已变化，要求重新登录
+            if payload.get("pv") != PERMISSION_ENCODING_VERSION:
+                return None
+            mask = int(payload["perm"])
+        else:
+            # 兼容升级前签发的字符串列表令牌
+            mask = encode_permissions(payload.get("permissions", []))
+
+        payload["permission_mask"] = mask
+        payload["permissions"] = decode_permissions(mask)
+        return payload
+
     async def authenticate_user(
         self,
         db: AsyncIOMotorDatabase,
@@ -55,14 +72,17 @@ class AuthService:
         user_repo = UserRepository(db)
         role_repo = RoleRepository(db)
 
-        if not await user_repo.verify_password(username, password):
+        user = await user_repo.find_by_username(username)
+        if not user:
+            return None
+
+        if not await user_repo.verify_user_password(user, password):
             return None
 
-        user = await user_repo.find_by_username(username)
-        if not user or not user.get("is_active"):
+        if not user.get("is_active"):
             return None
 
-        role = await role_repo.find_by_id(user["role_id"])
+        role = await role_repo.find_by_id_cached(user["role_id"])
         if not role or not role.get("is_active"):
             return None
 
@@ -0,0 +1,351 @@
+"""可插拔缓存层：进程内 / Redis / 本地替身；共享后端的值以紧凑二进制格式存储"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+_MAGIC = b"WC"
+_CODEC_VERSION = 1
+_FLAG_ZLIB = 0x01
+_HEADER = struct.Struct("<2sBBI")
+_COMPRESS_THRESHOLD = 1024
+# 超过该大小 (字节) 的值在线程中编解码，大波形的压缩与拷贝不阻塞事件循环
+_OFFLOAD_THRESHOLD = 256 * 1024
+
+_ND_KEY = "\x00nd"
+_DT_KEY = "\x00dt"
+
+
+def _to_skeleton(value: Any, buffers: List[bytes]) -> Any:
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        buffers.append(array.tobytes())
+        return {_ND_KEY: [len(buffers) - 1, array.dtype.str, list(array.shape)]}
+    if isinstance(value, dict):
+        return {str(key): _to_skeleton(item, buffers) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_skeleton(item, buffers) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, datetime):
+        return {_DT_KEY: value.isoformat()}
+    return value
+
+
+def _from_skeleton(value: Any, buffers: List[memoryview]) -> Any:
+    if isinstance(value, dict):
+        if _ND_KEY in value:
+            index, dtype, shape = value[_ND_KEY]
+            return np.frombuffer(buffers[index], dtype=np.dtype(dtype)).reshape(shape)
+        if _DT_KEY in value:
+            return datetime.fromisoformat(value[_DT_KEY])
+        return {key: _from_skeleton(item, buffers) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_from_skeleton(item, buffers) for item in value]
+    return value
+
+
+def value_nbytes(value: Any) -> int:
+    """估算值占用的内存：numpy数组按 nbytes，其余按近似大小"""
+
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return 64 + sum(len(str(key)) + value_nbytes(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 64 + sum(value_nbytes(item) for item in value)
+    if isinstance(value, (str, bytes)):
+        return 48 + len(value)
+    return 32
+
+
+def _snapshot(value: Any) -> Any:
+    """复制容器结构，numpy数组改为只读视图 (不复制数据)，与 decode_value 的结果一致"""
+
+    if isinstance(value, np.ndarray):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    if isinstance(value, dict):
+        return {str(key): _snapshot(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_snapshot(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def encode_value(value: Any) -> bytes:
+    """编码为二进制：结构用JSON描述，numpy数组以原始字节追加，超过阈值时压缩"""
+
+    buffers: List[bytes] = []
+    skeleton = _to_skeleton(value, buffers)
+    header = json.dumps(
+        {"v": skeleton, "b": [len(buf) for buf in buffers]},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode()
+    body = header + b"".join(buffers)
+
+    flags = 0
+    if len(body) > _COMPRESS_THRESHOLD:
+        compressed = zlib.compress(body, 1)
+        if len(compressed) < len(body):
+            body = compressed
+            flags |= _FLAG_ZLIB
+
+    return _HEADER.pack(_MAGIC, _CODEC_VERSION, flags, len(header)) + body
+
+
+def decode_value(data: bytes) -> Any:
+    """解码 encode_value 的结果，numpy数组为只读视图"""
+
+    magic, version, flags, header_len = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _CODEC_VERSION:
+        raise ValueError("Unsupported cache payload")
+
+    body = memoryview(data)[_HEADER.size:]
+    if flags & _FLAG_ZLIB:
+        body = memoryview(zlib.decompress(body))
+
+    header = json.loads(bytes(body[:header_len]))
+    buffers: List[memoryview] = []
+    offset = header_len
+    for length in header["b"]:
+        buffers.append(body[offset:offset + length])
+        offset += length
+
+    return _from_skeleton(header["v"], buffers)
+
+
+class CacheBackend:
+    """缓存后端接口，子类只需实现字节级读写；大值的编解码在线程中进行"""
+
+    name = "base"
+
+    def __init__(self, prefix: str = "", default_ttl: Optional[int] = None) -> None:
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    async def get(self, key: str) -> Any:
+        data = await self.get_bytes(self._key(key))
+        if data is None:
+            return None
+        try:
+            if len(data) > _OFFLOAD_THRESHOLD:
+                return await asyncio.to_thread(decode_value, data)
+            return decode_value(data)
+        except Exception as e:  # noqa: BLE001
+            print(f"⚠️  Failed to decode cache entry {key}: {e}")
+            return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if value_nbytes(value) > _OFFLOAD_THRESHOLD:
+            data = await asyncio.to_thread(encode_value, value)
+        else:
+            data = encode_value(value)
+        await self.set_bytes(self._key(key), data, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.delete_keys([self._key(key)])
+
+    async def delete_prefix(self, prefix: str) -> int:
+        return await self.delete_matching(self._key(prefix))
+
+    async def get_bytes(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set_bytes(self, key: str, data: bytes, ttl: Optional[int]) -> None:
+        raise NotImplementedError
+
+    async def delete_keys(self, keys: List[str]) -> None:
+        raise NotImplementedError
+
+    async def delete_matching(self, prefix: str) -> int:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        return None
+
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内LRU缓存，直接保存对象 (不编码、不压缩)，按 value_nbytes 限制容量
+
+    写入与读取时只复制容器结构，numpy数组以只读视图共享，写入后调用方不应再修改这些数组。
+    """
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any, int]]" = OrderedDict()
+
+    async def get(self, key: str) -> Any:
+        key = self._key(key)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return _snapshot(value)
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        size = value_nbytes(value)
+        key = self._key(key)
+        self._remove(key)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (expires_at, _snapshot(value), size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    async def delete_keys(self, keys: List[str]) -> None:
+        for key in keys:
+            self._remove(key)
+
+    async def delete_matching(self, prefix: str) -> int:
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis共享缓存，多个worker共享计算结果；连接异常时降级为未命中"""
+
+    name = "redis"
+
+    def __init__(self, client: Any, retry_after: float = 30.0, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.client = client
+        self.retry_after = retry_after
+        self._disabled_until = 0.0
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RedisCacheBackend":
+        from redis import asyncio as redis_asyncio
+
+        client = redis_asyncio.from_url(
+            url,
+            socket_timeout=2,
+            socket_connect_timeout=2,
+        )
+        return cls(client, **kwargs)
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._disabled_until
+
+    def _fail(self, action: str, error: Exception) -> None:
+        self._disabled_until = time.monotonic() + self.retry_after
+        print(f"⚠️  Redis cache {action} failed, bypassing for {self.retry_after:.0f}s: {error}")
+
+    async def get_bytes(self, key: str) -> Optional[bytes]:
+        if not self._available():
+            return None
+        try:
+            return await self.client.get(key)
+        except Exception as e:  # noqa: BLE001
+            self._fail("get", e)
+            return None
+
+    async def set_bytes(self, key: str, data: bytes, ttl: Optional[int]) -> None:
+        if not self._available():
+            return
+        try:
+            await self.client.set(key, data, ex=ttl or None)
+        except Exception as e:  # noqa: BLE001
+            self._fail("set", e)
+
+    async def delete_keys(self, keys: List[str]) -> None:
+        if not keys or not self._available():
+            return
+        try:
+            await self.client.delete(*keys)
+        except Exception as e:  # noqa: BLE001
+            self._fail("delete", e)
+
+    async def delete_matching(self, prefix: str) -> int:
+        if not self._available():
+            return 0
+        deleted = 0
+        try:
+            batch: List[bytes] = []
+            async for key in self.client.scan_iter(match=f"{prefix}*", count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    deleted += await self.client.delete(*batch)
+                    batch = []
+            if batch:
+                deleted += await self.client.delete(*batch)
+        except Exception as e:  # noqa: BLE001
+            self._fail("scan", e)
+        return deleted
+
+    async def close(self) -> None:
+        try:
+            await self.client.aclose()
+        except Exception:  # noqa: BLE001
+            pass
+
+
+def create_cache_backend(
+    backend: Optional[str] = None,
+    *,
+    redis_url: Optional[str] = None,
+) -> CacheBackend:
+    """按配置创建缓存后端：memory / redis / local（fakeredis，不可用时退回进程内字典）"""
+
+    backend = (backend or settings.CACHE_BACKEND).lower()
+    options = {
+        "prefix": settings.CACHE_KEY_PREFIX,
+        "default_ttl": settings.CACHE_TTL_SECONDS,
+    }
+
+    if backend == "redis":
+        return RedisCacheBackend.from_url(redis_url or settings.REDIS_URL, **options)
+
+    if backend == "local":
+        try:
+            from fakeredis import aioredis as fake_aioredis
+        except ImportError:
+            print("⚠️  fakeredis not installed, using in-process dict cache")
+        else:
+            return RedisCacheBackend(fake_aioredis.FakeRedis(), **options)
+
+    elif backend != "memory":
+        print(f"⚠️  Unknown CACHE_BACKEND '{backend}', using in-process cache")
+
+    return MemoryCacheBackend(max_bytes=settings.CACHE_MEMORY_MAX_BYTES, **options)
+
+
+# 创建全局实例
+cache_backend = create_cache_backend()
@@ -0,0 +1,209 @@
+"""数据集文件目录：持久化的文件清单与增量重扫
+
+文件列表接口直接读取内存中的目录；后台定期用 os.scandir 遍历并行 stat，
+按 mtime/size 找出新增、删除与变化的文件，只为变化的文件重新读取Trial数量。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.config import settings
+from app.db.mongodb import database
+from app.db.repositories.dataset_catalog_repo import DatasetCatalogRepository
+from app.services.h5_service import H5Service, h5_service
+
+
+def walk_h5_files(root: Path) -> List[Tuple[str, str]]:
+    """用 os.scandir 遍历目录，返回 (fileId, 完整路径)"""
+    found: List[Tuple[str, str]] = []
+    root_str = str(root)
+    stack = [root_str]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith('.h5') and entry.is_file():
+                        found.append((os.path.relpath(entry.path, root_str), entry.path))
+        except OSError as e:
+            print(f"⚠️  Failed to scan directory {directory}: {e}")
+    return found
+
+
+def stat_files(paths: List[str], workers: int) -> List[Optional[os.stat_result]]:
+    """并行 stat，网络存储上单次 stat 延迟较高"""
+
+    def _stat(path: str) -> Optional[os.stat_result]:
+        try:
+            return os.stat(path)
+        except OSError:
+            # 扫描与 stat 之间被删除
+            return None
+
+    if len(paths) <= 1 or workers <= 1:
+        return [_stat(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="catalog-stat") as pool:
+        return list(pool.map(_stat, paths))
+
+
+class DatasetCatalog:
+    """内存中的文件目录，持久化到 dataset_catalog 集合"""
+
+    def __init__(
+        self,
+        h5: Optional[H5Service] = None,
+        rescan_interval: Optional[float] = None,
+        stat_workers: Optional[int] = None,
+    ) -> None:
+        self.h5 = h5 if h5 is not None else h5_service
+        self.rescan_interval = (
+            settings.CATALOG_RESCAN_SECONDS if rescan_interval is None else rescan_interval
+        )
+        self.stat_workers = settings.CATALOG_STAT_WORKERS if stat_workers is None else stat_workers
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._load_lock = asyncio.Lock()
+        self._scan_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.last_scan: Optional[Dict[str, Any]] = None
+
+    async def list_files(self, db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+        """返回与 scan_files 相同结构的文件列表 (含 trialCount)"""
+        entries = await self._ensure_loaded(db)
+        data_root = Path(self.h5.data_root)
+        return [
+            {
+                "fileId": entry["fileId"],
+                "fullPath": str(data_root / entry["fileId"]),
+                "fileName": entry["fileName"],
+                "size": entry["size"],
+                "trialCount": entry["trialCount"],
+            }
+            for entry in sorted(entries.values(), key=lambda item: item["fileId"])
+        ]
+
+    async def _ensure_loaded(self, db: AsyncIOMotorDatabase) -> Dict[str, Dict[str, Any]]:
+        if self._entries is not None:
+            return self._entries
+        async with self._load_lock:
+            if self._entries is None:
+                docs = await DatasetCatalogRepository(db).find_all()
+                if docs:
+                    self._entries = {doc["fileId"]: doc for doc in docs}
+                else:
+                    # 首次运行没有持久化目录，需同步完成一次扫描
+                    await self.rescan(db)
+        return self._entries
+
+    async def rescan(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        """增量重扫，只为新增或 mtime/size 变化的文件读取Trial数量"""
+        async with self._scan_lock:
+            started = time.perf_counter()
+            previous = self._entries
+            if previous is None:
+                previous = {doc["fileId"]: doc for doc in await DatasetCatalogRepository(db).find_all()}
+
+            data_root = Path(self.h5.data_root)
+            if not data_root.exists():
+                print(f"⚠️  Dataset directory not found: {data_root}")
+                found: List[Tuple[str, str]] = []
+                stats: List[Optional[os.stat_result]] = []
+            else:
+                found = await asyncio.to_thread(walk_h5_files, data_root)
+                stats = await asyncio.to_thread(stat_files, [path for _, path in found], self.stat_workers)
+
+            entries: Dict[str, Dict[str, Any]] = {}
+            changed: List[Tuple[Dict[str, Any], str]] = []
+            added = modified = 0
+            for (file_id, full_path), stat in zip(found, stats):
+                if stat is None:
+                    continue
+                old = previous.get(file_id)
+                if old and old["mtimeNs"] == stat.st_mtime_ns and old["size"] == stat.st_size:
+                    entries[file_id] = old
+                    continue
+
+                if old:
+                    modified += 1
+                else:
+                    added += 1
+                entry = {
+                    "fileId": file_id,
+                    "fileName": os.path.basename(full_path),
+                    "size": stat.st_size,
+                    "mtimeNs": stat.st_mtime_ns,
+                    "trialCount": 0,
+                    "scannedAt": datetime.utcnow(),
+                }
+                entries[file_id] = entry
+                changed.append((entry, full_path))
+
+            # Trial数量需要打开H5文件，按计算线程数分批读取
+            semaphore = asyncio.Semaphore(max(1, self.h5.compute_workers))
+
+            async def count_trials(entry: Dict[str, Any], full_path: str) -> None:
+                async with semaphore:
+                    entry["trialCount"] = await self.h5.get_trial_count(full_path)
+
+            await asyncio.gather(*(count_trials(entry, path) for entry, path in changed))
+
+            removed = [file_id for file_id in previous if file_id not in entries]
+            if changed or removed:
+                await DatasetCatalogRepository(db).apply_changes([entry for entry, _ in changed], removed)
+
+            self._entries = entries
+            self.last_scan = {
+                "files": len(entries),
+                "added": added,
+                "modified": modified,
+                "removed": len(removed),
+                "durationMs": round((time.perf_counter() - started) * 1000, 1),
+                "finishedAt": datetime.utcnow(),
+            }
+            if changed or removed:
+                print(
+                    f"📁 Dataset catalog updated: +{added} ~{modified} -{len(removed)} "
+                    f"({self.last_scan['durationMs']} ms)"
+                )
+            return self.last_scan
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.rescan(database.db)
+            except Exception as e:
+                print(f"❌ Dataset catalog rescan failed: {e}")
+            await asyncio.sleep(self.rescan_interval)
+
+    def start(self) -> None:
+        """启动后台重扫 (启动时立即检查一次启动前的变化)"""
+        if self.rescan_interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self._entries is not None,
+            "files": len(self._entries or {}),
+            "rescanIntervalSeconds": self.rescan_interval,
+            "lastScan": self.last_scan,
+        }
+
+
+# 创建全局实例
+dataset_catalog = DatasetCatalog()
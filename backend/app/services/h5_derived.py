@@ -0,0 +1,211 @@
+"""Trial派生数据的H5内存储
+
+预处理结果写入 derived/ 组：滤波信号、重建时间轴、拐点与原始/滤波信号的 min/max 金字塔。
+数据集分块并压缩，之后读取只需按切片读。离线脚本写入源文件的 trial_*/derived/ (随文件一起
+在站点间拷贝)；在线写回 (ENABLE_DATASET_WRITE) 写入单Trial文件的根组，不改变源文件指纹。
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+import h5py
+import numpy as np
+
+DERIVED_GROUP = "derived"
+# derived/ 组布局版本，布局变化时递增，旧版本视为无效
+DERIVED_FORMAT_VERSION = 3
+# 金字塔每层的降采样倍数，最粗一层不少于该点数
+PYRAMID_FACTOR = 8
+PYRAMID_MIN_POINTS = 512
+# 各序列金字塔所在的子组
+PYRAMID_GROUPS = {"raw": "rawPyramid", "filtered": "pyramid"}
+CHUNK_POINTS = 64 * 1024
+COMPRESSION = "gzip"
+COMPRESSION_LEVEL = 4
+
+
+def build_pyramid(values: np.ndarray, factor: int = PYRAMID_FACTOR, min_points: int = PYRAMID_MIN_POINTS) -> List[np.ndarray]:
+    """逐层计算 (min, max) 包络，第 k 层每个点覆盖 factor**(k+1) 个采样"""
+    levels: List[np.ndarray] = []
+    lows = highs = np.asarray(values, dtype=np.float32)
+    while len(lows) // factor >= min_points:
+        usable = (len(lows) // factor) * factor
+        lows = lows[:usable].reshape(-1, factor).min(axis=1)
+        highs = highs[:usable].reshape(-1, factor).max(axis=1)
+        levels.append(np.stack([lows, highs], axis=1))
+    return levels
+
+
+def pyramid_level_count(length: int, factor: int = PYRAMID_FACTOR, min_points: int = PYRAMID_MIN_POINTS) -> int:
+    """长度为 length 的序列生成的金字塔层数，与 build_pyramid 一致"""
+    levels = 0
+    while length // factor >= min_points:
+        length //= factor
+        levels += 1
+    return levels
+
+
+def expand_time_axis(time_axis: Dict[str, np.ndarray], count: int) -> np.ndarray:
+    """按断点 (采样下标 -> 秒) 线性插值得到逐采样时间戳"""
+    if count == 0:
+        return np.empty(0)
+    return np.interp(np.arange(count), time_axis["indices"], time_axis["seconds"])
+
+
+def compact_time_axis(time_axis: Dict[str, np.ndarray], count: int) -> Dict[str, Any]:
+    """紧凑时间轴：等间隔时只返回 t0 与采样率，否则返回断点对"""
+    indices = np.asarray(time_axis["indices"])
+    seconds = np.asarray(time_axis["seconds"], dtype=float)
+
+    if count > 1 and indices.size >= 2 and indices[-1] > indices[0]:
+        step = (seconds[-1] - seconds[0]) / (indices[-1] - indices[0])
+        predicted = seconds[0] + (indices - indices[0]) * step
+        tolerance = 1e-9 * max(1.0, abs(float(seconds[-1])))
+        if step > 0 and float(np.max(np.abs(predicted - seconds))) <= tolerance:
+            return {
+                "type": "uniform",
+                "count": count,
+                "t0": float(seconds[0] - indices[0] * step),
+                "sampleRate": float(1.0 / step),
+            }
+
+    return {
+        "type": "breakpoints",
+        "count": count,
+        "indices": indices,
+        "seconds": seconds,
+    }
+
+
+def _create_dataset(group: h5py.Group, name: str, data: np.ndarray) -> None:
+    data = np.ascontiguousarray(data)
+    if data.size == 0:
+        group.create_dataset(name, data=data)
+        return
+    chunks = (min(len(data), CHUNK_POINTS),) + data.shape[1:]
+    group.create_dataset(
+        name,
+        data=data,
+        chunks=chunks,
+        compression=COMPRESSION,
+        compression_opts=COMPRESSION_LEVEL,
+        shuffle=True,
+    )
+
+
+def create_stream_dataset(
+    group: h5py.Group,
+    name: str,
+    length: int,
+    dtype: Any,
+    extra_shape: Tuple[int, ...] = (),
+    resizable: bool = False,
+) -> h5py.Dataset:
+    """创建供分块写入的数据集，布局与 write_derived 一致"""
+    chunk_length = max(1, min(length, CHUNK_POINTS)) if not resizable else CHUNK_POINTS
+    return group.create_dataset(
+        name,
+        shape=(length,) + extra_shape,
+        maxshape=((None,) if resizable else (length,)) + extra_shape,
+        dtype=dtype,
+        chunks=(chunk_length,) + extra_shape,
+        compression=COMPRESSION,
+        compression_opts=COMPRESSION_LEVEL,
+        shuffle=True,
+    )
+
+
+def write_derived_attrs(group: h5py.Group, summary: Dict[str, Any], fingerprint: str) -> None:
+    """写入版本标记，应在所有数据集写完后调用，写入中断时该组不会被当作有效数据"""
+    group.attrs["sampleRate"] = float(summary["sample_rate"])
+    group.attrs["duration"] = float(summary["duration"])
+    group.attrs["sourceLength"] = int(summary["source_length"])
+    group.attrs["processingFingerprint"] = fingerprint
+    group.attrs["formatVersion"] = DERIVED_FORMAT_VERSION
+
+
+def write_derived(trial_group: h5py.Group, processed: Dict[str, Any], fingerprint: str) -> None:
+    """覆盖写入 derived/ 组，attrs 记录版本与预处理参数指纹"""
+    if DERIVED_GROUP in trial_group:
+        del trial_group[DERIVED_GROUP]
+
+    group = trial_group.create_group(DERIVED_GROUP)
+    time_axis = processed["time_axis"]
+    length = len(processed["raw_values"])
+    # 断点用于紧凑时间轴，逐采样时间戳供切片读取
+    _create_dataset(group, "timeIndices", np.asarray(time_axis["indices"], dtype=np.int64))
+    _create_dataset(group, "timeSeconds", np.asarray(time_axis["seconds"], dtype=np.float64))
+    _create_dataset(group, "timestamps", expand_time_axis(time_axis, length))
+    _create_dataset(group, "filtered", np.asarray(processed["filtered_values"], dtype=np.float64))
+    _create_dataset(group, "keypoints", np.asarray(processed["keypoints"], dtype=np.int64))
+
+    for series, name in PYRAMID_GROUPS.items():
+        pyramid = group.create_group(name)
+        pyramid.attrs["factor"] = PYRAMID_FACTOR
+        for level, envelope in enumerate(build_pyramid(processed[f"{series}_values"])):
+            _create_dataset(pyramid, f"level_{level}", envelope)
+
+    write_derived_attrs(group, dict(processed, source_length=length), fingerprint)
+
+
+def valid_derived(trial_group: h5py.Group, source_length: int, fingerprint: str) -> Optional[h5py.Group]:
+    """derived/ 组与当前源数据长度及预处理参数一致时返回该组"""
+    group = trial_group.get(DERIVED_GROUP)
+    if not isinstance(group, h5py.Group):
+        return None
+    attrs = group.attrs
+    if (
+        attrs.get("formatVersion") != DERIVED_FORMAT_VERSION
+        or attrs.get("processingFingerprint") != fingerprint
+        or attrs.get("sourceLength") != source_length
+    ):
+        return None
+    return group
+
+
+def read_derived(group: h5py.Group, raw_values: np.ndarray) -> Dict[str, Any]:
+    """读取派生数据，结构与 H5Service._prepare_waveform 的返回一致"""
+    return {
+        "sample_rate": float(group.attrs["sampleRate"]),
+        "duration": float(group.attrs["duration"]),
+        "raw_values": raw_values,
+        "time_axis": {"indices": group["timeIndices"][:], "seconds": group["timeSeconds"][:]},
+        "filtered_values": group["filtered"][:],
+        "keypoints": group["keypoints"][:],
+    }
+
+
+def read_time_axis(group: h5py.Group, start: int, stop: int) -> Dict[str, np.ndarray]:
+    """读取覆盖采样区间 [start, stop) 的时间轴断点 (两端各多取一个)
+
+    断点下标递增，直接在数据集上二分查找，只读取区间附近的断点。
+    """
+    indices = group["timeIndices"]
+    lo = max(bisect_right(indices, start) - 1, 0)
+    hi = min(bisect_left(indices, max(stop - 1, start)) + 1, len(indices))
+    return {"indices": indices[lo:hi], "seconds": group["timeSeconds"][lo:hi]}
+
+
+def seconds_to_index(group: h5py.Group, seconds: float) -> float:
+    """按断点把秒反向插值为采样下标，只读取该时刻附近的断点 (结果与在全部断点上插值一致)"""
+    times = group["timeSeconds"]
+    lo = max(bisect_left(times, seconds) - 1, 0)
+    hi = min(bisect_right(times, seconds) + 1, len(times))
+    return float(np.interp(seconds, times[lo:hi], group["timeIndices"][lo:hi]))
+
+
+def read_keypoints(group: h5py.Group, start: int, stop: int) -> np.ndarray:
+    """读取采样区间 [start, stop) 内的拐点 (拐点下标递增)"""
+    keypoints = group["keypoints"]
+    return keypoints[bisect_left(keypoints, start):bisect_left(keypoints, stop)]
+
+
+def read_pyramid_level(
+    group: h5py.Group,
+    level: int,
+    start: int = 0,
+    stop: Optional[int] = None,
+    series: str = "filtered",
+) -> np.ndarray:
+    """按切片读取金字塔某一层的 (min, max) 包络"""
+    return group[PYRAMID_GROUPS[series]][f"level_{level}"][start:stop]
@@ -1,20 +1,303 @@
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 import os
 import h5py
 import numpy as np
 from scipy import signal
-from typing import Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 from app.config import settings
+from app.services.cache_service import CacheBackend, cache_backend
+from app.services.h5_derived import (
+    DERIVED_GROUP,
+    PYRAMID_FACTOR,
+    compact_time_axis,
+    expand_time_axis,
+    pyramid_level_count,
+    read_derived,
+    read_keypoints,
+    read_pyramid_level,
+    read_time_axis,
+    seconds_to_index,
+    valid_derived,
+    write_derived,
+)
+from app.services.h5_streaming import StreamingPreprocessor, iter_chunks
+from app.services.single_flight import SingleFlight, request_coalescer
+from app.services.trial_features import FEATURES_VERSION, SignalStats, trial_features
+from app.services.waveform_tiles import TILE_FORMAT_VERSION, TILE_POINTS, build_tile, tile_layout
+from app.utils.disk_cache import prune_directory
+from app.utils.downsampling import downsample_indices, lttb_indices, minmax_indices
+
+# 预处理算法版本，修改处理流程时递增以使缓存失效
+PROCESSING_VERSION = 1
+
+# 列表缩略图点数
+THUMBNAIL_POINTS = 400
+# 缩略图粗筛：每个缩略图点对应的 min/max 块数
+THUMBNAIL_BLOCKS_PER_POINT = 2
+# 缩略图滤波前降采样到截止频率的该倍数
+THUMBNAIL_FILTER_RATE_FACTOR = 10
+# Trial元数据 (缩略图与摘要) 的版本，写入来源标记与缓存键；缩略图算法或字段变化时递增，旧元数据在后台重算
+# 2: 增加特征向量 (之后改为单独计算，见 FEATURES_VERSION)；3: 缩略图改为先降采样再滤波
+METADATA_VERSION = 3
+# 拐点最小间隔 (全采样率下的采样数)
+KEYPOINT_MIN_DISTANCE = 3
+# 两次派生数据目录容量清理的最短间隔 (秒)，避免每次写入都扫描目录
+DERIVED_PRUNE_INTERVAL_SECONDS = 60.0
+
 
 class H5Service:
     """H5文件处理服务"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        cache: Optional[CacheBackend] = None,
+        single_flight: Optional[SingleFlight] = None,
+    ):
         self.data_root = Path(settings.H5_DATA_PATH)
         self.default_sample_rate = 1000.0
         self.reconstruct_buffer = 0.1
         self.lowpass_cutoff = 30.0
         self.lowpass_order = 4
+        self.cache = cache if cache is not None else cache_backend
+        self.single_flight = single_flight if single_flight is not None else request_coalescer
+        self.compute_workers = settings.H5_COMPUTE_WORKERS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 开启后把预处理结果写入单Trial派生数据文件 (derived_cache_dir)，源文件不变，文件指纹与各级缓存保持有效
+        self.dataset_write = settings.ENABLE_DATASET_WRITE
+        # 写入源文件的 trial_*/derived/ 组会改变文件指纹，只由离线脚本开启
+        self.source_write = False
+        self._file_locks: Dict[str, threading.RLock] = {}
+        self._file_locks_guard = threading.Lock()
+        # 超长Trial走分块预处理，结果写入 derived_cache_dir 下的单Trial文件
+        self.streaming_min_samples = settings.STREAMING_PREPROCESS_MIN_SAMPLES
+        self.chunk_samples = settings.PREPROCESS_CHUNK_SAMPLES
+        self.derived_cache_dir = Path(settings.DERIVED_CACHE_DIR)
+        self.derived_max_bytes = settings.DERIVED_CACHE_MAX_BYTES
+        self._last_derived_prune = -DERIVED_PRUNE_INTERVAL_SECONDS
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """预处理专用线程池，避免占用轻量接口所需的线程"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, self.compute_workers),
+                thread_name_prefix="h5-compute",
+            )
+        return self._executor
+
+    async def run_compute(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _file_lock(self, file_path: str) -> threading.RLock:
+        with self._file_locks_guard:
+            return self._file_locks.setdefault(str(file_path), threading.RLock())
+
+    @contextmanager
+    def _open_h5(self, file_path: str, mode: str = 'r', locked: Optional[bool] = None) -> Iterator[h5py.File]:
+        """打开H5文件；允许写入源文件时同一文件的读写串行，避免与写入句柄冲突"""
+        if locked is None:
+            locked = self.source_write
+        with self._file_lock(file_path) if locked else nullcontext():
+            with h5py.File(file_path, mode) as f:
+                yield f
+
+    def file_fingerprint(self, file_path: str) -> str:
+        """文件指纹 (mtime + size)，文件被替换后缓存键随之变化"""
+        stat = os.stat(file_path)
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    def processing_fingerprint(self) -> str:
+        """预处理参数指纹"""
+        params = (
+            PROCESSING_VERSION,
+            self.default_sample_rate,
+            self.reconstruct_buffer,
+            self.lowpass_cutoff,
+            self.lowpass_order,
+        )
+        return hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+
+    def metadata_stamp(self, file_path: str) -> Dict[str, Any]:
+        """写入Trial元数据的来源标记，任一字段变化即视为过期"""
+        stat = os.stat(file_path)
+        return {
+            "sourceMtimeNs": stat.st_mtime_ns,
+            "sourceSize": stat.st_size,
+            "processingFingerprint": self.processing_fingerprint(),
+            "metadataVersion": METADATA_VERSION,
+        }
+
+    def cache_key(self, kind: str, file_path: str, *parts: Any) -> str:
+        path_hash = hashlib.sha1(str(file_path).encode()).hexdigest()[:16]
+        suffix = ":".join(str(part) for part in parts)
+        return (
+            f"{kind}:{path_hash}:{self.file_fingerprint(file_path)}:"
+            f"{self.processing_fingerprint()}:{suffix}"
+        )
+
+    async def _cached(self, key: str, compute: Callable[[], Any]) -> Any:
+        """读取共享缓存，未命中时合并并发请求、在线程中计算并回写"""
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        async def compute_and_store() -> Any:
+            value = await self.run_compute(compute)
+            await self.cache.set(key, value)
+            return value
+
+        return await self.single_flight.do(key, compute_and_store)
+
+    async def get_trial_count(self, file_path: str) -> int:
+        """带缓存的Trial数量"""
+        try:
+            key = self.cache_key("trial-count", file_path)
+        except OSError:
+            return 0
+        return int(await self._cached(key, lambda: self.load_trial_count(file_path)))
+
+    async def get_trial_metadata(self, file_path: str, trial_index: int) -> Dict:
+        """带缓存的Trial元数据与缩略图"""
+        key = self.cache_key("metadata", file_path, trial_index, METADATA_VERSION)
+        return await self._cached(key, lambda: self.load_trial_metadata(file_path, trial_index))
+
+    async def get_trial_features(self, file_path: str, trial_index: int) -> Dict:
+        """带缓存的Trial特征向量"""
+        key = self.cache_key("features", file_path, trial_index, FEATURES_VERSION)
+        return await self._cached(key, lambda: self.load_trial_features(file_path, trial_index))
+
+    async def get_waveform(self, file_path: str, trial_index: int, timestamps: str = "full") -> Dict:
+        """带缓存的完整波形，缓存中保存numpy数组与时间轴断点以保持紧凑"""
+        key = self.cache_key("waveform-arrays", file_path, trial_index)
+        arrays = await self._cached(key, lambda: self._waveform_arrays(file_path, trial_index))
+        return self._format_waveform(arrays, timestamps)
+
+    async def get_waveform_window(
+        self,
+        file_path: str,
+        trial_index: int,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        max_points: Optional[int] = None,
+        method: str = "lttb"
+    ) -> Dict:
+        """按视口返回波形：截取 [start, end] 秒的窗口，超过 max_points 时降采样
+
+        有派生数据的Trial按切片读取窗口 (见 _load_window)，只有无派生数据的短Trial读取完整数组。
+        """
+        window = await self._derived_window(file_path, trial_index, start, end, max_points, method)
+        if window is not None:
+            return window
+        key = self.cache_key("waveform-arrays", file_path, trial_index)
+        arrays = await self._cached(key, lambda: self._waveform_arrays(file_path, trial_index))
+        return await self.run_compute(self._window_waveform, arrays, start, end, max_points, method)
+
+    async def _derived_window(
+        self,
+        file_path: str,
+        trial_index: int,
+        start: Optional[float],
+        end: Optional[float],
+        max_points: Optional[int],
+        method: str
+    ) -> Optional[Dict]:
+        """派生数据就绪 (超长Trial先生成) 时从 derived/ 组按切片读取视口，短Trial且无派生数据时返回None"""
+        length = await self.run_compute(self.get_trial_length, file_path, trial_index)
+        if length >= self.streaming_min_samples:
+            await self.build_derived(file_path, trial_index)
+        elif not await self.run_compute(self.derived_ready, file_path, trial_index):
+            return None
+        return await self.run_compute(self._load_window, file_path, trial_index, start, end, max_points, method)
+
+    async def iter_waveform_windows(
+        self,
+        file_path: str,
+        trial_indices: List[int],
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        max_points: Optional[int] = None,
+        method: str = "lttb"
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """批量视口波形，按完成顺序产出 (Trial下标, 波形或异常)
+
+        未缓存的Trial先通过同一个文件句柄读取，再在计算线程中并行预处理与降采样。
+        """
+        keys = {index: self.cache_key("waveform-arrays", file_path, index) for index in trial_indices}
+        cached: Dict[int, Any] = {}
+        for index in trial_indices:
+            value = await self.cache.get(keys[index])
+            if value is not None:
+                cached[index] = value
+
+        missing = [index for index in trial_indices if index not in cached]
+        prefetched = await self.run_compute(self._read_trials, file_path, missing) if missing else {}
+
+        async def process(index: int) -> Tuple[int, Any]:
+            try:
+                arrays = cached.get(index)
+                if arrays is None:
+                    data = prefetched.pop(index, None)
+                    if isinstance(data, Exception):
+                        raise data
+                    if data is None:
+                        # 超长Trial不预读，从派生数据按切片读取窗口
+                        window = await self._derived_window(file_path, index, start, end, max_points, method)
+                        if window is not None:
+                            return index, window
+                        arrays = await self._cached(keys[index], lambda: self._waveform_arrays(file_path, index))
+                    else:
+                        arrays = await self._cached(keys[index], lambda: self._arrays_from_data(file_path, index, data))
+                window = await self.run_compute(self._window_waveform, arrays, start, end, max_points, method)
+                return index, window
+            except Exception as e:
+                return index, e
+
+        tasks = [asyncio.ensure_future(process(index)) for index in dict.fromkeys(trial_indices)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 调用方提前结束时取消尚未开始的计算
+            for task in tasks:
+                task.cancel()
+
+    def tile_version(self, file_path: str) -> str:
+        """瓦片内容版本：源文件指纹 + 预处理参数 + 瓦片结构，任一变化瓦片地址即变化"""
+        parts = f"{self.file_fingerprint(file_path)}:{self.processing_fingerprint()}:{TILE_FORMAT_VERSION}:{TILE_POINTS}"
+        return hashlib.sha1(parts.encode()).hexdigest()[:16]
+
+    def get_tile_layout(self, file_path: str, trial_index: int) -> Dict:
+        """瓦片布局 (各层点数与瓦片数)，只读取数据集形状"""
+        layout = tile_layout(self.get_trial_length(file_path, trial_index))
+        layout["version"] = self.tile_version(file_path)
+        return layout
+
+    async def get_tile(self, file_path: str, trial_index: int, level: int, tile_index: int) -> Dict:
+        """获取瓦片：每个瓦片单独缓存，未命中时从 derived/ 组按切片读取 (缺失时先生成单Trial文件)
+
+        派生数据就绪后请求开销只与瓦片大小有关，不读取整段波形、整个金字塔或全部时间轴断点。
+        """
+        key = self._tile_key(file_path, trial_index, level, tile_index)
+        return await self._cached(key, lambda: self._load_tile(file_path, trial_index, level, tile_index))
+
+    async def get_cached_tile(self, file_path: str, trial_index: int, level: int, tile_index: int) -> Optional[Dict]:
+        """只读取缓存中的瓦片，未命中时返回None"""
+        return await self.cache.get(self._tile_key(file_path, trial_index, level, tile_index))
+
+    def _tile_key(self, file_path: str, trial_index: int, level: int, tile_index: int) -> str:
+        return self.cache_key("waveform-tile", file_path, trial_index, TILE_FORMAT_VERSION, level, tile_index)
 
     def scan_files(self) -> List[Dict]:
         """扫描dataset目录下所有H5文件"""
@@ -42,7 +325,7 @@ class H5Service:
     def load_trial_count(self, file_path: str) -> int:
         """获取H5文件中Trial数量"""
         try:
-            with h5py.File(file_path, 'r') as f:
+            with self._open_h5(file_path) as f:
                 # 查找所有trial_X格式的group
                 trial_keys = [key for key in f.keys() if key.startswith('trial_')]
                 return len(trial_keys)
@@ -53,7 +336,7 @@ class H5Service:
     def get_trial_keys(self, file_path: str) -> List[str]:
         """获取H5文件中所有Trial键名列表（已排序）"""
         try:
-            with h5py.File(file_path, 'r') as f:
+            with self._open_h5(file_path) as f:
                 trial_keys = [key for key in f.keys() if key.startswith('trial_')]
                 # 按trial编号排序
                 trial_keys.sort(key=lambda x: int(x.split('_')[1]))
@@ -62,69 +345,434 @@ class H5Service:
             print(f"❌ Error getting trial keys from {file_path}: {e}")
             return []
 
+    def get_trial_length(self, file_path: str, trial_index: int) -> int:
+        """仅读取数据集形状获取Trial采样点数，不加载信号"""
+        trial_keys = self.get_trial_keys(file_path)
+
+        if trial_index < 0 or trial_index >= len(trial_keys):
+            raise ValueError(f"Trial index {trial_index} out of range (max: {len(trial_keys) - 1})")
+
+        trial_key = trial_keys[trial_index]
+
+        with self._open_h5(file_path) as f:
+            trial_group = f[trial_key]
+
+            if 'sensor' in trial_group:
+                return int(trial_group['sensor'].shape[0])
+            if 'data' in trial_group:
+                return int(trial_group['data'].shape[0])
+
+        raise ValueError(f"No 'sensor' or 'data' dataset found in {trial_key}")
+
     def load_trial_metadata(self, file_path: str, trial_index: int) -> Dict:
-        """加载Trial元数据和缩略图，复用与主图一致的预处理流程"""
+        """加载Trial元数据和缩略图 (轻量流程，不做完整预处理)"""
         try:
-            processed = self._prepare_waveform(file_path, trial_index)
+            source = self._read_thumbnail_source(file_path, trial_index)
+            if source is None:
+                return self._long_trial_metadata(file_path, trial_index)
+            return self._thumbnail_metadata(trial_index, *source)
 
-            timestamps = processed["timestamps"]
-            raw_values = processed["raw_values"]
-            filtered_values = processed["filtered_values"]
+        except Exception as e:
+            print(f"❌ Error loading metadata for trial {trial_index}: {e}")
+            raise
+
+    def _read_thumbnail_source(self, file_path: str, trial_index: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """一次打开文件读取原始信号与时间戳，超长Trial返回None (改走 derived/)"""
+        with self._open_h5(file_path) as f:
+            trial_keys = sorted((key for key in f.keys() if key.startswith('trial_')), key=lambda x: int(x.split('_')[1]))
+            if trial_index < 0 or trial_index >= len(trial_keys):
+                raise ValueError(f"Trial index {trial_index} out of range (max: {len(trial_keys) - 1})")
+
+            trial_group = f[trial_keys[trial_index]]
+            if 'sensor' in trial_group:
+                dataset = trial_group['sensor']
+            elif 'data' in trial_group:
+                dataset = trial_group['data']
+            else:
+                raise ValueError(f"No 'sensor' or 'data' dataset found in {trial_keys[trial_index]}")
+
+            if dataset.shape[0] >= self.streaming_min_samples:
+                return None
+            raw_data = dataset[:]
+            if 'timestamps' in trial_group:
+                return raw_data, trial_group['timestamps'][:]
+            return raw_data, np.arange(len(raw_data)) / 1000.0
+
+    def _thumbnail_metadata(self, trial_index: int, raw_data: np.ndarray, source_timestamps: np.ndarray) -> Dict:
+        """先降采样再处理的缩略图流程
+
+        原始信号按块取 min/max 粗筛后做 LTTB；滤波信号在降采样 (块均值) 后的序列上滤波，
+        再插值到缩略图选中的采样位置。不提取拐点，也不展开逐采样时间戳。
+        """
+        sample_rate, time_axis = self._time_axis(raw_data, source_timestamps)
+        length = len(raw_data)
+
+        candidates = minmax_indices(raw_data, THUMBNAIL_POINTS * THUMBNAIL_BLOCKS_PER_POINT)
+        candidate_seconds = np.interp(candidates, time_axis["indices"], time_axis["seconds"])
+        picked = lttb_indices(candidate_seconds, raw_data[candidates], THUMBNAIL_POINTS)
+        indices = candidates[picked]
+
+        positions, filtered, _ = self._decimated_lowpass(raw_data, sample_rate)
+        seconds = time_axis["seconds"]
+
+        return {
+            "trialIndex": trial_index,
+            "duration": float(seconds[-1] - seconds[0]) if length > 1 else 0.0,
+            "sampleRate": float(sample_rate),
+            "dataPoints": int(length),
+            # 与数据库中的存储精度一致，直接返回 float32 数组
+            "thumbnail": {
+                "timestamps": candidate_seconds[picked].astype(np.float32),
+                "raw": np.asarray(raw_data[indices], dtype=np.float32),
+                "filtered": np.interp(indices, positions, filtered).astype(np.float32),
+            },
+        }
+
+    def _decimation_factor(self, fs: float) -> int:
+        return max(int(fs // (THUMBNAIL_FILTER_RATE_FACTOR * self.lowpass_cutoff)), 1)
+
+    @staticmethod
+    def _block_means(data: np.ndarray, factor: int) -> np.ndarray:
+        """每 factor 个采样取均值，末尾不足一块的按实际长度"""
+        full = len(data) // factor * factor
+        # 跨步切片逐个累加，比 reshape 后沿短轴求均值快
+        blocks = np.zeros(full // factor)
+        for offset in range(factor):
+            blocks += data[offset:full:factor]
+        blocks /= factor
+        if full < len(data):
+            blocks = np.append(blocks, np.mean(data[full:]))
+        return blocks
+
+    def _decimated_lowpass(self, data: np.ndarray, fs: float) -> Tuple[np.ndarray, np.ndarray, float]:
+        """块均值降采样到截止频率的 THUMBNAIL_FILTER_RATE_FACTOR 倍后低通滤波
+
+        返回 (每个输出点对应的采样位置, 滤波值, 输出采样率)；数据过短时在原采样率上滤波。
+        """
+        factor = self._decimation_factor(fs)
+        # filtfilt 需要长于边界延拓长度的输入
+        if factor <= 1 or len(data) // factor <= 3 * (self.lowpass_order + 1):
+            filtered = self._lowpass_filter(data, cutoff=self.lowpass_cutoff, fs=fs, order=self.lowpass_order)
+            return np.arange(len(data)), filtered, fs
+
+        blocks = self._block_means(data, factor)
+        full = len(data) // factor * factor
+        positions = np.arange(full // factor) * factor + (factor - 1) / 2
+        if full < len(data):
+            positions = np.append(positions, (full + len(data) - 1) / 2)
+
+        rate = fs / factor
+        filtered = self._lowpass_filter(blocks, cutoff=self.lowpass_cutoff, fs=rate, order=self.lowpass_order)
+        return positions, filtered, rate
+
+    def load_trial_features(self, file_path: str, trial_index: int) -> Dict:
+        """列表排序与筛选用的特征，与缩略图分开计算 (后台任务)，超长Trial分块读取"""
+        if self.get_trial_length(file_path, trial_index) >= self.streaming_min_samples:
+            with self._derived_group(file_path, trial_index) as group:
+                sample_rate = float(group.attrs["sampleRate"])
+            trial_key = self.get_trial_keys(file_path)[trial_index]
+            with self._open_h5(file_path) as f:
+                trial_group = f[trial_key]
+                dataset = trial_group['sensor'] if 'sensor' in trial_group else trial_group['data']
+                return self._long_trial_features(dataset, sample_rate)
+
+        raw_data, source_timestamps = self._read_trial_data(file_path, trial_index)
+        sample_rate, _ = self._time_axis(raw_data, source_timestamps)
+        _, filtered, filtered_rate = self._decimated_lowpass(raw_data, sample_rate)
+        stats = SignalStats()
+        stats.feed(raw_data)
+        return self._trial_features(stats, filtered, filtered_rate, sample_rate)
+
+    def _trial_features(self, stats: SignalStats, filtered: np.ndarray, filtered_rate: float, sample_rate: float) -> Dict:
+        """列表排序与筛选用的特征；拐点最小间隔按降采样倍数换算"""
+        min_distance = max(1, int(round(KEYPOINT_MIN_DISTANCE * filtered_rate / sample_rate)))
+        return trial_features(stats, filtered, filtered_rate, self.lowpass_cutoff, min_distance)
+
+    def _long_trial_features(self, dataset: h5py.Dataset, sample_rate: float) -> Dict:
+        """超长Trial的特征：分块读取原始信号累加统计量并降采样，再对降采样序列滤波"""
+        factor = self._decimation_factor(sample_rate)
+        # 分块长度取降采样倍数的整数倍，块均值跨分块对齐
+        chunk = max(self.chunk_samples // factor, 1) * factor
+        stats = SignalStats()
+        blocks = []
+        for start, end in iter_chunks(dataset.shape[0], chunk):
+            values = dataset[start:end]
+            stats.feed(values)
+            blocks.append(self._block_means(values, factor))
+
+        decimated = np.concatenate(blocks) if blocks else np.empty(0)
+        rate = sample_rate / factor
+        filtered = self._lowpass_filter(decimated, cutoff=self.lowpass_cutoff, fs=rate, order=self.lowpass_order)
+        return self._trial_features(stats, filtered, rate, sample_rate)
+
+    def _long_trial_metadata(self, file_path: str, trial_index: int, target_points: int = THUMBNAIL_POINTS) -> Dict:
+        """超长Trial的元数据：按等间隔下标从 derived/ 与源数据中读取缩略图，不整段加载"""
+        trial_key = self.get_trial_keys(file_path)[trial_index]
+        length = self.get_trial_length(file_path, trial_index)
+        indices = np.unique(np.linspace(0, length - 1, target_points).astype(np.int64))
+
+        with self._open_h5(file_path) as f:
+            trial_group = f[trial_key]
+            dataset = trial_group['sensor'] if 'sensor' in trial_group else trial_group['data']
+            raw_values = dataset[indices]
+
+        with self._derived_group(file_path, trial_index) as group:
+            return {
+                "trialIndex": trial_index,
+                "duration": float(group.attrs["duration"]),
+                "sampleRate": float(group.attrs["sampleRate"]),
+                "dataPoints": int(length),
+                "thumbnail": {
+                    "timestamps": group["timestamps"][indices].astype(np.float32),
+                    "raw": np.asarray(raw_values, dtype=np.float32),
+                    "filtered": group["filtered"][indices].astype(np.float32)
+                }
+            }
+
+    def preprocess_waveform(self, file_path: str, trial_index: int, timestamps: str = "full") -> Dict:
+        """完整波形预处理"""
+        return self._format_waveform(self._waveform_arrays(file_path, trial_index), timestamps)
 
-            # 同步生成原始与滤波缩略图，保持与工作区渲染一致
-            thumbnail_raw = self._generate_thumbnail(
-                timestamps,
-                raw_values,
-                target_points=400
+    def _waveform_arrays(self, file_path: str, trial_index: int) -> Dict[str, Any]:
+        try:
+            return self._arrays_from_processed(self._prepare_waveform(file_path, trial_index))
+
+        except Exception as e:
+            print(f"❌ Error preprocessing waveform: {e}")
+            raise
+
+    def _arrays_from_processed(self, processed: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "timeAxis": processed["time_axis"],
+            "raw": processed["raw_values"],
+            "filtered": processed["filtered_values"],
+            "keypoints": processed["keypoints"],
+        }
+
+    def _read_trials(self, file_path: str, trial_indices: List[int]) -> Dict[int, Any]:
+        """通过同一个文件句柄读取多个Trial的源数据 (及有效的 derived/ 组)
+
+        超长Trial不预读 (值为None)，单个Trial出错时值为异常，不影响其它Trial。
+        """
+        fingerprint = self.processing_fingerprint()
+        result: Dict[int, Any] = {}
+        with self._open_h5(file_path) as f:
+            trial_keys = sorted(
+                (key for key in f.keys() if key.startswith('trial_')),
+                key=lambda x: int(x.split('_')[1])
             )
+            for trial_index in trial_indices:
+                try:
+                    if trial_index < 0 or trial_index >= len(trial_keys):
+                        raise ValueError(f"Trial index {trial_index} out of range (max: {len(trial_keys) - 1})")
+                    trial_group = f[trial_keys[trial_index]]
+                    if 'sensor' in trial_group:
+                        dataset = trial_group['sensor']
+                    elif 'data' in trial_group:
+                        dataset = trial_group['data']
+                    else:
+                        raise ValueError(f"No 'sensor' or 'data' dataset found in {trial_keys[trial_index]}")
+
+                    if dataset.shape[0] >= self.streaming_min_samples:
+                        result[trial_index] = None
+                        continue
 
-            thumbnail_filtered = self._generate_thumbnail(
-                timestamps,
-                filtered_values,
-                target_points=400
+                    raw_data = dataset[:]
+                    group = valid_derived(trial_group, len(raw_data), fingerprint)
+                    if group is not None:
+                        result[trial_index] = {"processed": read_derived(group, raw_data)}
+                    elif 'timestamps' in trial_group:
+                        result[trial_index] = {"raw": raw_data, "timestamps": trial_group['timestamps'][:]}
+                    else:
+                        result[trial_index] = {"raw": raw_data, "timestamps": np.arange(len(raw_data)) / 1000.0}
+                except Exception as e:
+                    result[trial_index] = e
+        return result
+
+    def _arrays_from_data(self, file_path: str, trial_index: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        """由预读的源数据计算波形数组"""
+        processed = data.get("processed")
+        if processed is None:
+            processed = self._process_trial_data(
+                file_path, trial_index, data["raw"], data["timestamps"], self.processing_fingerprint()
             )
+        return self._arrays_from_processed(processed)
+
+    def _format_waveform(self, arrays: Dict[str, Any], timestamps: str = "full") -> Dict:
+        """保持numpy数组，由 ORJSONResponse 直接序列化
 
+        timestamps="compact" 时不展开逐采样时间戳，改为返回 timeAxis (等间隔或断点对)。
+        """
+        count = len(arrays["raw"])
+        if timestamps == "compact":
             return {
-                "trialIndex": trial_index,
-                "duration": processed["duration"],
-                "sampleRate": float(processed["sample_rate"]),
-                "dataPoints": int(len(raw_values)),
-                "thumbnail": {
-                    "timestamps": thumbnail_raw['timestamps'].tolist(),
-                    "raw": thumbnail_raw['values'].tolist(),
-                    "filtered": thumbnail_filtered['values'].tolist()
-                }
+                "timeAxis": compact_time_axis(arrays["timeAxis"], count),
+                "raw": {"values": arrays["raw"]},
+                "filtered": {"values": arrays["filtered"]},
+                "keypoints": arrays["keypoints"]
             }
 
-        except Exception as e:
-            print(f"❌ Error loading metadata for trial {trial_index}: {e}")
-            raise
-
-    def preprocess_waveform(self, file_path: str, trial_index: int) -> Dict:
-        """完整波形预处理"""
-        try:
-            processed = self._prepare_waveform(file_path, trial_index)
+        timestamps = expand_time_axis(arrays["timeAxis"], count)
 
-            timestamps = processed["timestamps"].tolist()
-            raw_values = processed["raw_values"].tolist()
-            filtered_values = processed["filtered_values"].tolist()
-            keypoints = processed["keypoints"].tolist()
+        return {
+            "raw": {
+                "timestamps": timestamps,
+                "values": arrays["raw"]
+            },
+            "filtered": {
+                "timestamps": timestamps,
+                "values": arrays["filtered"]
+            },
+            "keypoints": arrays["keypoints"]
+        }
 
-            return {
-                "raw": {
-                    "timestamps": timestamps,
-                    "values": raw_values
-                },
-                "filtered": {
-                    "timestamps": timestamps,
-                    "values": filtered_values
-                },
-                "keypoints": keypoints
+    def _window_range(
+        self,
+        time_axis: Dict[str, np.ndarray],
+        count: int,
+        start: Optional[float],
+        end: Optional[float]
+    ) -> Tuple[int, int]:
+        """按断点反向插值把秒换算为采样下标区间 [lo, hi)，包含窗口两端外侧各一个采样"""
+        indices = np.asarray(time_axis["indices"], dtype=np.float64)
+        seconds = np.asarray(time_axis["seconds"], dtype=np.float64)
+        lo = 0 if start is None else int(np.floor(np.interp(start, seconds, indices)))
+        hi = count if end is None else int(np.ceil(np.interp(end, seconds, indices))) + 1
+        return max(0, min(lo, count)), max(0, min(hi, count))
+
+    def _window_waveform(
+        self,
+        arrays: Dict[str, Any],
+        start: Optional[float],
+        end: Optional[float],
+        max_points: Optional[int],
+        method: str = "lttb"
+    ) -> Dict:
+        """视口波形：窗口内点数不超过 max_points 时直接返回原始采样，否则逐序列降采样
+
+        每个序列附带所选采样的下标 (相对整个Trial)，前端据此换算标注的采样区间。
+        """
+        count = len(arrays["raw"])
+        lo, hi = self._window_range(arrays["timeAxis"], count, start, end)
+        keypoints = np.asarray(arrays["keypoints"], dtype=np.int64)
+        return self._window_result(
+            count,
+            lo,
+            hi,
+            np.arange(lo, hi),
+            {series: arrays[series][lo:hi] for series in ("raw", "filtered")},
+            arrays["timeAxis"],
+            keypoints[(keypoints >= lo) & (keypoints < hi)],
+            max_points,
+            method,
+        )
+
+    def _window_result(
+        self,
+        count: int,
+        lo: int,
+        hi: int,
+        positions: np.ndarray,
+        values: Dict[str, np.ndarray],
+        time_axis: Dict[str, np.ndarray],
+        keypoints: np.ndarray,
+        max_points: Optional[int],
+        method: str
+    ) -> Dict:
+        """由窗口内的候选点 (采样或金字塔包络，positions 为对应的采样下标) 降采样组装视口波形"""
+        timestamps = np.interp(positions, time_axis["indices"], time_axis["seconds"])
+        downsampled = max_points is not None and hi - lo > max_points
+
+        result: Dict[str, Any] = {}
+        for series in ("raw", "filtered"):
+            selected = (
+                downsample_indices(timestamps, values[series], max_points, method)
+                if downsampled
+                else np.arange(len(positions))
+            )
+            result[series] = {
+                "indices": positions[selected],
+                "timestamps": timestamps[selected],
+                "values": values[series][selected],
             }
 
-        except Exception as e:
-            print(f"❌ Error preprocessing waveform: {e}")
-            raise
+        result["keypoints"] = keypoints
+        window_seconds = np.interp([lo, hi - 1], time_axis["indices"], time_axis["seconds"])
+        result["window"] = {
+            "start": float(window_seconds[0]) if hi > lo else None,
+            "end": float(window_seconds[1]) if hi > lo else None,
+            "startIndex": lo,
+            "endIndex": hi,
+            "totalPoints": count,
+            "windowPoints": hi - lo,
+            "downsampled": downsampled,
+            "method": method if downsampled else None,
+        }
+        return result
+
+    def _window_level(self, length: int, window_points: int, max_points: Optional[int]) -> Optional[int]:
+        """窗口内桶数仍不少于 max_points 的最粗金字塔层；窗口不足 max_points * PYRAMID_FACTOR 个采样时返回None (直接读采样)"""
+        if not max_points:
+            return None
+        level = None
+        for candidate in range(pyramid_level_count(length)):
+            if window_points // PYRAMID_FACTOR ** (candidate + 1) >= max_points:
+                level = candidate
+        return level
+
+    def _load_window(
+        self,
+        file_path: str,
+        trial_index: int,
+        start: Optional[float],
+        end: Optional[float],
+        max_points: Optional[int],
+        method: str = "lttb"
+    ) -> Dict:
+        """从 derived/ 组按切片读取视口，读取量与 max_points 成正比而与Trial长度无关
+
+        窗口较窄时读取 [lo, hi) 的原始与滤波采样后降采样 (与完整数组的结果一致)；
+        较宽时改为读取金字塔中合适一层的 (min, max) 包络，每个桶取两个候选点再降采样。
+        """
+        trial_key = self.get_trial_keys(file_path)[trial_index]
+        length = self.get_trial_length(file_path, trial_index)
+
+        with self._derived_group(file_path, trial_index) as group, self._open_h5(file_path) as f:
+            trial_group = f[trial_key]
+            sources = {
+                "raw": trial_group['sensor'] if 'sensor' in trial_group else trial_group['data'],
+                "filtered": group["filtered"],
+            }
+            lo = 0 if start is None else int(np.floor(seconds_to_index(group, start)))
+            hi = length if end is None else int(np.ceil(seconds_to_index(group, end))) + 1
+            lo, hi = max(0, min(lo, length)), max(0, min(hi, length))
+
+            level = self._window_level(length, hi - lo, max_points)
+            if level is None:
+                positions = np.arange(lo, hi)
+                values = {series: source[lo:hi] for series, source in sources.items()}
+            else:
+                samples_per_bucket = PYRAMID_FACTOR ** (level + 1)
+                stored = length // samples_per_bucket
+                first = lo // samples_per_bucket
+                last = min(-(-hi // samples_per_bucket), stored)
+                values = {}
+                for series, source in sources.items():
+                    envelope = np.asarray(read_pyramid_level(group, level, first, last, series), dtype=np.float32)
+                    if hi > stored * samples_per_bucket:
+                        # 金字塔截断了不足一个桶的尾部，按源数据补一个包络点
+                        tail = np.asarray(source[max(lo, stored * samples_per_bucket):hi], dtype=np.float32)
+                        envelope = np.concatenate([envelope.reshape(-1, 2), [[np.nanmin(tail), np.nanmax(tail)]]])
+                    values[series] = envelope.reshape(-1)
+                buckets = np.arange(first, first + len(values["raw"]) // 2, dtype=np.int64) * samples_per_bucket
+                # 每个桶的最小值与最大值分别置于桶起点与桶中点
+                positions = (buckets[:, None] + [0, samples_per_bucket // 2]).reshape(-1)
+                positions = np.clip(positions, lo, hi - 1)
+
+            time_axis = read_time_axis(group, lo, hi)
+            keypoints = read_keypoints(group, lo, hi)
+
+        return self._window_result(length, lo, hi, positions, values, time_axis, keypoints, max_points, method)
 
     def _read_trial_data(
         self,
@@ -138,7 +786,7 @@ class H5Service:
 
         trial_key = trial_keys[trial_index]
 
-        with h5py.File(file_path, 'r') as f:
+        with self._open_h5(file_path) as f:
             trial_group = f[trial_key]
 
             if 'sensor' in trial_group:
@@ -164,9 +812,12 @@ class H5Service:
             return 1.0
 
         ts = np.asarray(timestamps, dtype=float)
-        diffs = np.diff(ts)
-        positive_diffs = diffs[diffs > 0]
+        # 时间戳按分块重复，只对正向增量的位置求差，避免整段 diff 的大数组分配
+        steps = np.flatnonzero(ts[1:] > ts[:-1])
+        return self._scale_from_positive_diffs(ts[steps + 1] - ts[steps])
 
+    def _scale_from_positive_diffs(self, positive_diffs: np.ndarray) -> float:
+        """由时间戳的正向增量 (每个分块一次) 推断缩放系数"""
         if positive_diffs.size == 0:
             return 1.0
 
@@ -193,8 +844,9 @@ class H5Service:
             return None
 
         ts = np.asarray(timestamps, dtype=float)
-        total_units = float(ts[-1] - ts[0])
+        return self._sample_rate_from_span(float(ts[-1] - ts[0]), length, scale)
 
+    def _sample_rate_from_span(self, total_units: float, length: int, scale: float) -> Optional[float]:
         scale = scale if scale and scale > 0 else 1.0
         total_seconds = total_units / scale
 
@@ -219,22 +871,35 @@ class H5Service:
         file_path: str,
         trial_index: int
     ) -> Dict[str, object]:
+        if self.get_trial_length(file_path, trial_index) >= self.streaming_min_samples:
+            return self._prepare_streaming(file_path, trial_index)
+
         raw_data, source_timestamps = self._read_trial_data(file_path, trial_index)
 
-        timestamp_scale = self._infer_timestamp_scale(source_timestamps)
-        sample_rate = self._estimate_sample_rate(
-            source_timestamps,
-            len(raw_data),
-            timestamp_scale
-        )
-        safe_sample_rate = self._normalize_sample_rate(sample_rate)
+        fingerprint = self.processing_fingerprint()
+        derived = self._load_derived(file_path, trial_index, raw_data, fingerprint)
+        if derived is not None:
+            return derived
 
-        reconstructed_timestamps = self._reconstruct_timestamps(
-            raw_data,
-            source_timestamps,
-            timestamp_scale,
-            fs=safe_sample_rate
-        )
+        return self._process_trial_data(file_path, trial_index, raw_data, source_timestamps, fingerprint)
+
+    def _process_trial_data(
+        self,
+        file_path: str,
+        trial_index: int,
+        raw_data: np.ndarray,
+        source_timestamps: np.ndarray,
+        fingerprint: str
+    ) -> Dict[str, object]:
+        """对已读取的源数据做完整预处理，开启写回时持久化结果"""
+        processed = self._preprocess_data(raw_data, source_timestamps)
+        if self.dataset_write:
+            self._store_derived(file_path, trial_index, processed, fingerprint)
+        return processed
+
+    def _preprocess_data(self, raw_data: np.ndarray, source_timestamps: np.ndarray) -> Dict[str, object]:
+        """时间轴、滤波与拐点"""
+        safe_sample_rate, time_axis = self._time_axis(raw_data, source_timestamps)
 
         filtered_data = self._lowpass_filter(
             raw_data,
@@ -245,20 +910,262 @@ class H5Service:
 
         keypoints = self._extract_keypoints(filtered_data, min_distance=3)
 
-        duration = (
-            float(reconstructed_timestamps[-1] - reconstructed_timestamps[0])
-            if len(reconstructed_timestamps) > 1 else 0.0
-        )
+        seconds = time_axis["seconds"]
+        duration = float(seconds[-1] - seconds[0]) if len(raw_data) > 1 else 0.0
 
         return {
             "sample_rate": safe_sample_rate,
             "duration": duration,
             "raw_values": raw_data,
-            "timestamps": reconstructed_timestamps,
+            "time_axis": time_axis,
             "filtered_values": filtered_data,
             "keypoints": keypoints,
         }
 
+    def _time_axis(
+        self,
+        raw_data: np.ndarray,
+        source_timestamps: np.ndarray
+    ) -> Tuple[float, Dict[str, np.ndarray]]:
+        """估计采样率并重建时间轴断点"""
+        timestamp_scale = self._infer_timestamp_scale(source_timestamps)
+        sample_rate = self._estimate_sample_rate(
+            source_timestamps,
+            len(raw_data),
+            timestamp_scale
+        )
+        safe_sample_rate = self._normalize_sample_rate(sample_rate)
+
+        # 时间轴只保留断点，逐采样时间戳按需展开
+        time_axis = self._time_breakpoints(
+            len(raw_data),
+            source_timestamps,
+            timestamp_scale,
+            fs=safe_sample_rate
+        )
+        return safe_sample_rate, time_axis
+
+    def _load_derived(
+        self,
+        file_path: str,
+        trial_index: int,
+        raw_data: np.ndarray,
+        fingerprint: str
+    ) -> Optional[Dict[str, object]]:
+        """读取与当前预处理参数一致的 derived/ 组 (源文件内 > 单Trial文件)，不存在或过期时返回None"""
+        trial_key = self.get_trial_keys(file_path)[trial_index]
+        with self._open_h5(file_path) as f:
+            group = valid_derived(f[trial_key], len(raw_data), fingerprint)
+            if group is not None:
+                return read_derived(group, raw_data)
+
+        # 单Trial文件只以原子替换的方式写入，读取无需加锁
+        try:
+            with h5py.File(self._derived_sidecar(file_path, trial_key), 'r') as f:
+                group = valid_derived(f, len(raw_data), fingerprint)
+                return None if group is None else read_derived(group, raw_data)
+        except OSError:
+            return None
+
+    def _prepare_streaming(self, file_path: str, trial_index: int) -> Dict[str, object]:
+        """超长Trial：分块预处理写入 derived/ 后读取 (完整波形本身仍需整段返回)"""
+        raw_data, _ = self._read_trial_data(file_path, trial_index)
+        with self._derived_group(file_path, trial_index) as group:
+            return read_derived(group, raw_data)
+
+    def _derived_sidecar(self, file_path: str, trial_key: str) -> Path:
+        """单Trial派生数据文件 (分块预处理或在线写回)，文件名包含源文件指纹，源文件替换后自然失效 (写入新文件时删除)"""
+        path_hash = hashlib.sha1(str(file_path).encode()).hexdigest()[:16]
+        return self.derived_cache_dir / f"{path_hash}-{self.file_fingerprint(file_path)}-{trial_key}.h5"
+
+    def derived_ready(self, file_path: str, trial_index: int) -> bool:
+        """源文件内或单Trial文件中是否已有有效的 derived/ 组 (只读取属性)"""
+        trial_key = self.get_trial_keys(file_path)[trial_index]
+        length = self.get_trial_length(file_path, trial_index)
+        fingerprint = self.processing_fingerprint()
+        with self._open_h5(file_path) as f:
+            if valid_derived(f[trial_key], length, fingerprint) is not None:
+                return True
+        return self._sidecar_valid(self._derived_sidecar(file_path, trial_key), length, fingerprint)
+
+    async def build_derived(self, file_path: str, trial_index: int) -> None:
+        """在计算线程中生成派生数据，同一Trial的并发请求只生成一次"""
+        key = ("derived", str(file_path), trial_index, self.file_fingerprint(file_path), self.processing_fingerprint())
+        await self.single_flight.do(key, lambda: self.run_compute(self._ensure_derived, file_path, trial_index))
+
+    def _ensure_derived(self, file_path: str, trial_index: int) -> Optional[Path]:
+        """确保派生数据有效：源文件内已有时返回None，否则返回单Trial文件 (缺失时加锁生成)"""
+        trial_key = self.get_trial_keys(file_path)[trial_index]
+        length = self.get_trial_length(file_path, trial_index)
+        fingerprint = self.processing_fingerprint()
+
+        with self._open_h5(file_path) as f:
+            if valid_derived(f[trial_key], length, fingerprint) is not None:
+                return None
+
+        sidecar = self._derived_sidecar(file_path, trial_key)
+        if self._sidecar_valid(sidecar, length, fingerprint):
+            return sidecar
+        with self._file_lock(str(sidecar)):
+            if not self._sidecar_valid(sidecar, length, fingerprint):
+                if length >= self.streaming_min_samples:
+                    self._run_streaming(file_path, trial_key, length, sidecar, fingerprint)
+                else:
+                    processed = self._preprocess_data(*self._read_trial_data(file_path, trial_index))
+                    self._write_sidecar(sidecar, lambda out: write_derived(out, processed, fingerprint))
+                if self.source_write and self._copy_derived(file_path, trial_key, sidecar):
+                    sidecar.unlink(missing_ok=True)
+                    return None
+                self._sidecar_written(sidecar)
+        return sidecar
+
+    @contextmanager
+    def _derived_group(self, file_path: str, trial_index: int) -> Iterator[h5py.Group]:
+        """返回有效的 derived/ 组：源文件内 > 单Trial文件 > 预处理后生成 (超长Trial分块处理)
+
+        文件锁只在生成时持有，之后以只读方式打开，同一Trial的读取可以并发。
+        """
+        for attempt in range(2):
+            sidecar = self._ensure_derived(file_path, trial_index)
+            if sidecar is None:
+                trial_key = self.get_trial_keys(file_path)[trial_index]
+                with self._open_h5(file_path) as f:
+                    yield f[trial_key][DERIVED_GROUP]
+                return
+            try:
+                f = h5py.File(sidecar, 'r')
+            except FileNotFoundError:
+                # 生成后被容量清理删除，重新生成一次
+                if attempt:
+                    raise
+                continue
+            with f:
+                yield f[DERIVED_GROUP]
+            return
+
+    def _load_tile(self, file_path: str, trial_index: int, level: int, tile_index: int) -> Dict:
+        """从 derived/ 组按切片读取瓦片 (含所需的时间轴断点)，原始采样直接读源数据集"""
+        trial_key = self.get_trial_keys(file_path)[trial_index]
+        length = self.get_trial_length(file_path, trial_index)
+
+        with self._derived_group(file_path, trial_index) as group, self._open_h5(file_path) as f:
+            trial_group = f[trial_key]
+            sources = {
+                "raw": trial_group['sensor'] if 'sensor' in trial_group else trial_group['data'],
+                "filtered": group["filtered"],
+            }
+            return build_tile(
+                length,
+                level,
+                tile_index,
+                lambda start, stop: read_time_axis(group, start, stop),
+                lambda series, start, stop: sources[series][start:stop],
+                lambda series, pyramid_level, start, stop: read_pyramid_level(group, pyramid_level, start, stop, series),
+            )
+
+    def _sidecar_valid(self, sidecar: Path, length: int, fingerprint: str) -> bool:
+        if not sidecar.exists():
+            return False
+        try:
+            with h5py.File(sidecar, 'r') as f:
+                return valid_derived(f, length, fingerprint) is not None
+        except OSError:
+            return False
+
+    def _run_streaming(
+        self,
+        file_path: str,
+        trial_key: str,
+        length: int,
+        sidecar: Path,
+        fingerprint: str
+    ) -> None:
+        """逐块读取源数据 (每块单独打开文件，不长时间占用文件锁) 写入临时文件后原子替换"""
+        with self._open_h5(file_path) as f:
+            trial_group = f[trial_key]
+            data_name = 'sensor' if 'sensor' in trial_group else 'data'
+            timestamps_length = trial_group['timestamps'].shape[0] if 'timestamps' in trial_group else length
+
+        def read_slice(name: str, start: int, end: int) -> np.ndarray:
+            with self._open_h5(file_path) as f:
+                trial_group = f[trial_key]
+                if name == 'sensor':
+                    return trial_group[data_name][start:end]
+                if 'timestamps' in trial_group:
+                    return trial_group['timestamps'][start:end]
+            return np.arange(start, end) / 1000.0
+
+        self._write_sidecar(
+            sidecar,
+            lambda out: StreamingPreprocessor(self, self.chunk_samples, scratch_dir=str(sidecar.parent)).run(
+                read_slice, length, timestamps_length, out, fingerprint
+            ),
+        )
+
+    @staticmethod
+    def _write_sidecar(sidecar: Path, write: Callable[[h5py.File], None]) -> None:
+        """写入临时文件后原子替换，读取方不会看到写了一半的文件"""
+        sidecar.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = sidecar.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with h5py.File(temp_path, 'w') as out:
+                write(out)
+            os.replace(temp_path, sidecar)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def _sidecar_written(self, sidecar: Path) -> None:
+        """写入单Trial文件后删除同一Trial旧指纹的文件，并按容量上限清理目录"""
+        path_hash, _, rest = sidecar.name.partition("-")
+        trial_suffix = "-" + rest.rsplit("-", 1)[-1]
+        for old in sidecar.parent.glob(f"{path_hash}-*{trial_suffix}"):
+            if old != sidecar:
+                old.unlink(missing_ok=True)
+
+        now = time.monotonic()
+        with self._file_locks_guard:
+            if now - self._last_derived_prune < DERIVED_PRUNE_INTERVAL_SECONDS:
+                return
+            self._last_derived_prune = now
+        removed = prune_directory(self.derived_cache_dir, self.derived_max_bytes)
+        if removed:
+            print(f"🧹 Pruned {removed} derived data files")
+
+    def _copy_derived(self, file_path: str, trial_key: str, sidecar: Path) -> bool:
+        """把分块预处理结果拷贝进源文件的 trial_*/derived/"""
+        try:
+            with self._open_h5(file_path, 'a') as f, h5py.File(sidecar, 'r') as source:
+                trial_group = f[trial_key]
+                if DERIVED_GROUP in trial_group:
+                    del trial_group[DERIVED_GROUP]
+                source.copy(source[DERIVED_GROUP], trial_group, name=DERIVED_GROUP)
+            return True
+        except Exception as e:
+            print(f"⚠️  Failed to write derived data for {trial_key} in {file_path}: {e}")
+            return False
+
+    def _store_derived(
+        self,
+        file_path: str,
+        trial_index: int,
+        processed: Dict[str, object],
+        fingerprint: str
+    ) -> None:
+        """写回派生数据 (在线写单Trial文件，离线脚本写源文件)；失败只记录日志，不影响本次请求"""
+        trial_key = self.get_trial_keys(file_path)[trial_index]
+        try:
+            if self.source_write:
+                with self._open_h5(file_path, 'a') as f:
+                    write_derived(f[trial_key], processed, fingerprint)
+                return
+            sidecar = self._derived_sidecar(file_path, trial_key)
+            with self._file_lock(str(sidecar)):
+                self._write_sidecar(sidecar, lambda out: write_derived(out, processed, fingerprint))
+                self._sidecar_written(sidecar)
+        except Exception as e:
+            print(f"⚠️  Failed to write derived data for {trial_key} in {file_path}: {e}")
+
     def _lowpass_filter(
         self,
         data: np.ndarray,
@@ -267,9 +1174,23 @@ class H5Service:
         order: int
     ) -> np.ndarray:
         """巴特沃斯低通滤波器"""
+        coefficients = self._lowpass_coefficients(cutoff, fs, order)
+        if coefficients is None:
+            return data
+
+        b, a = coefficients
+        return signal.filtfilt(b, a, data)
+
+    def _lowpass_coefficients(
+        self,
+        cutoff: float,
+        fs: float,
+        order: int
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """滤波器系数，参数无效 (不滤波) 时返回None"""
         nyquist = 0.5 * fs
         if nyquist <= 0:
-            return data
+            return None
 
         normal_cutoff = cutoff / nyquist
 
@@ -278,10 +1199,9 @@ class H5Service:
             normal_cutoff = min(normal_cutoff, 0.99)
 
         if normal_cutoff <= 0:
-            return data
+            return None
 
-        b, a = signal.butter(order, normal_cutoff, btype='low', analog=False)
-        return signal.filtfilt(b, a, data)
+        return signal.butter(order, normal_cutoff, btype='low', analog=False)
 
     def _reconstruct_timestamps(
         self,
@@ -290,16 +1210,29 @@ class H5Service:
         scale: float,
         fs: float
     ) -> np.ndarray:
-        """重建时间轴，优先复用原始时间戳信息"""
+        """重建逐采样时间轴"""
         n_samples = len(data)
+        return expand_time_axis(
+            self._time_breakpoints(n_samples, raw_timestamps, scale, fs),
+            n_samples
+        )
+
+    def _time_breakpoints(
+        self,
+        n_samples: int,
+        raw_timestamps: Optional[np.ndarray],
+        scale: float,
+        fs: float
+    ) -> Dict[str, np.ndarray]:
+        """重建时间轴的断点 (采样下标 -> 秒)，优先复用原始时间戳信息
 
+        时间轴在断点之间线性插值，通常每个采集分块一个断点，远少于采样点数。
+        """
         if raw_timestamps is not None and len(raw_timestamps) == n_samples:
             ts = np.asarray(raw_timestamps, dtype=float)
-            diffs = np.diff(ts)
-            positive_mask = diffs > 0
+            boundary_indices = np.flatnonzero(ts[1:] > ts[:-1]) + 1
 
-            if np.any(positive_mask):
-                boundary_indices = np.where(positive_mask)[0] + 1
+            if boundary_indices.size:
                 key_indices = np.concatenate(([0], boundary_indices, [n_samples - 1]))
                 key_indices = np.unique(key_indices)
 
@@ -311,12 +1244,14 @@ class H5Service:
                     key_seconds = key_units / scale
 
                     if np.any(np.diff(key_indices) > 0) and key_seconds[-1] >= 0:
-                        full_indices = np.arange(n_samples)
-                        reconstructed = np.interp(full_indices, key_indices, key_seconds)
-                        return reconstructed
+                        return {"indices": key_indices.astype(np.int64), "seconds": key_seconds}
 
         fs = fs if fs and fs > 0 else self.default_sample_rate
-        return np.arange(n_samples) / fs
+        last = max(n_samples - 1, 0)
+        return {
+            "indices": np.array([0, last], dtype=np.int64)[:min(n_samples, 2)],
+            "seconds": (np.array([0, last]) / fs)[:min(n_samples, 2)],
+        }
 
     def _extract_keypoints(
         self,
@@ -346,76 +1281,6 @@ class H5Service:
 
         return np.array([])
 
-    def _generate_thumbnail(
-        self,
-        timestamps: np.ndarray,
-        values: np.ndarray,
-        target_points: int = 100
-    ) -> Dict:
-        """生成缩略图（LTTB降采样，保留波形关键特征）"""
-        total_points = len(values)
-        if total_points <= target_points or target_points < 3:
-            return {
-                "timestamps": timestamps,
-                "values": values
-            }
-
-        # Largest-Triangle-Three-Buckets 算法，保留首末点与每个桶内面积最大的点
-        total_points = int(total_points)
-        bucket_size = (total_points - 2) / (target_points - 2)
-        indices: List[int] = [0]
-
-        a = 0
-        for i in range(0, target_points - 2):
-            bucket_start = int(np.floor(i * bucket_size)) + 1
-            bucket_end = int(np.floor((i + 1) * bucket_size)) + 1
-            bucket_end = min(bucket_end, total_points - 1)
-
-            if bucket_start >= bucket_end:
-                bucket_start = min(bucket_start, total_points - 2)
-                bucket_end = bucket_start + 1
-
-            bucket_slice = slice(bucket_start, bucket_end)
-
-            next_start = int(np.floor((i + 1) * bucket_size)) + 1
-            next_end = int(np.floor((i + 2) * bucket_size)) + 1
-            if next_start >= total_points:
-                next_start = total_points - 1
-            next_end = min(next_end, total_points)
-            if next_start >= next_end:
-                next_start = total_points - 2
-                next_end = total_points - 1
-
-            avg_range = slice(next_start, next_end)
-            avg_ts = np.mean(timestamps[avg_range])
-            avg_val = np.mean(values[avg_range])
-
-            point_ts = timestamps[bucket_slice]
-            point_vals = values[bucket_slice]
-
-            a_ts = timestamps[a]
-            a_val = values[a]
-
-            # 通过三角形面积甄别最能代表趋势的点
-            area = np.abs(
-                (a_ts - avg_ts) * (point_vals - a_val)
-                - (a_ts - point_ts) * (avg_val - a_val)
-            ) * 0.5
-
-            best_idx_in_bucket = int(np.argmax(area))
-            real_idx = bucket_start + best_idx_in_bucket
-
-            indices.append(real_idx)
-            a = real_idx
-
-        indices.append(total_points - 1)
-        indices = np.array(indices, dtype=int)
-
-        return {
-            "timestamps": timestamps[indices],
-            "values": values[indices]
-        }
-
 
 # 创建全局实例
 h5_service = H5Service()
@@ -0,0 +1,351 @@
+"""超长Trial的分块预处理
+
+按固定分块读取源数据，结果直接写入 derived/ 组 (布局见 h5_derived)：
+- 时间轴：先扫描一遍时间戳收集分块边界，再逐块插值
+- 零相位滤波：前向逐块 lfilter 携带状态写入未压缩的临时文件，再倒序逐块做反向滤波，
+  边界按 filtfilt 的奇对称延拓处理，结果与整段 filtfilt 一致
+- 拐点：阈值所需的中位数/分位数用直方图估计，逐块检测并增量写入
+- 金字塔：逐块降采样，不足一个桶的余数留到下一块
+峰值内存只与分块大小有关 (另有按时间戳分块数计的边界数组)，与Trial长度无关。
+"""
+
+import tempfile
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import h5py
+import numpy as np
+from scipy import signal
+
+from app.services.h5_derived import (
+    DERIVED_GROUP,
+    PYRAMID_FACTOR,
+    PYRAMID_GROUPS,
+    PYRAMID_MIN_POINTS,
+    create_stream_dataset,
+    write_derived_attrs,
+)
+
+if TYPE_CHECKING:
+    from app.services.h5_service import H5Service
+
+# 读取源数据的回调：(数据集名, 起始, 结束) -> 数组，名称为 "sensor" 或 "timestamps"
+SliceReader = Callable[[str, int, int], np.ndarray]
+
+HISTOGRAM_BINS = 1 << 16
+
+
+def iter_chunks(length: int, chunk: int) -> Iterator[Tuple[int, int]]:
+    for start in range(0, length, chunk):
+        yield start, min(start + chunk, length)
+
+
+def histogram_quantile(counts: np.ndarray, low: float, high: float, q: float) -> float:
+    """由直方图估计分位数，误差不超过一个桶宽"""
+    total = int(counts.sum())
+    if total == 0 or high <= low:
+        return float(low)
+    # 与 np.percentile 默认的线性插值使用同一秩位置
+    rank = q * (total - 1)
+    cumulative = np.cumsum(counts)
+    index = int(np.searchsorted(cumulative, rank, side='right'))
+    index = min(index, len(counts) - 1)
+    before = cumulative[index - 1] if index > 0 else 0
+    fraction = (rank - before + 0.5) / max(int(counts[index]), 1)
+    width = (high - low) / len(counts)
+    return float(low + (index + min(max(fraction, 0.0), 1.0)) * width)
+
+
+class PyramidWriter:
+    """增量写入 min/max 金字塔，结果与 build_pyramid 一致"""
+
+    def __init__(self, group: h5py.Group, length: int, factor: int = PYRAMID_FACTOR, min_points: int = PYRAMID_MIN_POINTS):
+        self.factor = factor
+        self.datasets: List[h5py.Dataset] = []
+        size = length
+        while size // factor >= min_points:
+            size //= factor
+            self.datasets.append(
+                create_stream_dataset(group, f"level_{len(self.datasets)}", size, np.float32, (2,))
+            )
+        self.offsets = [0] * len(self.datasets)
+        empty = np.empty(0, dtype=np.float32)
+        self.pending = [(empty, empty)] * len(self.datasets)
+
+    def feed(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float32)
+        self._push(0, values, values)
+
+    def _push(self, level: int, lows: np.ndarray, highs: np.ndarray) -> None:
+        if level >= len(self.datasets):
+            return
+        pending_lows, pending_highs = self.pending[level]
+        lows = np.concatenate([pending_lows, lows])
+        highs = np.concatenate([pending_highs, highs])
+        usable = (len(lows) // self.factor) * self.factor
+        self.pending[level] = (lows[usable:], highs[usable:])
+        if usable == 0:
+            return
+
+        level_lows = lows[:usable].reshape(-1, self.factor).min(axis=1)
+        level_highs = highs[:usable].reshape(-1, self.factor).max(axis=1)
+        dataset = self.datasets[level]
+        offset = self.offsets[level]
+        count = min(len(level_lows), dataset.shape[0] - offset)
+        if count <= 0:
+            return
+        dataset[offset:offset + count] = np.stack([level_lows[:count], level_highs[:count]], axis=1)
+        self.offsets[level] = offset + count
+        self._push(level + 1, level_lows[:count], level_highs[:count])
+
+
+class _DiffRange:
+    """倒序逐块累计相邻差分的范围"""
+
+    def __init__(self) -> None:
+        self.low = np.inf
+        self.high = -np.inf
+        self.abs_high = 0.0
+        self.next_first: Optional[float] = None
+
+    def update(self, chunk: np.ndarray) -> None:
+        extended = chunk if self.next_first is None else np.concatenate((chunk, [self.next_first]))
+        self.next_first = float(chunk[0])
+        dy = np.diff(extended)
+        if dy.size:
+            self.low = min(self.low, float(dy.min()))
+            self.high = max(self.high, float(dy.max()))
+            self.abs_high = max(self.abs_high, float(np.abs(dy).max()))
+
+    def result(self) -> Tuple[float, float, float]:
+        if self.low > self.high:
+            return 0.0, 0.0, 0.0
+        return self.low, self.high, self.abs_high
+
+
+class StreamingPreprocessor:
+    """与 H5Service._prepare_waveform 等价的分块预处理"""
+
+    def __init__(
+        self,
+        service: "H5Service",
+        chunk_samples: int,
+        keypoint_min_distance: int = 3,
+        scratch_dir: Optional[str] = None,
+    ):
+        # 分块对齐到金字塔倍数，减少余数拼接
+        self.chunk = max(PYRAMID_FACTOR, chunk_samples - chunk_samples % PYRAMID_FACTOR)
+        self.service = service
+        self.scratch_dir = scratch_dir
+        self.keypoint_min_distance = keypoint_min_distance
+
+    def run(
+        self,
+        read_slice: SliceReader,
+        length: int,
+        timestamps_length: int,
+        target: h5py.Group,
+        fingerprint: str,
+    ) -> Dict[str, Any]:
+        """处理一个Trial并写入 target/derived，返回采样率与时长"""
+        if DERIVED_GROUP in target:
+            del target[DERIVED_GROUP]
+        group = target.create_group(DERIVED_GROUP)
+
+        sample_rate, duration = self._write_timestamps(read_slice, length, timestamps_length, group)
+        filtered = create_stream_dataset(group, "filtered", length, np.float64)
+        pyramids = {}
+        for series, name in PYRAMID_GROUPS.items():
+            pyramid_group = group.create_group(name)
+            pyramid_group.attrs["factor"] = PYRAMID_FACTOR
+            pyramids[series] = PyramidWriter(pyramid_group, length)
+        diff_range = self._filter(read_slice, length, sample_rate, filtered, pyramids["raw"])
+        self._write_keypoints(filtered, group, pyramids["filtered"], diff_range)
+
+        summary = {"sample_rate": sample_rate, "duration": duration, "source_length": length}
+        write_derived_attrs(group, summary, fingerprint)
+        return summary
+
+    def _scan_timestamps(self, read_slice: SliceReader, length: int) -> Dict[str, Any]:
+        """收集时间戳递增的位置 (分块边界)"""
+        boundaries: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        diffs: List[np.ndarray] = []
+        first = last = None
+        for start, end in iter_chunks(length, self.chunk):
+            ts = np.asarray(read_slice("timestamps", start, end), dtype=float)
+            if first is None:
+                first = ts[0]
+                extended = ts
+                offset = start
+            else:
+                extended = np.concatenate(([last], ts))
+                offset = start - 1
+            step = np.diff(extended)
+            positive = np.where(step > 0)[0]
+            boundaries.append(positive + offset + 1)
+            values.append(extended[positive + 1])
+            diffs.append(step[positive])
+            last = ts[-1]
+        return {
+            "first": first,
+            "last": last,
+            "boundaries": np.concatenate(boundaries) if boundaries else np.empty(0, dtype=int),
+            "values": np.concatenate(values) if values else np.empty(0),
+            "positive_diffs": np.concatenate(diffs) if diffs else np.empty(0),
+        }
+
+    def _write_timestamps(
+        self,
+        read_slice: SliceReader,
+        length: int,
+        timestamps_length: int,
+        group: h5py.Group,
+    ) -> Tuple[float, float]:
+        service = self.service
+        scan = self._scan_timestamps(read_slice, timestamps_length)
+
+        if timestamps_length <= 1:
+            scale = 1.0
+            sample_rate = None
+        else:
+            scale = service._scale_from_positive_diffs(scan["positive_diffs"])
+            sample_rate = service._sample_rate_from_span(scan["last"] - scan["first"], length, scale)
+        fs = service._normalize_sample_rate(sample_rate)
+
+        key_indices = key_seconds = None
+        if timestamps_length == length and scan["boundaries"].size:
+            indices = np.concatenate(([0], scan["boundaries"], [length - 1]))
+            units = np.concatenate(([scan["first"]], scan["values"], [scan["last"]]))
+            indices, unique_positions = np.unique(indices, return_index=True)
+            seconds = (units[unique_positions] - scan["first"]) / (scale if scale and scale > 0 else 1.0)
+            if indices.size >= 2 and seconds[-1] >= 0:
+                key_indices, key_seconds = indices, seconds
+
+        if key_indices is None:
+            # 等间隔时间轴，与 H5Service._time_breakpoints 的兜底一致
+            last = max(length - 1, 0)
+            key_indices = np.array([0, last], dtype=np.int64)[:min(length, 2)]
+            key_seconds = (np.array([0, last]) / fs)[:min(length, 2)]
+
+        group.create_dataset("timeIndices", data=np.asarray(key_indices, dtype=np.int64))
+        group.create_dataset("timeSeconds", data=np.asarray(key_seconds, dtype=np.float64))
+        dataset = create_stream_dataset(group, "timestamps", length, np.float64)
+        for start, end in iter_chunks(length, self.chunk):
+            dataset[start:end] = np.interp(np.arange(start, end), key_indices, key_seconds)
+
+        duration = float(key_seconds[-1] - key_seconds[0]) if length > 1 else 0.0
+        return fs, duration
+
+    def _filter(
+        self,
+        read_slice: SliceReader,
+        length: int,
+        fs: float,
+        output: h5py.Dataset,
+        raw_pyramid: PyramidWriter,
+    ) -> Tuple[float, float, float]:
+        """分块零相位滤波，等价于 signal.filtfilt(b, a, x) 的默认奇延拓
+
+        前向读取源数据时顺带写入原始信号金字塔；
+        倒序写回时统计相邻差分的范围 (最小、最大、绝对值最大)，供拐点阈值使用。
+        """
+        service = self.service
+        coefficients = service._lowpass_coefficients(service.lowpass_cutoff, fs, service.lowpass_order)
+        diff_range = _DiffRange()
+        if coefficients is None:
+            for start, end in reversed(list(iter_chunks(length, self.chunk))):
+                chunk = np.asarray(read_slice("sensor", start, end), dtype=np.float64)
+                output[start:end] = chunk
+                diff_range.update(chunk)
+            # 不滤波时输出即源数据，按正序从输出补写金字塔
+            for start, end in iter_chunks(length, self.chunk):
+                raw_pyramid.feed(output[start:end])
+            return diff_range.result()
+
+        b, a = coefficients
+        edge = 3 * max(len(a), len(b))
+        if length <= edge:
+            raise ValueError(f"Trial too short for streaming filter ({length} <= {edge})")
+        zi = signal.lfilter_zi(b, a)
+
+        head = np.asarray(read_slice("sensor", 0, edge + 1), dtype=np.float64)
+        left = 2 * head[0] - head[edge:0:-1]
+        _, state = signal.lfilter(b, a, left, zi=zi * left[0])
+
+        with tempfile.TemporaryFile(dir=self.scratch_dir) as scratch:
+            # 前向滤波结果只用于反向滤波，写入未压缩的临时文件
+            for start, end in iter_chunks(length, self.chunk):
+                chunk = np.asarray(read_slice("sensor", start, end), dtype=np.float64)
+                raw_pyramid.feed(chunk)
+                forward, state = signal.lfilter(b, a, chunk, zi=state)
+                scratch.write(forward.tobytes())
+
+            tail = np.asarray(read_slice("sensor", length - edge - 1, length), dtype=np.float64)
+            right = 2 * tail[-1] - tail[-2::-1]
+            right_forward, _ = signal.lfilter(b, a, right, zi=state)
+
+            # 反向滤波从右侧延拓开始，倒序逐块写入输出
+            _, state = signal.lfilter(b, a, right_forward[::-1], zi=zi * right_forward[-1])
+            for start, end in reversed(list(iter_chunks(length, self.chunk))):
+                scratch.seek(start * 8)
+                forward = np.frombuffer(scratch.read((end - start) * 8), dtype=np.float64)
+                backward, state = signal.lfilter(b, a, forward[::-1], zi=state)
+                chunk = backward[::-1]
+                output[start:end] = chunk
+                diff_range.update(chunk)
+
+        return diff_range.result()
+
+    def _iter_diffs(self, filtered: h5py.Dataset) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """逐块产出 (起始下标, 滤波值, 与前一点的差分)，差分跨块连续"""
+        previous = None
+        for start, end in iter_chunks(filtered.shape[0], self.chunk):
+            values = filtered[start:end]
+            extended = values if previous is None else np.concatenate(([previous], values))
+            diff_start = start if previous is None else start - 1
+            previous = values[-1]
+            yield diff_start, values, np.diff(extended)
+
+    def _write_keypoints(
+        self,
+        filtered: h5py.Dataset,
+        group: h5py.Group,
+        pyramid: PyramidWriter,
+        diff_range: Tuple[float, float, float],
+    ) -> None:
+        """与 _extract_keypoints 相同的阈值规则，统计量改为直方图估计"""
+        keypoints = create_stream_dataset(group, "keypoints", 0, np.int64, resizable=True)
+        if filtered.shape[0] < 2:
+            for _, values, _ in self._iter_diffs(filtered):
+                pyramid.feed(values)
+            return
+
+        low, high, abs_high = diff_range
+        dy_counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        abs_counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        for _, values, dy in self._iter_diffs(filtered):
+            pyramid.feed(values)
+            dy_counts += np.histogram(dy, bins=HISTOGRAM_BINS, range=(low, max(high, low)))[0]
+            abs_counts += np.histogram(np.abs(dy), bins=HISTOGRAM_BINS, range=(0.0, abs_high))[0]
+        median = histogram_quantile(dy_counts, low, high, 0.5)
+        p75 = histogram_quantile(abs_counts, 0.0, abs_high, 0.75)
+
+        deviation_high = max(abs(high - median), abs(low - median))
+        deviation_counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        for _, _, dy in self._iter_diffs(filtered):
+            deviation_counts += np.histogram(np.abs(dy - median), bins=HISTOGRAM_BINS, range=(0.0, deviation_high))[0]
+        mad = histogram_quantile(deviation_counts, 0.0, deviation_high, 0.5)
+        threshold = p75 + 1.5 * mad
+
+        last = None
+        for diff_start, _, dy in self._iter_diffs(filtered):
+            candidates = (np.where(np.abs(dy) >= threshold)[0] + diff_start).tolist()
+            kept: List[int] = []
+            for candidate in candidates:
+                if last is None or candidate - last >= self.keypoint_min_distance:
+                    kept.append(candidate)
+                    last = candidate
+            if kept:
+                offset = keypoints.shape[0]
+                keypoints.resize((offset + len(kept),))
+                keypoints[offset:] = kept
@@ -0,0 +1,212 @@
+"""Trial元数据的过期检测与后台重算
+
+元数据写入时带有源文件 mtime/size 与预处理参数指纹 (H5Service.metadata_stamp)。
+列表接口先返回旧数据并在后台重算过期的Trial；批量校验任务只处理有变化的文件。
+排序与筛选用的特征不在列表冷加载中计算，同样由后台任务补算。
+"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.config import settings
+from app.db.repositories.trial_metadata_repo import TrialMetadataRepository
+from app.services.h5_service import h5_service
+
+
+class MetadataRevalidator:
+    """后台重算过期元数据，同一Trial同时只排队一次"""
+
+    def __init__(self, max_concurrency: int) -> None:
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._pending: Dict[Tuple[str, str, int], asyncio.Task] = {}
+        self._job: Optional[asyncio.Task] = None
+        self.scheduled = 0
+        self.refreshed = 0
+        self.features_computed = 0
+        self.failed = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def schedule(
+        self,
+        db: AsyncIOMotorDatabase,
+        file_id: str,
+        file_path: str,
+        trial_indices: Iterable[int],
+        stamp: Dict,
+    ) -> int:
+        """为过期Trial创建后台重算任务，返回新排队的数量"""
+        return self._schedule(
+            "metadata",
+            file_id,
+            trial_indices,
+            lambda trial_index: self.refresh_trial(db, file_id, file_path, trial_index, stamp),
+        )
+
+    def schedule_features(
+        self,
+        db: AsyncIOMotorDatabase,
+        file_id: str,
+        file_path: str,
+        trial_indices: Iterable[int],
+    ) -> int:
+        """为缺少特征的Trial创建后台计算任务，返回新排队的数量"""
+        return self._schedule(
+            "features",
+            file_id,
+            trial_indices,
+            lambda trial_index: self.refresh_features(db, file_id, file_path, trial_index),
+        )
+
+    def _schedule(
+        self,
+        kind: str,
+        file_id: str,
+        trial_indices: Iterable[int],
+        create: Callable[[int], Awaitable[bool]],
+    ) -> int:
+        count = 0
+        for trial_index in trial_indices:
+            key = (kind, file_id, trial_index)
+            if key in self._pending:
+                continue
+            task = asyncio.create_task(create(trial_index))
+            self._pending[key] = task
+            task.add_done_callback(lambda _, key=key: self._pending.pop(key, None))
+            count += 1
+        self.scheduled += count
+        return count
+
+    async def refresh_trial(
+        self,
+        db: AsyncIOMotorDatabase,
+        file_id: str,
+        file_path: str,
+        trial_index: int,
+        stamp: Dict,
+    ) -> bool:
+        async with self._semaphore:
+            try:
+                # 缓存键包含文件与参数指纹，这里总会得到按当前参数计算的结果
+                metadata = await h5_service.get_trial_metadata(file_path, trial_index)
+                await TrialMetadataRepository(db).refresh(file_id, trial_index, metadata, stamp)
+                self.refreshed += 1
+                return True
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Failed to refresh metadata for {file_id} trial {trial_index}: {e}")
+                return False
+
+    async def refresh_features(
+        self,
+        db: AsyncIOMotorDatabase,
+        file_id: str,
+        file_path: str,
+        trial_index: int,
+    ) -> bool:
+        async with self._semaphore:
+            try:
+                features = await h5_service.get_trial_features(file_path, trial_index)
+                await TrialMetadataRepository(db).set_features(file_id, trial_index, features)
+                self.features_computed += 1
+                return True
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Failed to compute features for {file_id} trial {trial_index}: {e}")
+                return False
+
+    async def revalidate(
+        self,
+        db: AsyncIOMotorDatabase,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """校验所有文件并补算特征：未变化且特征齐全的文件只需两次索引查询"""
+        summary: Dict[str, Any] = {
+            "startedAt": datetime.utcnow(),
+            "finishedAt": None,
+            "files": 0,
+            "changedFiles": 0,
+            "refreshed": 0,
+            "features": 0,
+            "failed": 0,
+            "removed": 0,
+        }
+        repo = TrialMetadataRepository(db)
+        files = await asyncio.to_thread(h5_service.scan_files)
+
+        for file_info in files:
+            file_id = file_info['fileId']
+            file_path = file_info['fullPath']
+            summary["files"] += 1
+
+            try:
+                stamp = h5_service.metadata_stamp(file_path)
+            except OSError:
+                continue
+
+            stale = await repo.find_stale_indices(file_id, stamp)
+            if stale:
+                summary["changedFiles"] += 1
+                trial_count = await h5_service.get_trial_count(file_path)
+                summary["removed"] += await repo.delete_beyond(file_id, trial_count)
+
+                results = await asyncio.gather(*(
+                    self.refresh_trial(db, file_id, file_path, trial_index, stamp)
+                    for trial_index in stale
+                    if trial_index < trial_count
+                ))
+                summary["refreshed"] += sum(1 for ok in results if ok)
+                summary["failed"] += sum(1 for ok in results if not ok)
+
+            # 重算后的Trial特征同样待补算
+            pending = await repo.find_feature_pending(file_id)
+            if pending:
+                results = await asyncio.gather(*(
+                    self.refresh_features(db, file_id, file_path, trial_index)
+                    for trial_index in pending
+                ))
+                summary["features"] += sum(1 for ok in results if ok)
+                summary["failed"] += sum(1 for ok in results if not ok)
+
+            if (stale or pending) and on_progress is not None:
+                on_progress(summary)
+
+        summary["finishedAt"] = datetime.utcnow()
+        self.last_run = summary
+        return summary
+
+    def start_revalidation(self, db: AsyncIOMotorDatabase) -> bool:
+        """在后台启动批量校验，已有任务运行时返回 False"""
+        if self.is_running:
+            return False
+        self._job = asyncio.create_task(self.revalidate(db))
+        return True
+
+    @property
+    def is_running(self) -> bool:
+        return self._job is not None and not self._job.done()
+
+    def shutdown(self) -> None:
+        for task in list(self._pending.values()):
+            task.cancel()
+        if self._job is not None:
+            self._job.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "scheduled": self.scheduled,
+            "refreshed": self.refreshed,
+            "featuresComputed": self.features_computed,
+            "failed": self.failed,
+            "revalidating": self.is_running,
+            "lastRun": self.last_run,
+        }
+
+
+# 创建全局实例
+metadata_revalidator = MetadataRevalidator(settings.METADATA_REFRESH_CONCURRENCY)
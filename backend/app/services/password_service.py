@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+from app.config import settings
+
+
+class PasswordHasher:
+    """bcrypt 哈希服务，在专用有界线程池中执行以免阻塞事件循环"""
+
+    def __init__(self, rounds: int, max_workers: int) -> None:
+        self.rounds = rounds
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="bcrypt",
+            )
+        return self._executor
+
+    def hash_sync(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=self.rounds)).decode()
+
+    def verify_sync(self, password: str, password_hash: str) -> bool:
+        try:
+            return bcrypt.checkpw(password.encode(), password_hash.encode())
+        except ValueError:
+            return False
+
+    async def hash(self, password: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.hash_sync, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.verify_sync, password, password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """哈希成本与当前配置不一致时需要重新哈希"""
+        try:
+            return int(password_hash.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# 创建全局实例
+password_hasher = PasswordHasher(
+    rounds=settings.BCRYPT_ROUNDS,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+)
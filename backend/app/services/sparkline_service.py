@@ -0,0 +1,106 @@
+"""服务端渲染的Trial缩略图 (PNG/SVG/雪碧图) 与磁盘缓存
+
+图片地址由版本 (源文件指纹 + 预处理参数 + 缩略图元数据版本 + 渲染格式) 确定内容，渲染结果按版本与参数写入磁盘，
+重启后仍可直接返回；文件或参数变化后旧版本文件不再被读取，写入时按目录容量上限从最旧的文件开始清理。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+from app.config import settings
+from app.services.h5_service import METADATA_VERSION, H5Service, h5_service
+from app.services.single_flight import SingleFlight
+from app.utils.disk_cache import prune_directory
+
+# 渲染结果格式版本，配色、线宽或编码变化时递增
+SPARKLINE_FORMAT_VERSION = 1
+# 两次容量清理的最短间隔 (秒)，避免每次写入都扫描目录
+PRUNE_INTERVAL_SECONDS = 60.0
+
+
+class IncompleteRender(Exception):
+    """渲染结果不完整 (部分Trial失败)：不写入磁盘缓存，由调用方以不可缓存的响应返回"""
+
+    def __init__(self, content: bytes, failed: List[int]) -> None:
+        super().__init__(f"{len(failed)} trials failed to render")
+        self.content = content
+        self.failed = failed
+
+
+class SparklineService:
+    def __init__(self, h5: H5Service, cache_dir: str, max_bytes: int = settings.SPARKLINE_CACHE_MAX_BYTES) -> None:
+        self.h5 = h5
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._single_flight = SingleFlight()
+        self._last_prune = -PRUNE_INTERVAL_SECONDS
+
+    def version(self, file_path: str) -> str:
+        """缩略图内容版本，任一来源变化图片地址即变化"""
+        parts = (
+            f"{self.h5.file_fingerprint(file_path)}:{self.h5.processing_fingerprint()}:"
+            f"{METADATA_VERSION}:{SPARKLINE_FORMAT_VERSION}"
+        )
+        return hashlib.sha1(parts.encode()).hexdigest()[:16]
+
+    def cache_path(self, file_path: str, version: str, name: str) -> Path:
+        path_hash = hashlib.sha1(str(file_path).encode()).hexdigest()[:16]
+        return self.cache_dir / f"{path_hash}-{version}-{name}"
+
+    async def get(self, file_path: str, version: str, name: str, render: Callable[[], Awaitable[bytes]]) -> bytes:
+        """读取磁盘缓存，未命中时渲染并写入；同一图片的并发请求只渲染一次
+
+        render 抛出 IncompleteRender 时结果不写入磁盘，下次请求重新渲染。
+        """
+        path = self.cache_path(file_path, version, name)
+
+        async def load() -> bytes:
+            content = await asyncio.to_thread(self._read, path)
+            if content is not None:
+                return content
+            content = await render()
+            await asyncio.to_thread(self._write, path, content)
+            await self._maybe_prune()
+            return content
+
+        return await self._single_flight.do(str(path), load)
+
+    async def _maybe_prune(self) -> None:
+        now = time.monotonic()
+        if now - self._last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = now
+        removed = await asyncio.to_thread(prune_directory, self.cache_dir, self.max_bytes)
+        if removed:
+            print(f"🧹 Pruned {removed} sparkline cache files")
+
+    @staticmethod
+    def _read(path: Path):
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write(path: Path, content: bytes) -> None:
+        """写入临时文件后原子替换，失败时只记录日志 (缓存不影响响应)"""
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path.write_bytes(content)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️  Failed to cache sparkline {path.name}: {e}")
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+
+# 创建全局实例
+sparkline_service = SparklineService(h5_service, settings.SPARKLINE_CACHE_DIR)
@@ -0,0 +1,183 @@
+"""Trial特征向量：Trial列表按幅度、拐点、时长等排序与筛选
+
+特征与缩略图分开、在后台计算 (不占用列表冷加载)，写入 trial_metadata.features 并建立索引，
+列表接口排序与筛选时不再读取H5文件。幅度类特征来自原始信号 (可分块累加)，
+主频与拐点数来自与缩略图相同的降采样滤波信号。
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import fft
+
+FEATURE_FIELDS = (
+    "rms",
+    "peakToPeak",
+    "dominantFrequency",
+    "keypointCount",
+    "saturationFraction",
+    "flatlineFraction",
+)
+# 可排序与筛选的字段 -> 文档路径
+FEATURE_PATHS: Dict[str, str] = {
+    **{name: f"features.{name}" for name in FEATURE_FIELDS},
+    "duration": "duration",
+    "trialIndex": "trialIndex",
+}
+FILTER_OPERATORS = {">=": "$gte", "<=": "$lte", ">": "$gt", "<": "$lt"}
+# 特征算法版本，随特征一起写入 (featuresVersion)，递增后已有特征在后台重算
+FEATURES_VERSION = 1
+# 拐点阈值的分位数统计最多使用的差分数 (等间隔抽取)
+THRESHOLD_SAMPLE_SIZE = 16384
+
+
+class SignalStats:
+    """原始信号幅度统计，可分块喂入 (超长Trial不整段加载)
+
+    饱和比例为取到全局最小或最大值的采样占比 (只出现一次的极值不算饱和)；
+    平直比例为与前一采样完全相等的采样占比。NaN 不参与统计。
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.sum_squares = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.min_count = 0
+        self.max_count = 0
+        self.flat = 0
+        self._previous: Optional[float] = None
+
+    def feed(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        extended = values if self._previous is None else np.concatenate(([self._previous], values))
+        self.flat += int(np.count_nonzero(np.diff(extended) == 0))
+        self._previous = float(values[-1])
+
+        mask = np.isfinite(values)
+        finite = values if mask.all() else values[mask]
+        if finite.size == 0:
+            return
+        self.count += finite.size
+        self.sum_squares += float(np.dot(finite, finite))
+        low, high = float(finite.min()), float(finite.max())
+        self.minimum, self.min_count = self._merge_extreme(self.minimum, self.min_count, low, finite, low < self.minimum)
+        self.maximum, self.max_count = self._merge_extreme(self.maximum, self.max_count, high, finite, high > self.maximum)
+
+    @staticmethod
+    def _merge_extreme(current: float, count: int, candidate: float, values: np.ndarray, replaces: bool) -> Tuple[float, int]:
+        if replaces:
+            return candidate, int(np.count_nonzero(values == candidate))
+        if candidate == current:
+            return current, count + int(np.count_nonzero(values == candidate))
+        return current, count
+
+    def result(self) -> Dict[str, float]:
+        if self.count == 0:
+            return {"rms": 0.0, "peakToPeak": 0.0, "saturationFraction": 0.0, "flatlineFraction": 0.0}
+        saturated = sum(count for count in (self.min_count, self.max_count) if count > 1)
+        if self.minimum == self.maximum:
+            saturated = 0
+        return {
+            "rms": math.sqrt(self.sum_squares / self.count),
+            "peakToPeak": self.maximum - self.minimum,
+            "saturationFraction": saturated / self.count,
+            "flatlineFraction": self.flat / max(self.count - 1, 1),
+        }
+
+
+def keypoint_count(filtered: np.ndarray, min_distance: int = 1) -> int:
+    """与 H5Service._extract_keypoints 相同的阈值规则，只统计数量"""
+    if len(filtered) < 2:
+        return 0
+    dy = np.diff(filtered)
+    # 与分块预处理的直方图估计同理，阈值由抽样差分估计
+    sample = dy[::max(1, dy.size // THRESHOLD_SAMPLE_SIZE)]
+    mad = np.median(np.abs(sample - np.median(sample)))
+    threshold = np.percentile(np.abs(sample), 75) + 1.5 * mad
+    hits = np.flatnonzero(np.abs(dy) >= threshold)
+    if min_distance <= 1 or hits.size == 0:
+        return int(hits.size)
+
+    count, last = 0, None
+    for hit in hits.tolist():
+        if last is None or hit - last >= min_distance:
+            count += 1
+            last = hit
+    return count
+
+
+def dominant_frequency(filtered: np.ndarray, rate: float, max_frequency: float) -> float:
+    """去均值后功率谱峰值对应的频率 (Hz)，只在 (0, max_frequency] 内搜索
+
+    输入已低通到 max_frequency，先抽取到 2.5 倍 max_frequency 再做 FFT，频率分辨率不变。
+    """
+    step = max(1, int(rate // (2.5 * max_frequency))) if max_frequency > 0 else 1
+    values = np.asarray(filtered, dtype=np.float64)[::step]
+    values = values[np.isfinite(values)]
+    rate = rate / step
+    if values.size < 4 or rate <= 0:
+        return 0.0
+    size = fft.next_fast_len(values.size, real=True)
+    power = np.abs(fft.rfft(values - values.mean(), size)) ** 2
+    frequencies = np.arange(power.size) * rate / size
+    band = (frequencies > 0) & (frequencies <= max_frequency)
+    if not band.any() or not power[band].any():
+        return 0.0
+    return float(frequencies[band][np.argmax(power[band])])
+
+
+def trial_features(
+    stats: SignalStats,
+    filtered: np.ndarray,
+    filtered_rate: float,
+    cutoff: float,
+    keypoint_min_distance: int,
+) -> Dict[str, float]:
+    features = stats.result()
+    features["dominantFrequency"] = dominant_frequency(filtered, filtered_rate, cutoff)
+    features["keypointCount"] = keypoint_count(filtered, keypoint_min_distance)
+    return {name: features[name] for name in FEATURE_FIELDS}
+
+
+def parse_trial_sort(sort: Optional[str]) -> Optional[Tuple[str, int]]:
+    """解析排序参数 (字段名，前缀 - 表示降序)，返回 (文档路径, 方向)"""
+    if sort is None or not sort.strip():
+        return None
+    sort = sort.strip()
+    direction = -1 if sort.startswith("-") else 1
+    name = sort.lstrip("-")
+    if name not in FEATURE_PATHS:
+        raise ValueError(f"Unknown sort field: {name}; expected any of {', '.join(FEATURE_PATHS)}")
+    return FEATURE_PATHS[name], direction
+
+
+def parse_trial_filters(filters: Optional[List[str]]) -> Dict[str, Dict[str, float]]:
+    """解析筛选条件 (如 rms>=0.5、flatlineFraction<0.1)，返回 MongoDB 查询条件"""
+    query: Dict[str, Dict[str, float]] = {}
+    for expression in filters or []:
+        for item in expression.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            # 先匹配两个字符的运算符
+            for symbol in sorted(FILTER_OPERATORS, key=len, reverse=True):
+                name, found, value = item.partition(symbol)
+                if found:
+                    break
+            else:
+                raise ValueError(f"Invalid filter: {item}; expected <field><op><value> with op in >=, <=, >, <")
+            name = name.strip()
+            if name not in FEATURE_PATHS:
+                raise ValueError(f"Unknown filter field: {name}; expected any of {', '.join(FEATURE_PATHS)}")
+            try:
+                number = float(value)
+            except ValueError:
+                raise ValueError(f"Invalid filter value: {value.strip()}")
+            query.setdefault(FEATURE_PATHS[name], {})[FILTER_OPERATORS[symbol]] = number
+    return query
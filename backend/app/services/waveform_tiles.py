@@ -0,0 +1,105 @@
+"""波形瓦片：min/max 金字塔每层按固定点数切分
+
+第 0 层为逐采样数据，第 k 层 (k >= 1) 对应金字塔 level_{k-1}，每点覆盖 factor**k 个采样。
+每个瓦片只读取自身覆盖的切片，平移与缩放的服务端开销与瓦片大小成正比。
+"""
+
+from typing import Any, Callable, Dict
+
+import numpy as np
+
+from app.services.h5_derived import PYRAMID_FACTOR, compact_time_axis, pyramid_level_count
+
+# 每个瓦片的点数，修改后瓦片版本随之变化
+TILE_POINTS = 1024
+# 瓦片结构版本，结构变化时递增
+TILE_FORMAT_VERSION = 1
+TILE_SERIES = ("raw", "filtered")
+
+# (序列, 起始采样, 结束采样) -> 采样值
+SampleReader = Callable[[str, int, int], np.ndarray]
+# (序列, 金字塔层, 起始点, 结束点) -> (n, 2) 的 (min, max) 包络
+EnvelopeReader = Callable[[str, int, int, int], np.ndarray]
+# (起始采样, 结束采样) -> 覆盖该区间的时间轴断点 {"indices", "seconds"}
+TimeAxisReader = Callable[[int, int], Dict[str, np.ndarray]]
+
+
+def _ceil_div(a: int, b: int) -> int:
+    return -(-a // b)
+
+
+def tile_layout(length: int, tile_points: int = TILE_POINTS) -> Dict[str, Any]:
+    """各层的每点采样数、点数与瓦片数"""
+    levels = []
+    for level in range(pyramid_level_count(length) + 1):
+        samples_per_point = PYRAMID_FACTOR ** level
+        points = _ceil_div(length, samples_per_point)
+        levels.append({
+            "level": level,
+            "samplesPerPoint": samples_per_point,
+            "points": points,
+            "tiles": _ceil_div(points, tile_points),
+        })
+    return {"length": length, "factor": PYRAMID_FACTOR, "tilePoints": tile_points, "levels": levels}
+
+
+def _envelope(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float32)
+    if values.size == 0:
+        return np.empty((0, 2), dtype=np.float32)
+    return np.array([[np.nanmin(values), np.nanmax(values)]], dtype=np.float32)
+
+
+def build_tile(
+    length: int,
+    level: int,
+    tile_index: int,
+    read_time_axis: TimeAxisReader,
+    read_samples: SampleReader,
+    read_envelope: EnvelopeReader,
+    tile_points: int = TILE_POINTS,
+) -> Dict[str, Any]:
+    """构建一个瓦片
+
+    第 0 层返回 values，其余层返回 min/max；timeAxis 以瓦片起始采样为原点，
+    第 j 个点对应第 j * samplesPerPoint 个采样。
+    """
+    if level < 0 or level > pyramid_level_count(length):
+        raise ValueError(f"Tile level {level} out of range")
+    samples_per_point = PYRAMID_FACTOR ** level
+    total_points = _ceil_div(length, samples_per_point)
+    first = tile_index * tile_points
+    if tile_index < 0 or first >= total_points:
+        raise ValueError(f"Tile index {tile_index} out of range at level {level}")
+
+    last = min(first + tile_points, total_points)
+    start_sample = first * samples_per_point
+    end_sample = min(last * samples_per_point, length)
+    offsets = np.arange(last - first, dtype=np.int64) * samples_per_point
+    time_axis = read_time_axis(start_sample, end_sample)
+    seconds = np.interp(start_sample + offsets, time_axis["indices"], time_axis["seconds"])
+
+    tile: Dict[str, Any] = {
+        "level": level,
+        "tileIndex": tile_index,
+        "samplesPerPoint": samples_per_point,
+        "startIndex": start_sample,
+        "endIndex": end_sample,
+        "count": last - first,
+        "timeAxis": compact_time_axis({"indices": offsets, "seconds": seconds}, end_sample - start_sample),
+    }
+
+    if level == 0:
+        for series in TILE_SERIES:
+            tile[series] = {"values": read_samples(series, start_sample, end_sample)}
+        return tile
+
+    # 金字塔截断了不足一个桶的尾部，尾部瓦片按源数据补一个包络点
+    stored = length // samples_per_point
+    for series in TILE_SERIES:
+        envelope = read_envelope(series, level - 1, first, min(last, stored))
+        if last > stored:
+            tail = _envelope(read_samples(series, stored * samples_per_point, length))
+            envelope = np.concatenate([np.asarray(envelope, dtype=np.float32).reshape(-1, 2), tail])
+        tile[series] = {"min": envelope[:, 0], "max": envelope[:, 1]}
+    return tile
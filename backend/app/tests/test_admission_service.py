@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.services.admission_service import AdmissionController, AdmissionRejected
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+def _controller(budget=1000, max_wait=1.0):
+    controller = AdmissionController(memory_budget_bytes=budget, max_wait=max_wait, retry_after=7)
+    controller.add_lane("waveform", max_concurrency=1, max_queue=1)
+    controller.add_lane("trials", max_concurrency=2, max_queue=0)
+    return controller
+
+
+async def test_full_queue_rejects_with_retry_after():
+    controller = _controller()
+    release = asyncio.Event()
+
+    async def hold():
+        async with controller.admit("waveform", 10):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        async with controller.admit("waveform", 10):
+            pass
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers["Retry-After"] == "7"
+
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert controller.used_bytes == 0
+    assert controller.lanes["waveform"].admitted == 2
+
+
+async def test_memory_budget_is_shared_across_lanes():
+    controller = _controller(budget=1000, max_wait=0.05)
+
+    async with controller.admit("waveform", 800):
+        # 预算不足且 trials 通道不允许排队
+        with pytest.raises(AdmissionRejected):
+            async with controller.admit("trials", 300):
+                pass
+        async with controller.admit("trials", 100):
+            assert controller.used_bytes == 900
+
+    # 空闲时允许单个超预算请求通过
+    async with controller.admit("waveform", 5000):
+        assert controller.used_bytes == 5000
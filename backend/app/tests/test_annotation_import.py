@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+from app.services import annotation_import_service as import_module
+from app.services.annotation_import_service import (
+    AnnotationImporter,
+    AnnotationImportJob,
+    build_phase_index,
+    detect_format,
+    iter_rows,
+    normalize_row,
+)
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+TEMPLATE = {
+    "_id": "template-1",
+    "phases": [
+        {"id": "p1", "name": "阶段一", "color": "#ff0000", "shortcut": "1", "order": 0},
+        {"id": "p2", "name": "阶段二", "color": "#00ff00", "shortcut": "2", "order": 1},
+    ],
+}
+
+
+class StubAnnotationRepository:
+    def __init__(self, db):
+        self.bulk_calls = []
+        self.deleted_versions = []
+
+    async def delete_by_versions(self, version_ids):
+        self.deleted_versions.extend(version_ids)
+        return 0
+
+    async def bulk_insert(self, docs):
+        self.bulk_calls.append(len(docs))
+        return len(docs)
+
+
+class StubVersionRepository:
+    def __init__(self, db):
+        self.upsert_calls = 0
+        self.counts = {}
+
+    async def bulk_upsert_versions(self, *, keys, user_id, username, reset_counts, status="active"):
+        self.upsert_calls += 1
+        return {key: f"version-{key[0]}-{key[1]}" for key in keys}
+
+    async def bulk_increment_segment_counts(self, counts):
+        for version_id, count in counts.items():
+            self.counts[version_id] = self.counts.get(version_id, 0) + count
+
+
+class StubMetadataRepository:
+    def __init__(self, db):
+        pass
+
+    async def get_trial_lengths(self, file_id, trial_indices):
+        return {
+            idx: {"dataPoints": 1000, "sampleRate": 500.0}
+            for idx in trial_indices
+            if idx < 2
+        }
+
+
+@pytest.fixture
+def importer(monkeypatch):
+    monkeypatch.setattr(import_module, "AnnotationRepository", StubAnnotationRepository)
+    monkeypatch.setattr(import_module, "AnnotationVersionRepository", StubVersionRepository)
+    monkeypatch.setattr(import_module, "TrialMetadataRepository", StubMetadataRepository)
+    monkeypatch.setattr(AnnotationImporter, "_read_trial_lengths", lambda self, file_id, indices: {})
+    return AnnotationImporter(None, template=TEMPLATE, user_id="user-id", username="tester", batch_size=2)
+
+
+def test_detect_format_by_extension_and_override():
+    assert detect_format("segments.csv") == "csv"
+    assert detect_format("segments.ndjson") == "jsonl"
+    assert detect_format("segments.txt", "JSONL") == "jsonl"
+    with pytest.raises(ValueError):
+        detect_format("segments.xlsx")
+
+
+def test_normalize_row_resolves_phase_by_name_and_rejects_unknown():
+    index = build_phase_index(TEMPLATE)
+    segment = normalize_row(
+        {"fileId": "a.h5", "trialIndex": "0", "phaseName": "阶段二", "startIndex": "10", "endIndex": "20"},
+        index,
+    )
+    assert segment["phaseId"] == "p2"
+    assert segment["color"] == "#00ff00"
+    assert segment["startTime"] is None
+
+    with pytest.raises(ValueError):
+        normalize_row({"fileId": "a.h5", "trialIndex": 0, "phaseId": "p9", "startIndex": 0, "endIndex": 1}, index)
+    with pytest.raises(ValueError):
+        normalize_row({"fileId": "a.h5", "trialIndex": 0, "phaseId": "p1", "startIndex": 5, "endIndex": 1}, index)
+
+
+def test_iter_rows_reports_invalid_json_lines(tmp_path):
+    path = tmp_path / "segments.jsonl"
+    path.write_text(json.dumps({"fileId": "a.h5"}) + "\n\nnot-json\n", encoding="utf-8")
+
+    rows = list(iter_rows(str(path), "jsonl"))
+    assert rows[0] == (1, {"fileId": "a.h5"})
+    assert rows[1][0] == 3
+    assert "__error__" in rows[1][1]
+
+
+async def test_importer_batches_writes_and_validates_lengths(importer):
+    rows = [
+        (1, {"fileId": "a.h5", "trialIndex": 0, "phaseId": "p1", "startIndex": 0, "endIndex": 100}),
+        (2, {"fileId": "a.h5", "trialIndex": 0, "phaseId": "p2", "startIndex": 100, "endIndex": 200}),
+        (3, {"fileId": "a.h5", "trialIndex": 1, "phaseId": "p1", "startIndex": 0, "endIndex": 5000}),
+        (4, {"fileId": "a.h5", "trialIndex": 1, "phaseId": "p1", "startIndex": 0, "endIndex": 999}),
+        (5, {"fileId": "a.h5", "trialIndex": 7, "phaseId": "p1", "startIndex": 0, "endIndex": 10}),
+    ]
+    job = AnnotationImportJob(file_name="a.jsonl", template_id="template-1", user_id="user-id", mode="replace")
+
+    await importer.run(iter(rows), job)
+
+    assert job.processed_rows == 5
+    assert job.inserted_segments == 3
+    assert job.skipped_rows == 2
+    assert [error["line"] for error in job.errors] == [3, 5]
+    assert job.version_count == 2
+    assert importer.annotation_repo.bulk_calls == [2, 1]
+    assert importer.version_repo.counts == {"version-a.h5-0": 2, "version-a.h5-1": 1}
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+import httpx
+
+from app.config import settings
+from app.main import app
+from app.middleware.auth import AuthMiddleware, TokenCache
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+def test_token_cache_respects_exp_and_lru_bound():
+    cache = TokenCache(maxsize=2)
+    now = time.time()
+
+    cache.set("expired", {"exp": now - 1})
+    assert cache.get("expired") is None
+
+    cache.set("a", {"exp": now + 60})
+    cache.set("b", {"exp": now + 60})
+    assert cache.get("a") is not None
+    cache.set("c", {"exp": now + 60})
+
+    # b 最久未使用，被淘汰
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert len(cache) == 2
+
+
+def test_exclude_pattern_matches_exact_paths_and_docs_prefix():
+    middleware = AuthMiddleware(app=None, token_cache_size=0)
+
+    assert middleware._exclude_pattern.match("/health")
+    assert middleware._exclude_pattern.match("/docs/oauth2-redirect")
+    assert not middleware._exclude_pattern.match("/healthz")
+    assert not middleware._exclude_pattern.match("/api/files")
+
+
+async def test_missing_or_invalid_token_is_rejected():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        response = await client.get("/api/templates")
+        assert response.status_code == 401
+
+        response = await client.get("/api/templates", headers={"Authorization": "Bearer not-a-token"})
+        assert response.status_code == 401
+
+        response = await client.get("/health")
+        assert response.status_code == 200
+
+
+def test_permissions_are_encoded_as_versioned_bitmask():
+    from datetime import datetime, timedelta
+
+    from jose import jwt
+
+    from app.config.permissions import PERMISSION_ENCODING_VERSION, ROLE_PRESETS
+    from app.services.auth_service import AuthService
+    from app.utils.permissions import decode_permissions, encode_permissions
+
+    service = AuthService(secret_key=settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    token = service.create_access_token("u", "tester", "r", "annotator", ROLE_PRESETS["annotator"])
+
+    claims = jwt.get_unverified_claims(token)
+    assert "permissions" not in claims
+    assert claims["pv"] == PERMISSION_ENCODING_VERSION
+    assert decode_permissions(claims["perm"]) == ROLE_PRESETS["annotator"]
+
+    payload = service.verify_token(token)
+    assert payload["permission_mask"] == encode_permissions(ROLE_PRESETS["annotator"])
+
+    legacy = jwt.encode(
+        {
+            "sub": "u",
+            "username": "tester",
+            "role_id": "r",
+            "role_name": "user",
+            "permissions": ["files.view", "unknown.permission"],
+            "exp": datetime.utcnow() + timedelta(minutes=5),
+        },
+        settings.JWT_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+    assert service.verify_token(legacy)["permissions"] == ["files.view"]
+
+    stale = jwt.encode(
+        {**claims, "pv": PERMISSION_ENCODING_VERSION + 1},
+        settings.JWT_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+    assert service.verify_token(stale) is None
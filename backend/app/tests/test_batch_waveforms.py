@@ -0,0 +1,131 @@
+import h5py
+import httpx
+import numpy as np
+import orjson
+import pytest
+
+from app.api import files as files_module
+from app.config import settings
+from app.db import get_database
+from app.main import app
+from app.services import h5_service
+from app.services.admission_service import admission_controller
+from app.services.auth_service import AuthService
+from app.utils.waveform_encoding import decode_series
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+auth_service = AuthService(
+    secret_key=settings.JWT_SECRET_KEY,
+    algorithm=settings.JWT_ALGORITHM,
+    expiration_days=settings.JWT_EXPIRATION_DAYS,
+)
+
+HEADERS = {
+    "Authorization": "Bearer " + auth_service.create_access_token(
+        user_id="user-id",
+        username="tester",
+        role_id="role-annotator",
+        role_name="annotator",
+        permissions=[],
+    )
+}
+
+
+class StubMetadataRepository:
+    def __init__(self, db):
+        pass
+
+    async def max_data_points(self, file_id):
+        return 20000
+
+
+@pytest.fixture(autouse=True)
+def stub_dependencies(monkeypatch, tmp_path):
+    rng = np.random.default_rng(0)
+    with h5py.File(tmp_path / "sample.h5", "w") as f:
+        for index in range(4):
+            group = f.create_group(f"trial_{index}")
+            group["sensor"] = np.sin(np.linspace(0, 20 + index, 20000)) + 0.05 * rng.standard_normal(20000)
+            group["timestamps"] = (np.arange(20000) // 100) * 100.0
+
+    monkeypatch.setattr(files_module, "TrialMetadataRepository", StubMetadataRepository)
+    monkeypatch.setattr(h5_service, "data_root", tmp_path)
+
+    async def _get_db():
+        return None
+
+    app.dependency_overrides[get_database] = _get_db
+    yield
+    app.dependency_overrides.pop(get_database, None)
+
+
+async def _post(body: dict) -> tuple[httpx.Response, dict]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        response = await client.post("/api/files/sample.h5/waveforms", json=body, headers=HEADERS)
+    lines = [orjson.loads(line) for line in response.content.splitlines()] if response.status_code == 200 else []
+    return response, {line["trialIndex"]: line for line in lines}
+
+
+async def test_batch_returns_each_trial_downsampled(monkeypatch, tmp_path):
+    def per_trial_read(*args):
+        raise AssertionError("batch must read trials through one file handle")
+
+    monkeypatch.setattr(h5_service, "_read_trial_data", per_trial_read)
+    response, lines = await _post({"trialIndices": [0, 2, 3, 2], "start": 5.0, "end": 15.0, "maxPoints": 500})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert sorted(lines) == [0, 2, 3]
+
+    monkeypatch.delattr(h5_service, "_read_trial_data")
+    for index, line in lines.items():
+        single = await h5_service.get_waveform_window(
+            str(tmp_path / "sample.h5"), index, start=5.0, end=15.0, max_points=500
+        )
+        assert line["window"] == single["window"]
+        np.testing.assert_allclose(line["raw"]["values"], single["raw"]["values"])
+        np.testing.assert_array_equal(line["filtered"]["indices"], single["filtered"]["indices"])
+
+
+async def test_batch_reports_bad_trials_and_encodes_values():
+    response, lines = await _post({"trialIndices": [1, 9], "maxPoints": 300, "precision": "int16"})
+
+    assert response.status_code == 200
+    assert "out of range" in lines[9]["error"]
+    values = decode_series(lines[1]["raw"]["values"])
+    assert len(values) == 300
+
+
+async def test_batch_validates_request():
+    response, _ = await _post({"trialIndices": []})
+    assert response.status_code == 422
+
+    response, _ = await _post({"trialIndices": [0], "start": 5.0, "end": 1.0})
+    assert response.status_code == 400
+
+
+async def test_batch_is_admitted_before_streaming(monkeypatch):
+    lane = admission_controller.lanes["waveform"]
+    response, _ = await _post({"trialIndices": [0, 1], "maxPoints": 300})
+
+    # 流结束后准入额度已归还
+    assert response.status_code == 200
+    assert lane.active == 0
+
+    # 通道已满时直接返回 503，而不是在 200 响应的末行报告繁忙
+    monkeypatch.setattr(lane, "active", lane.max_concurrency)
+    monkeypatch.setattr(lane, "max_queue", 0)
+    response, _ = await _post({"trialIndices": [0, 1], "maxPoints": 300})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(admission_controller.retry_after)
@@ -0,0 +1,119 @@
+import datetime
+import json
+
+import httpx
+import numpy as np
+import orjson
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from app.middleware.compression import CompressionMiddleware, negotiate_encoding
+from app.utils.http_cache import cache_headers, etag_matches, make_etag, not_modified
+from app.utils.responses import ORJSONResponse
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+def _build_app() -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    etag = make_etag("large")
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/large")
+    async def large(request: Request):
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return ORJSONResponse({"values": np.linspace(0, 1, 2000)}, headers=cache_headers(etag))
+
+    @app.get("/stream")
+    async def stream():
+        async def lines():
+            for index in range(50):
+                yield orjson.dumps({"trialIndex": index, "pad": "x" * 100}) + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+def test_orjson_response_serializes_numpy_and_bson_types():
+    created = datetime.datetime(2024, 1, 2, 3, 4, 5)
+    body = ORJSONResponse({
+        "values": np.array([0.5, 1.5]),
+        "ints": np.arange(3, dtype=np.int16),
+        "strided": np.arange(6.0)[::2],
+        "count": np.int64(7),
+        "id": ObjectId("65a000000000000000000000"),
+        "createdAt": created,
+    }).body
+
+    assert json.loads(body) == {
+        "values": [0.5, 1.5],
+        "ints": [0, 1, 2],
+        "strided": [0.0, 2.0, 4.0],
+        "count": 7,
+        "id": "65a000000000000000000000",
+        "createdAt": created.isoformat(),
+    }
+
+
+def test_negotiate_encoding_honours_q_values():
+    assert negotiate_encoding("gzip, deflate, br", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("br;q=0, *;q=0.1", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("identity", ["br", "gzip"]) is None
+    assert negotiate_encoding("", ["br", "gzip"]) is None
+
+
+async def test_large_responses_are_compressed_and_revalidate():
+    transport = httpx.ASGITransport(app=_build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        small = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers
+
+        plain = await client.get("/large", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+
+        gzipped = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+        assert gzipped.headers["content-encoding"] == "gzip"
+        assert gzipped.headers["vary"] == "Accept-Encoding"
+        assert int(gzipped.headers["content-length"]) < len(plain.content)
+        assert gzipped.content == plain.content
+
+        brotli_response = await client.get("/large", headers={"Accept-Encoding": "gzip, br"})
+        assert brotli_response.headers["content-encoding"] == "br"
+        assert brotli_response.content == plain.content
+
+        # 压缩表示携带弱ETag，回传后仍命中304
+        etag = gzipped.headers["etag"]
+        assert etag.startswith("W/")
+        revalidated = await client.get(
+            "/large", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+        )
+        assert revalidated.status_code == 304
+
+
+async def test_streaming_responses_are_compressed_incrementally():
+    transport = httpx.ASGITransport(app=_build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        response = await client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    lines = response.content.splitlines()
+    assert len(lines) == 50
+    assert orjson.loads(lines[-1])["trialIndex"] == 49
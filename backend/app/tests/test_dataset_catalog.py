@@ -0,0 +1,120 @@
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from app.services import dataset_catalog_service as catalog_module
+from app.services.cache_service import MemoryCacheBackend
+from app.services.dataset_catalog_service import DatasetCatalog, walk_h5_files
+from app.services.h5_service import H5Service
+from app.services.single_flight import SingleFlight
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+class StubCatalogRepository:
+    storage: dict = {}
+
+    def __init__(self, db):
+        pass
+
+    async def find_all(self):
+        return [dict(entry) for entry in self.storage.values()]
+
+    async def apply_changes(self, upserts, removed):
+        for entry in upserts:
+            self.storage[entry["fileId"]] = dict(entry)
+        for file_id in removed:
+            self.storage.pop(file_id, None)
+
+
+def _write_h5(path, trials):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with h5py.File(path, "w") as f:
+        for index in range(trials):
+            f.create_group(f"trial_{index}")["sensor"] = np.zeros(10)
+
+
+@pytest.fixture
+def h5(monkeypatch, tmp_path):
+    StubCatalogRepository.storage = {}
+    monkeypatch.setattr(catalog_module, "DatasetCatalogRepository", StubCatalogRepository)
+
+    service = H5Service(cache=MemoryCacheBackend(max_bytes=1024 * 1024), single_flight=SingleFlight())
+    service.data_root = tmp_path
+    counted = []
+    original = service.get_trial_count
+
+    async def get_trial_count(file_path):
+        counted.append(os.path.relpath(file_path, tmp_path))
+        return await original(file_path)
+
+    service.get_trial_count = get_trial_count
+    service.counted = counted
+    return service
+
+
+def test_walk_finds_nested_h5_files(tmp_path):
+    _write_h5(tmp_path / "a.h5", 1)
+    _write_h5(tmp_path / "sub" / "deep" / "b.h5", 1)
+    (tmp_path / "notes.txt").write_text("x")
+
+    assert sorted(file_id for file_id, _ in walk_h5_files(tmp_path)) == ["a.h5", os.path.join("sub", "deep", "b.h5")]
+
+
+async def test_first_listing_scans_and_persists(h5, tmp_path):
+    _write_h5(tmp_path / "a.h5", 2)
+    _write_h5(tmp_path / "sub" / "b.h5", 3)
+    catalog = DatasetCatalog(h5=h5, rescan_interval=0, stat_workers=4)
+
+    files = await catalog.list_files(None)
+
+    assert [(f["fileId"], f["trialCount"]) for f in files] == [("a.h5", 2), (os.path.join("sub", "b.h5"), 3)]
+    assert files[0]["fullPath"] == str(tmp_path / "a.h5")
+    assert set(StubCatalogRepository.storage) == {"a.h5", os.path.join("sub", "b.h5")}
+    assert catalog.last_scan["added"] == 2
+
+
+async def test_rescan_only_recounts_changed_files(h5, tmp_path):
+    _write_h5(tmp_path / "keep.h5", 2)
+    _write_h5(tmp_path / "replace.h5", 2)
+    _write_h5(tmp_path / "remove.h5", 1)
+    catalog = DatasetCatalog(h5=h5, rescan_interval=0)
+    await catalog.rescan(None)
+    h5.counted.clear()
+
+    _write_h5(tmp_path / "replace.h5", 4)
+    stat = os.stat(tmp_path / "replace.h5")
+    os.utime(tmp_path / "replace.h5", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    (tmp_path / "remove.h5").unlink()
+    _write_h5(tmp_path / "new.h5", 1)
+
+    summary = await catalog.rescan(None)
+
+    assert (summary["added"], summary["modified"], summary["removed"]) == (1, 1, 1)
+    assert sorted(h5.counted) == ["new.h5", "replace.h5"]
+    counts = {f["fileId"]: f["trialCount"] for f in await catalog.list_files(None)}
+    assert counts == {"keep.h5": 2, "new.h5": 1, "replace.h5": 4}
+    assert "remove.h5" not in StubCatalogRepository.storage
+
+
+async def test_new_instance_serves_persisted_catalog_without_scanning(h5, tmp_path):
+    _write_h5(tmp_path / "a.h5", 2)
+    await DatasetCatalog(h5=h5, rescan_interval=0).rescan(None)
+    h5.counted.clear()
+    (tmp_path / "a.h5").unlink()
+
+    files = await DatasetCatalog(h5=h5, rescan_interval=0).list_files(None)
+
+    # 持久化目录直接返回，变化由后台重扫发现
+    assert [f["fileId"] for f in files] == ["a.h5"]
+    assert h5.counted == []
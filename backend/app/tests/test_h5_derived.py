@@ -0,0 +1,120 @@
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from app.services.cache_service import MemoryCacheBackend
+from app.services.h5_derived import DERIVED_GROUP, build_pyramid
+from app.services.h5_service import DERIVED_PRUNE_INTERVAL_SECONDS, H5Service
+from app.services.single_flight import SingleFlight
+
+
+@pytest.fixture
+def h5_file(tmp_path):
+    path = tmp_path / "sample.h5"
+    rng = np.random.default_rng(0)
+    with h5py.File(path, "w") as f:
+        for index in range(2):
+            group = f.create_group(f"trial_{index}")
+            group["sensor"] = np.sin(np.linspace(0, 40, 20000)) + 0.05 * rng.standard_normal(20000)
+            group["timestamps"] = (np.arange(20000) // 100) * 100.0
+    return str(path)
+
+
+def _service(tmp_path, dataset_write, source_write=False):
+    svc = H5Service(cache=MemoryCacheBackend(max_bytes=1024 * 1024), single_flight=SingleFlight())
+    svc.data_root = tmp_path
+    svc.dataset_write = dataset_write
+    svc.source_write = source_write
+    svc.derived_cache_dir = tmp_path / "derived-cache"
+    return svc
+
+
+def test_pyramid_levels_envelope_the_signal():
+    values = np.sin(np.linspace(0, 40, 100000))
+    levels = build_pyramid(values, factor=8, min_points=100)
+
+    assert [len(level) for level in levels] == [12500, 1562, 195]
+    assert np.all(levels[0][:, 0] <= levels[0][:, 1])
+    np.testing.assert_allclose(levels[0][0], [values[:8].min(), values[:8].max()], rtol=1e-6)
+
+
+def test_write_back_leaves_source_file_untouched(tmp_path, h5_file):
+    svc = _service(tmp_path, dataset_write=True)
+    fingerprint = svc.file_fingerprint(h5_file)
+    stamp = svc.metadata_stamp(h5_file)
+    computed = svc.preprocess_waveform(h5_file, 0)
+
+    # 源文件指纹不变，其他Trial的缓存与元数据不会因写回而失效
+    assert svc.file_fingerprint(h5_file) == fingerprint
+    assert svc.metadata_stamp(h5_file) == stamp
+    sidecars = list((tmp_path / "derived-cache").glob("*.h5"))
+    assert len(sidecars) == 1
+    with h5py.File(sidecars[0], "r") as f:
+        assert f[DERIVED_GROUP].attrs["sourceLength"] == 20000
+
+    reader = _service(tmp_path, dataset_write=False)
+    reader._lowpass_filter = None
+    restored = reader.preprocess_waveform(h5_file, 0)
+    np.testing.assert_array_equal(restored["filtered"]["values"], computed["filtered"]["values"])
+
+
+def test_offline_write_stores_compressed_derived_group(tmp_path, h5_file):
+    svc = _service(tmp_path, dataset_write=True, source_write=True)
+    computed = svc.preprocess_waveform(h5_file, 1)
+
+    with h5py.File(h5_file, "r") as f:
+        assert "trial_0/derived" not in f
+        group = f["trial_1"][DERIVED_GROUP]
+        assert group.attrs["processingFingerprint"] == svc.processing_fingerprint()
+        assert group["filtered"].compression == "gzip"
+        assert group["filtered"].chunks is not None
+        assert "level_0" in group["pyramid"]
+        assert svc.load_trial_count(h5_file) == 2
+
+    # 再次读取直接使用 derived/，不再滤波
+    reader = _service(tmp_path, dataset_write=False)
+    reader._lowpass_filter = None
+    restored = reader.preprocess_waveform(h5_file, 1)
+    np.testing.assert_array_equal(restored["filtered"]["values"], computed["filtered"]["values"])
+    np.testing.assert_array_equal(restored["raw"]["timestamps"], computed["raw"]["timestamps"])
+    np.testing.assert_array_equal(restored["keypoints"], computed["keypoints"])
+
+
+def test_processing_change_rewrites_and_disabled_mode_never_writes(tmp_path, h5_file):
+    _service(tmp_path, dataset_write=False).preprocess_waveform(h5_file, 0)
+    with h5py.File(h5_file, "r") as f:
+        assert DERIVED_GROUP not in f["trial_0"]
+
+    _service(tmp_path, dataset_write=True, source_write=True).preprocess_waveform(h5_file, 0)
+    changed = _service(tmp_path, dataset_write=True, source_write=True)
+    changed.lowpass_cutoff = 20.0
+    changed.preprocess_waveform(h5_file, 0)
+
+    with h5py.File(h5_file, "r") as f:
+        assert f["trial_0"][DERIVED_GROUP].attrs["processingFingerprint"] == changed.processing_fingerprint()
+
+
+def test_sidecars_are_replaced_and_capped(tmp_path, h5_file):
+    svc = _service(tmp_path, dataset_write=True)
+    cache_dir = tmp_path / "derived-cache"
+    svc.preprocess_waveform(h5_file, 0)
+    svc.preprocess_waveform(h5_file, 1)
+    first = {path.name for path in cache_dir.glob("*.h5")}
+    assert len(first) == 2
+
+    # 源文件被替换后，重写的Trial删除旧指纹的文件，另一Trial的旧文件留给容量清理
+    stat = os.stat(h5_file)
+    os.utime(h5_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    svc.preprocess_waveform(h5_file, 0)
+    names = {path.name for path in cache_dir.glob("*.h5")}
+    assert len(names) == 2 and len(names & first) == 1
+    assert not any(name.endswith("-trial_0.h5") for name in names & first)
+
+    # 超出容量上限时从最旧的文件开始删除，保留刚写入的文件
+    svc.derived_max_bytes = max(path.stat().st_size for path in cache_dir.glob("*.h5")) * 3 // 2
+    svc._last_derived_prune = -DERIVED_PRUNE_INTERVAL_SECONDS
+    svc.preprocess_waveform(h5_file, 1)
+    remaining = list(cache_dir.glob("*.h5"))
+    assert [path.name.endswith("-trial_1.h5") for path in remaining] == [True]
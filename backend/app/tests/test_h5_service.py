@@ -0,0 +1,250 @@
+import asyncio
+import os
+import threading
+
+import h5py
+import numpy as np
+import pytest
+
+from app.services import cache_service
+from app.services.cache_service import MemoryCacheBackend, decode_value, encode_value
+from app.services.h5_service import THUMBNAIL_POINTS, H5Service, compact_time_axis
+from app.services.single_flight import SingleFlight
+from app.utils import downsampling
+from app.utils.downsampling import lttb_indices
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+def _write_dataset(path, trials=2, samples=5000, chunk=100):
+    """生成与采集设备一致的H5文件：时间戳按 0.1s 分块递增"""
+
+    rng = np.random.default_rng(0)
+    with h5py.File(path, "w") as f:
+        for index in range(trials):
+            group = f.create_group(f"trial_{index}")
+            t = np.arange(samples) / 1000.0
+            group["sensor"] = np.sin(2 * np.pi * 2 * t) + 0.05 * rng.standard_normal(samples)
+            group["timestamps"] = (np.arange(samples) // chunk) * 100.0
+
+
+@pytest.fixture
+def h5_file(tmp_path):
+    path = tmp_path / "sample.h5"
+    _write_dataset(path)
+    return str(path)
+
+
+@pytest.fixture
+def service(tmp_path):
+    svc = H5Service(cache=MemoryCacheBackend(max_bytes=64 * 1024 * 1024), single_flight=SingleFlight())
+    svc.data_root = tmp_path
+    return svc
+
+
+def test_cache_codec_roundtrips_nested_arrays():
+    value = {
+        "raw": np.linspace(0, 1, 2000),
+        "keypoints": np.array([1, 5, 9], dtype=np.int64),
+        "meta": {"sampleRate": 1000.0, "tags": ["a", None]},
+    }
+    encoded = encode_value(value)
+    decoded = decode_value(encoded)
+
+    assert len(encoded) < value["raw"].nbytes
+    np.testing.assert_array_equal(decoded["raw"], value["raw"])
+    assert decoded["keypoints"].dtype == np.int64
+    assert decoded["meta"] == {"sampleRate": 1000.0, "tags": ["a", None]}
+
+
+async def test_memory_backend_evicts_by_size():
+    backend = MemoryCacheBackend(max_bytes=3000)
+    await backend.set("a", {"x": np.zeros(100)})
+    await backend.set("b", {"x": np.ones(100)})
+    assert await backend.get("a") is not None
+
+    await backend.set("c", {"x": np.arange(200.0)})
+    assert backend.current_bytes <= 3000
+    assert await backend.get("c") is not None
+
+
+async def test_memory_backend_keeps_objects_without_encoding(monkeypatch):
+    def encode(value):
+        raise AssertionError("memory backend must not encode values")
+
+    monkeypatch.setattr(cache_service, "encode_value", encode)
+    backend = MemoryCacheBackend(max_bytes=64 * 1024 * 1024)
+    raw = np.linspace(0, 1, 1_000_000)
+    await backend.set("a", {"raw": raw, "meta": {"n": 1}})
+
+    cached = await backend.get("a")
+    assert np.shares_memory(cached["raw"], raw)
+    assert not cached["raw"].flags.writeable
+    assert backend.current_bytes >= raw.nbytes
+    # 调用方修改返回的容器不影响缓存内容
+    cached["meta"]["n"] = 2
+    assert (await backend.get("a"))["meta"] == {"n": 1}
+
+
+async def test_shared_backend_codec_runs_off_the_event_loop(monkeypatch):
+    class DictBackend(cache_service.CacheBackend):
+        def __init__(self):
+            super().__init__()
+            self.store = {}
+
+        async def get_bytes(self, key):
+            return self.store.get(key)
+
+        async def set_bytes(self, key, data, ttl):
+            self.store[key] = data
+
+    threads = []
+    for name in ("encode_value", "decode_value"):
+        original = getattr(cache_service, name)
+
+        def record(value, original=original):
+            threads.append(threading.current_thread() is threading.main_thread())
+            return original(value)
+
+        monkeypatch.setattr(cache_service, name, record)
+
+    backend = DictBackend()
+    await backend.set("small", {"x": np.zeros(10)})
+    await backend.get("small")
+    await backend.set("large", {"x": np.random.default_rng(0).standard_normal(200_000)})
+    np.testing.assert_array_equal((await backend.get("large"))["x"].shape, (200_000,))
+
+    assert threads == [True, True, False, False]
+
+
+async def test_waveform_is_cached_and_invalidated_on_mtime_change(service, h5_file):
+    first = await service.get_waveform(h5_file, 0)
+    expected = service.preprocess_waveform(h5_file, 0)
+    np.testing.assert_array_equal(first["filtered"]["values"], expected["filtered"]["values"])
+    assert len(first["raw"]["values"]) == 5000
+
+    calls = []
+    original = service._waveform_arrays
+    service._waveform_arrays = lambda *args: calls.append(args) or original(*args)
+
+    await service.get_waveform(h5_file, 0)
+    assert calls == []
+
+    stat = os.stat(h5_file)
+    os.utime(h5_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    await service.get_waveform(h5_file, 0)
+    assert len(calls) == 1
+
+
+async def test_trial_count_is_cached(service, h5_file):
+    assert await service.get_trial_count(h5_file) == 2
+    assert await service.get_trial_count(h5_file + ".missing") == 0
+
+
+async def test_concurrent_waveform_requests_are_coalesced(service, h5_file):
+    calls = []
+    original = service._waveform_arrays
+    service._waveform_arrays = lambda *args: calls.append(args) or original(*args)
+
+    results = await asyncio.gather(*(service.get_waveform(h5_file, 1) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert all(result["raw"]["values"] is results[0]["raw"]["values"] for result in results)
+    assert service.single_flight.coalesced >= 4
+
+
+async def test_compact_timestamps_expand_to_full_axis(service, h5_file):
+    full = await service.get_waveform(h5_file, 0)
+    compact = await service.get_waveform(h5_file, 0, timestamps="compact")
+
+    axis = compact["timeAxis"]
+    assert "timestamps" not in compact["raw"]
+    assert axis["type"] == "breakpoints"
+    assert axis["count"] == 5000
+    # 每 100 个采样一个时间戳分块，断点数远小于采样数
+    assert len(axis["indices"]) == 51
+    expanded = np.interp(np.arange(axis["count"]), axis["indices"], axis["seconds"])
+    np.testing.assert_array_equal(expanded, full["raw"]["timestamps"])
+
+
+def test_compact_time_axis_collapses_uniform_sampling():
+    axis = compact_time_axis({"indices": np.array([0, 10, 999]), "seconds": np.array([0.0, 0.01, 0.999])}, 1000)
+    assert axis == {"type": "uniform", "count": 1000, "t0": 0.0, "sampleRate": pytest.approx(1000.0)}
+
+    uneven = compact_time_axis({"indices": np.array([0, 10, 999]), "seconds": np.array([0.0, 0.02, 0.999])}, 1000)
+    assert uneven["type"] == "breakpoints"
+
+
+async def test_waveform_window_downsamples_to_max_points(service, h5_file):
+    full = await service.get_waveform(h5_file, 0)
+    window = await service.get_waveform_window(h5_file, 0, start=1.0, end=4.0, max_points=300)
+
+    meta = window["window"]
+    assert meta["downsampled"] is True
+    assert meta["windowPoints"] > 300
+    for series in ("raw", "filtered"):
+        indices = window[series]["indices"]
+        assert len(indices) == 300
+        assert indices[0] == meta["startIndex"] and indices[-1] == meta["endIndex"] - 1
+        np.testing.assert_array_equal(window[series]["values"], full[series]["values"][indices])
+        np.testing.assert_array_equal(window[series]["timestamps"], full[series]["timestamps"][indices])
+    assert window["raw"]["timestamps"][0] <= 1.0 and window["raw"]["timestamps"][-1] >= 4.0
+    assert all(meta["startIndex"] <= kp < meta["endIndex"] for kp in window["keypoints"])
+
+
+async def test_narrow_window_returns_raw_samples(service, h5_file):
+    full = await service.get_waveform(h5_file, 0)
+    window = await service.get_waveform_window(h5_file, 0, start=2.0, end=2.1, max_points=300)
+
+    indices = window["raw"]["indices"]
+    assert window["window"]["downsampled"] is False
+    np.testing.assert_array_equal(indices, np.arange(indices[0], indices[-1] + 1))
+    np.testing.assert_array_equal(window["filtered"]["values"], full["filtered"]["values"][indices])
+
+
+async def test_m4_window_keeps_column_extremes(service, h5_file):
+    full = await service.get_waveform(h5_file, 0)
+    window = await service.get_waveform_window(h5_file, 0, max_points=400, method="m4")
+
+    values = window["raw"]["values"]
+    assert len(values) <= 400
+    assert values.max() == full["raw"]["values"].max()
+    assert values.min() == full["raw"]["values"].min()
+
+
+def test_small_bucket_lttb_matches_vectorized_path(monkeypatch):
+    rng = np.random.default_rng(1)
+    x = np.cumsum(rng.random(6000))
+    y = np.round(rng.standard_normal(6000), 1)
+    small = lttb_indices(x, y, 500)
+    monkeypatch.setattr(downsampling, "SMALL_BUCKET_SIZE", 0)
+
+    np.testing.assert_array_equal(small, lttb_indices(x, y, 500))
+
+
+async def test_thumbnail_tracks_full_preprocessing(tmp_path, service):
+    path = tmp_path / "long.h5"
+    _write_dataset(path, trials=1, samples=60_000)
+    metadata = service.load_trial_metadata(str(path), 0)
+    full = await service.get_waveform(str(path), 0)
+
+    thumbnail = metadata["thumbnail"]
+    assert len(thumbnail["timestamps"]) == THUMBNAIL_POINTS
+    assert metadata["dataPoints"] == 60_000
+    # 缩略图点取自原始采样，min/max 粗筛后仍保留波形幅度
+    raw = np.asarray(full["raw"]["values"], dtype=np.float32)
+    assert np.isin(thumbnail["raw"], raw).all()
+    assert np.ptp(thumbnail["raw"]) > 0.95 * np.ptp(raw)
+    # 降采样后滤波与全采样率滤波一致 (首末点受边界延拓影响除外)
+    positions = np.searchsorted(full["raw"]["timestamps"], thumbnail["timestamps"].astype(np.float64) - 1e-4)
+    filtered = np.asarray(full["filtered"]["values"])
+    deviation = np.abs(thumbnail["filtered"][1:-1] - filtered[positions[1:-1]])
+    assert deviation.max() < 0.01 * np.ptp(filtered)
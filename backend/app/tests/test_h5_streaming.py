@@ -0,0 +1,95 @@
+import h5py
+import numpy as np
+import pytest
+
+from app.services.cache_service import MemoryCacheBackend
+from app.services.h5_derived import DERIVED_GROUP, PYRAMID_GROUPS, build_pyramid
+from app.services.h5_service import H5Service
+from app.services.h5_streaming import histogram_quantile
+from app.services.single_flight import SingleFlight
+
+SAMPLES = 60000
+
+
+@pytest.fixture
+def h5_file(tmp_path):
+    path = tmp_path / "long.h5"
+    rng = np.random.default_rng(1)
+    t = np.arange(SAMPLES) / 1000.0
+    with h5py.File(path, "w") as f:
+        group = f.create_group("trial_0")
+        # 叠加阶跃，保证滤波后存在斜率突变的拐点
+        steps = np.repeat(rng.choice([-1.0, 0.0, 1.0], SAMPLES // 500), 500)
+        group["sensor"] = np.sin(2 * np.pi * 3 * t) + steps + 0.1 * rng.standard_normal(SAMPLES)
+        group["timestamps"] = (np.arange(SAMPLES) // 100) * 100.0
+    return str(path)
+
+
+def _service(tmp_path, streaming):
+    svc = H5Service(cache=MemoryCacheBackend(max_bytes=1024 * 1024), single_flight=SingleFlight())
+    svc.data_root = tmp_path
+    svc.dataset_write = False
+    svc.derived_cache_dir = tmp_path / "derived-cache"
+    svc.chunk_samples = 4099
+    svc.streaming_min_samples = 1000 if streaming else SAMPLES + 1
+    return svc
+
+
+def test_histogram_quantile_matches_numpy_within_a_bin():
+    values = np.random.default_rng(0).standard_normal(100000)
+    counts, _ = np.histogram(values, bins=1 << 16, range=(values.min(), values.max()))
+    width = (values.max() - values.min()) / (1 << 16)
+
+    for q in (0.5, 0.75):
+        estimate = histogram_quantile(counts, values.min(), values.max(), q)
+        assert abs(estimate - np.quantile(values, q)) <= 2 * width
+
+
+def test_chunked_preprocessing_matches_in_memory_result(tmp_path, h5_file):
+    expected = _service(tmp_path, streaming=False)._prepare_waveform(h5_file, 0)
+    streamed = _service(tmp_path, streaming=True)._prepare_waveform(h5_file, 0)
+
+    assert streamed["sample_rate"] == pytest.approx(expected["sample_rate"])
+    assert streamed["duration"] == pytest.approx(expected["duration"])
+    np.testing.assert_array_equal(streamed["time_axis"]["indices"], expected["time_axis"]["indices"])
+    np.testing.assert_allclose(streamed["time_axis"]["seconds"], expected["time_axis"]["seconds"], rtol=0, atol=1e-12)
+    np.testing.assert_allclose(streamed["filtered_values"], expected["filtered_values"], rtol=0, atol=1e-9)
+
+    # 阈值由直方图估计，拐点集合与整段计算基本一致
+    assert len(expected["keypoints"]) > 0
+    overlap = np.intersect1d(streamed["keypoints"], expected["keypoints"]).size
+    assert overlap >= 0.98 * len(expected["keypoints"])
+    assert len(streamed["keypoints"]) <= 1.02 * len(expected["keypoints"])
+
+    sidecars = list((tmp_path / "derived-cache").glob("*.h5"))
+    assert len(sidecars) == 1
+    with h5py.File(sidecars[0], "r") as f:
+        for series, name in PYRAMID_GROUPS.items():
+            reference = build_pyramid(expected[f"{series}_values"])
+            assert len(f[DERIVED_GROUP][name]) == len(reference)
+            for level, envelope in enumerate(reference):
+                np.testing.assert_allclose(f[DERIVED_GROUP][name][f"level_{level}"][:], envelope, atol=1e-6)
+
+
+def test_long_trial_metadata_reads_strided_thumbnail(tmp_path, h5_file):
+    svc = _service(tmp_path, streaming=True)
+    svc.dataset_write = True
+
+    metadata = svc.load_trial_metadata(h5_file, 0)
+
+    assert metadata["dataPoints"] == SAMPLES
+    assert len(metadata["thumbnail"]["filtered"]) == 400
+    assert metadata["thumbnail"]["raw"].dtype == np.float32
+    # 在线写回只写单Trial文件，源文件不变
+    assert len(list((tmp_path / "derived-cache").glob("*.h5"))) == 1
+    with h5py.File(h5_file, "r") as f:
+        assert DERIVED_GROUP not in f["trial_0"]
+
+    # 离线脚本把结果拷入源文件，临时输出随即删除
+    offline = _service(tmp_path, streaming=True)
+    offline.source_write = True
+    offline.derived_cache_dir = tmp_path / "offline-cache"
+    offline.load_trial_metadata(h5_file, 0)
+    assert list((tmp_path / "offline-cache").glob("*.h5")) == []
+    with h5py.File(h5_file, "r") as f:
+        assert f["trial_0"][DERIVED_GROUP].attrs["sourceLength"] == SAMPLES
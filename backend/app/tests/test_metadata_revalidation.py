@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from app.services import h5_service
+from app.services import metadata_revalidation_service as revalidation_module
+from app.services.metadata_revalidation_service import MetadataRevalidator
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+STAMPS = {
+    "unchanged.h5": {"sourceMtimeNs": 1, "sourceSize": 10, "processingFingerprint": "p1"},
+    "replaced.h5": {"sourceMtimeNs": 2, "sourceSize": 20, "processingFingerprint": "p1"},
+}
+
+
+class StubMetadataRepository:
+    refreshed: list = []
+    stale: dict = {}
+    features: list = []
+
+    def __init__(self, db):
+        pass
+
+    async def find_stale_indices(self, file_id, stamp, start=0, end=None):
+        return self.stale.get(file_id, [])
+
+    async def delete_beyond(self, file_id, trial_count):
+        return len([idx for idx in self.stale.get(file_id, []) if idx >= trial_count])
+
+    async def refresh(self, file_id, trial_index, metadata, stamp):
+        self.refreshed.append((file_id, trial_index, metadata["duration"], stamp["sourceMtimeNs"]))
+        return True
+
+    async def find_feature_pending(self, file_id):
+        # 重算后的Trial与从未计算过特征的Trial
+        return [idx for idx in self.stale.get(file_id, []) if idx < 3] + ([2] if file_id == "unchanged.h5" else [])
+
+    async def set_features(self, file_id, trial_index, features):
+        self.features.append((file_id, trial_index, features["rms"]))
+        return True
+
+
+@pytest.fixture(autouse=True)
+def stub_dependencies(monkeypatch):
+    StubMetadataRepository.refreshed = []
+    StubMetadataRepository.features = []
+    StubMetadataRepository.stale = {"unchanged.h5": [], "replaced.h5": [0, 1, 5]}
+    monkeypatch.setattr(revalidation_module, "TrialMetadataRepository", StubMetadataRepository)
+
+    computed = []
+
+    async def get_trial_metadata(file_path, trial_index):
+        computed.append((file_path, trial_index))
+        await asyncio.sleep(0)
+        return {"trialIndex": trial_index, "duration": 2.0}
+
+    async def get_trial_count(file_path):
+        return 3
+
+    async def get_trial_features(file_path, trial_index):
+        return {"rms": float(trial_index)}
+
+    monkeypatch.setattr(h5_service, "get_trial_metadata", get_trial_metadata)
+    monkeypatch.setattr(h5_service, "get_trial_features", get_trial_features)
+    monkeypatch.setattr(h5_service, "get_trial_count", get_trial_count)
+    monkeypatch.setattr(h5_service, "metadata_stamp", lambda path: STAMPS[path])
+    monkeypatch.setattr(
+        h5_service,
+        "scan_files",
+        lambda: [{"fileId": name, "fullPath": name} for name in STAMPS],
+    )
+    return computed
+
+
+async def test_schedule_deduplicates_pending_refreshes(stub_dependencies):
+    revalidator = MetadataRevalidator(max_concurrency=1)
+    stamp = STAMPS["replaced.h5"]
+
+    assert revalidator.schedule(None, "replaced.h5", "replaced.h5", [0, 1], stamp) == 2
+    assert revalidator.schedule(None, "replaced.h5", "replaced.h5", [1, 2], stamp) == 1
+
+    while revalidator.stats()["pending"]:
+        await asyncio.sleep(0)
+
+    assert sorted(item[1] for item in StubMetadataRepository.refreshed) == [0, 1, 2]
+    assert revalidator.stats()["refreshed"] == 3
+
+
+async def test_revalidate_only_recomputes_changed_files(stub_dependencies):
+    revalidator = MetadataRevalidator(max_concurrency=2)
+
+    summary = await revalidator.revalidate(None)
+
+    assert summary["files"] == 2
+    assert summary["changedFiles"] == 1
+    assert summary["refreshed"] == 2
+    assert summary["removed"] == 1
+    # 超出当前Trial数量的序号直接删除，不再重算
+    assert sorted(stub_dependencies) == [("replaced.h5", 0), ("replaced.h5", 1)]
+    assert StubMetadataRepository.refreshed[0][3] == 2
+    assert revalidator.last_run is summary
+
+    # 未变化的文件同样补算缺少的特征
+    assert summary["features"] == 3
+    assert sorted(StubMetadataRepository.features) == [
+        ("replaced.h5", 0, 0.0),
+        ("replaced.h5", 1, 1.0),
+        ("unchanged.h5", 2, 2.0),
+    ]
+
+
+async def test_schedule_features_is_separate_from_metadata(stub_dependencies):
+    revalidator = MetadataRevalidator(max_concurrency=1)
+    stamp = STAMPS["replaced.h5"]
+
+    assert revalidator.schedule(None, "replaced.h5", "replaced.h5", [0], stamp) == 1
+    assert revalidator.schedule_features(None, "replaced.h5", "replaced.h5", [0, 1]) == 2
+    assert revalidator.schedule_features(None, "replaced.h5", "replaced.h5", [1]) == 0
+
+    while revalidator.stats()["pending"]:
+        await asyncio.sleep(0)
+
+    assert [item[1] for item in StubMetadataRepository.refreshed] == [0]
+    assert sorted(item[1] for item in StubMetadataRepository.features) == [0, 1]
+    assert revalidator.stats()["featuresComputed"] == 2
@@ -0,0 +1,264 @@
+import asyncio
+import inspect
+import os
+import struct
+import zlib
+
+import h5py
+import httpx
+import numpy as np
+import pytest
+
+from app.api import files as files_module
+from app.config import settings
+from app.db import get_database
+from app.main import app
+from app.services import h5_service
+from app.services.admission_service import admission_controller
+from app.services.auth_service import AuthService
+from app.services import sparkline_service as sparkline_module
+from app.services.sparkline_service import SparklineService
+from app.utils.sparkline import render_png, render_sprite_png, render_svg
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+def _thumbnail():
+    t = np.linspace(0, 2, 400, dtype=np.float32)
+    return {"timestamps": t, "raw": np.sin(6 * t), "filtered": np.sin(6 * t) * 0.8}
+
+
+def _decode_png(content: bytes) -> np.ndarray:
+    """解析本模块生成的 PNG (单个 IDAT，无过滤)"""
+    assert content[:8] == b"\x89PNG\r\n\x1a\n"
+    width, height = struct.unpack(">II", content[16:24])
+    length = struct.unpack(">I", content[33:37])[0]
+    assert content[37:41] == b"IDAT"
+    rows = np.frombuffer(zlib.decompress(content[41:41 + length]), dtype=np.uint8)
+    return rows.reshape(height, width * 4 + 1)[:, 1:].reshape(height, width, 4)
+
+
+def test_png_draws_both_series():
+    pixels = _decode_png(render_png(_thumbnail(), 160, 40))
+
+    assert pixels.shape == (40, 160, 4)
+    assert (pixels[..., 3] > 0).any(axis=0).all()
+    # 滤波信号 (红) 画在原始信号 (灰) 之上
+    opaque = pixels[pixels[..., 3] == 255]
+    assert (opaque[:, 0] > opaque[:, 1]).any()
+
+
+def test_sprite_and_svg_handle_missing_data():
+    thumbnail = _thumbnail()
+    thumbnail["raw"] = np.where(np.arange(400) % 50 == 0, np.nan, thumbnail["raw"])
+    pixels = _decode_png(render_sprite_png([thumbnail, None, {}], 80, 20))
+
+    assert pixels.shape == (60, 80, 4)
+    assert pixels[:20, :, 3].any()
+    assert not pixels[20:, :, 3].any()
+
+    svg = render_svg(thumbnail, 80, 20).decode()
+    assert svg.count("<polyline") == 9
+    assert "nan" not in svg
+
+
+async def test_disk_cache_survives_restart(tmp_path):
+    calls = []
+
+    async def render():
+        calls.append(1)
+        return b"png"
+
+    first = SparklineService(h5_service, str(tmp_path / "cache"))
+    second = SparklineService(h5_service, str(tmp_path / "cache"))
+
+    assert await first.get("a.h5", "v1", "trial-0.png", render) == b"png"
+    assert await second.get("a.h5", "v1", "trial-0.png", render) == b"png"
+    assert await second.get("a.h5", "v2", "trial-0.png", render) == b"png"
+    assert len(calls) == 2
+    assert not list((tmp_path / "cache").glob("*.tmp"))
+
+
+async def test_disk_cache_prunes_oldest_versions(tmp_path):
+    cache_dir = tmp_path / "cache"
+    service = SparklineService(h5_service, str(cache_dir), max_bytes=250)
+
+    for index in range(5):
+        old = service.cache_path("a.h5", f"v{index}", "trial-0.png")
+        cache_dir.mkdir(exist_ok=True)
+        old.write_bytes(b"x" * 100)
+        os.utime(old, ns=(index * 10**9, index * 10**9))
+
+    async def render():
+        return b"y" * 100
+
+    assert await service.get("a.h5", "v9", "trial-0.png", render) == b"y" * 100
+    # 保留最新写入的文件与最近一个旧版本
+    assert sorted(path.name.split("-")[1] for path in cache_dir.iterdir()) == ["v4", "v9"]
+
+
+def test_version_follows_thumbnail_metadata_version(monkeypatch, tmp_path):
+    path = tmp_path / "a.h5"
+    path.write_bytes(b"")
+    service = SparklineService(h5_service, str(tmp_path / "cache"))
+    before = service.version(str(path))
+
+    monkeypatch.setattr(sparkline_module, "METADATA_VERSION", sparkline_module.METADATA_VERSION + 1)
+    assert service.version(str(path)) != before
+
+
+class StubMetadataRepository:
+    def __init__(self, db):
+        pass
+
+    async def find_many(self, file_id, indices):
+        return {}
+
+    async def find_or_create(self, file_id, index, create_func, stamp=None):
+        metadata = create_func()
+        return await metadata if inspect.isawaitable(metadata) else metadata
+
+    async def get_trial_lengths(self, file_id, indices):
+        return {}
+
+
+async def test_versioned_sparklines_are_immutable(monkeypatch, tmp_path):
+    with h5py.File(tmp_path / "sample.h5", "w") as f:
+        for index in range(3):
+            group = f.create_group(f"trial_{index}")
+            group["sensor"] = np.sin(np.linspace(0, 10 + index, 5000))
+            group["timestamps"] = np.arange(5000) / 1000.0
+
+    monkeypatch.setattr(files_module, "TrialMetadataRepository", StubMetadataRepository)
+    monkeypatch.setattr(files_module.sparkline_service, "cache_dir", tmp_path / "sparklines")
+    monkeypatch.setattr(h5_service, "data_root", tmp_path)
+
+    async def _get_db():
+        return None
+
+    app.dependency_overrides[get_database] = _get_db
+    auth_service = AuthService(
+        secret_key=settings.JWT_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM,
+        expiration_days=settings.JWT_EXPIRATION_DAYS,
+    )
+    headers = {
+        "Authorization": "Bearer " + auth_service.create_access_token(
+            user_id="user-id",
+            username="tester",
+            role_id="role-annotator",
+            role_name="annotator",
+            permissions=[],
+        )
+    }
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            latest = await client.get("/api/files/sample.h5/trials/1/sparkline", headers=headers)
+            version = latest.headers["x-content-version"]
+            image = await client.get(f"/api/files/sample.h5/trials/1/sparkline?v={version}", headers=headers)
+            svg = await client.get("/api/files/sample.h5/trials/1/sparkline?format=svg", headers=headers)
+            stale = await client.get("/api/files/sample.h5/trials/1/sparkline?v=outdated", headers=headers)
+            missing = await client.get("/api/files/sample.h5/trials/7/sparkline", headers=headers)
+            sprite = await client.get(f"/api/files/sample.h5/sparklines?offset=1&limit=5&v={version}", headers=headers)
+    finally:
+        app.dependency_overrides.pop(get_database, None)
+
+    assert latest.headers["cache-control"] == "private, no-cache"
+    assert image.status_code == 200
+    assert image.headers["content-type"] == "image/png"
+    assert image.headers["cache-control"] == settings.TILE_CACHE_CONTROL
+    assert image.content == latest.content
+    assert svg.headers["content-type"] == "image/svg+xml"
+    assert stale.status_code == 409
+    assert missing.status_code == 404
+
+    assert sprite.headers["x-trial-count"] == "2"
+    assert _decode_png(sprite.content).shape == (80, 160, 4)
+    assert len(list((tmp_path / "sparklines").iterdir())) == 3
+
+
+async def test_sprite_with_failed_rows_is_not_cached(monkeypatch, tmp_path):
+    with h5py.File(tmp_path / "sample.h5", "w") as f:
+        for index in range(4):
+            group = f.create_group(f"trial_{index}")
+            group["sensor"] = np.sin(np.linspace(0, 10 + index, 5000))
+            group["timestamps"] = np.arange(5000) / 1000.0
+
+    monkeypatch.setattr(files_module, "TrialMetadataRepository", StubMetadataRepository)
+    monkeypatch.setattr(files_module.sparkline_service, "cache_dir", tmp_path / "sparklines")
+    monkeypatch.setattr(h5_service, "data_root", tmp_path)
+
+    original = h5_service.get_trial_metadata
+    attempts = []
+    active = []
+    peak = []
+
+    async def flaky(file_path, index):
+        attempts.append(index)
+        active.append(index)
+        peak.append(len(active))
+        try:
+            await asyncio.sleep(0.01)
+            if index == 2 and attempts.count(2) == 1:
+                raise OSError("transient read error")
+            return await original(file_path, index)
+        finally:
+            active.remove(index)
+
+    monkeypatch.setattr(h5_service, "get_trial_metadata", flaky)
+    lane = admission_controller.lanes["trials"]
+    admitted = lane.admitted
+
+    async def _get_db():
+        return None
+
+    app.dependency_overrides[get_database] = _get_db
+    auth_service = AuthService(
+        secret_key=settings.JWT_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM,
+        expiration_days=settings.JWT_EXPIRATION_DAYS,
+    )
+    headers = {
+        "Authorization": "Bearer " + auth_service.create_access_token(
+            user_id="user-id",
+            username="tester",
+            role_id="role-annotator",
+            role_name="annotator",
+            permissions=[],
+        )
+    }
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            url = "/api/files/sample.h5/sparklines?offset=0&limit=4"
+            partial = await client.get(url, headers=headers)
+            version = partial.headers["x-content-version"]
+            cached_files = list((tmp_path / "sparklines").glob("*"))
+            complete = await client.get(f"{url}&v={version}", headers=headers)
+    finally:
+        app.dependency_overrides.pop(get_database, None)
+
+    # 失败的行不写入磁盘缓存，响应不可缓存；下一次请求重新计算后正常缓存
+    assert partial.status_code == 200
+    assert partial.headers["cache-control"] == "no-store"
+    assert partial.headers["x-failed-trials"] == "2"
+    assert not _decode_png(partial.content)[80:120, :, 3].any()
+    assert cached_files == []
+    assert complete.headers["cache-control"] == settings.TILE_CACHE_CONTROL
+    assert "x-failed-trials" not in complete.headers
+    assert _decode_png(complete.content)[80:120, :, 3].any()
+    assert len(list((tmp_path / "sparklines").glob("*"))) == 1
+    # 未缓存的缩略图经 trials 准入后并发计算
+    assert max(peak) > 1
+    assert lane.admitted == admitted + 2
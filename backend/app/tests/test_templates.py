@@ -1,3 +1,5 @@
+import time
+
 import pytest
 import httpx
 
@@ -7,6 +9,8 @@ from app.config.permissions import ROLE_PRESETS
 from app.main import app
 from app.services.auth_service import AuthService
 from app.db import get_database
+from app.db.repositories import template_repo
+from app.services.cache_service import MemoryCacheBackend
 
 
 pytestmark = pytest.mark.anyio("asyncio")
@@ -199,3 +203,51 @@ async def test_annotator_cannot_delete_template(async_client: httpx.AsyncClient)
 
     response = await async_client.delete("/api/templates/template-1", headers=headers)
     assert response.status_code == 403
+
+
+async def test_template_list_supports_conditional_requests(async_client: httpx.AsyncClient):
+    headers = _make_headers(ROLE_PRESETS["annotator"], role_name="annotator")
+    response = await async_client.get("/api/templates", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert "no-cache" in response.headers["Cache-Control"]
+
+    response = await async_client.get("/api/templates", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = await async_client.get(
+        "/api/templates",
+        headers={**headers, "If-None-Match": f'"stale", W/{etag}'},
+    )
+    assert response.status_code == 304
+
+    response = await async_client.get("/api/templates", headers={**headers, "If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == etag
+
+
+async def test_template_list_cache_expires_quickly(monkeypatch):
+    class FakeCursor:
+        def sort(self, *args):
+            return self
+
+        async def to_list(self, length):
+            return [{"_id": "template-1", "isGlobal": True, "createdBy": None}]
+
+    class FakeDb:
+        class event_templates:
+            @staticmethod
+            def find(query):
+                return FakeCursor()
+
+    cache = MemoryCacheBackend(max_bytes=1024 * 1024, default_ttl=86400)
+    monkeypatch.setattr(template_repo, "cache_backend", cache)
+    monkeypatch.setattr(settings, "TEMPLATE_CACHE_TTL_SECONDS", 30)
+
+    assert await template_repo.TemplateRepository(FakeDb()).find_all() == [
+        {"_id": "template-1", "isGlobal": True, "createdBy": None}
+    ]
+    # 进程内缓存的失效不会同步到其它worker，模板列表只短暂缓存
+    expires_at, _, _ = cache._entries[template_repo.TEMPLATE_LIST_CACHE_KEY]
+    assert expires_at - time.monotonic() <= 30
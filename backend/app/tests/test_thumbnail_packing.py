@@ -0,0 +1,87 @@
+import bson
+import numpy as np
+import pytest
+
+from app.db.repositories.trial_metadata_repo import (
+    TrialMetadataRepository,
+    pack_thumbnail,
+    unpack_thumbnail,
+)
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+def _thumbnail(points=400):
+    t = np.linspace(0, 10_000, points)
+    return {"timestamps": t, "raw": np.sin(t / 300.0), "filtered": np.cos(t / 300.0)}
+
+
+class FakeCollection:
+    """只保存 BSON 编码后的文档，模拟驱动的编解码往返"""
+
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append(bson.encode(document))
+        return type("Result", (), {"inserted_id": "object-id"})()
+
+    async def find_one(self, query):
+        for raw in self.documents:
+            doc = bson.decode(raw)
+            if all(doc.get(key) == value for key, value in query.items()):
+                return doc
+        return None
+
+
+def test_packed_thumbnail_roundtrips_as_float32_and_shrinks():
+    thumbnail = _thumbnail()
+    packed = pack_thumbnail(thumbnail)
+    decoded = unpack_thumbnail(bson.decode(bson.encode({"t": packed}))["t"])
+
+    for name in ("timestamps", "raw", "filtered"):
+        assert decoded[name].dtype == np.float32
+        np.testing.assert_allclose(decoded[name], thumbnail[name], rtol=1e-6, atol=1e-3)
+
+    legacy = {key: value.tolist() for key, value in thumbnail.items()}
+    assert len(bson.encode(legacy)) > 3 * len(bson.encode(packed))
+
+
+def test_unpack_accepts_legacy_double_arrays_and_partial_projections():
+    legacy = {"timestamps": [0.0, 1.0], "filtered": [0.5, 0.25]}
+    decoded = unpack_thumbnail(legacy)
+
+    assert set(decoded) == {"timestamps", "filtered"}
+    assert decoded["filtered"].dtype == np.float64
+    # 已打包的序列再次打包保持不变
+    packed = pack_thumbnail(legacy)
+    assert pack_thumbnail(packed)["filtered"] == packed["filtered"]
+
+
+async def test_repository_packs_on_insert_and_decodes_on_read():
+    repo = TrialMetadataRepository.__new__(TrialMetadataRepository)
+    repo.collection = FakeCollection()
+    created = {"trialIndex": 0, "dataPoints": 400, "thumbnail": _thumbnail()}
+
+    async def create():
+        return created
+
+    result = await repo.find_or_create("sample.h5", 0, create)
+    # 返回给调用方的仍是计算结果本身，不受存储编码影响
+    assert result["thumbnail"]["raw"].dtype == np.float64
+
+    stored = bson.decode(repo.collection.documents[0])
+    assert isinstance(stored["thumbnail"]["raw"], bytes)
+
+    cached = await repo.find_or_create("sample.h5", 0, create)
+    assert cached["thumbnail"]["raw"].dtype == np.float32
+    assert "_id" not in cached
+    np.testing.assert_allclose(cached["thumbnail"]["raw"], created["thumbnail"]["raw"], atol=1e-6)
@@ -0,0 +1,192 @@
+import h5py
+import numpy as np
+import pytest
+
+from app.api import files as files_module
+from app.services import h5_service
+from app.services.cache_service import MemoryCacheBackend
+from app.services.h5_service import H5Service
+from app.services.single_flight import SingleFlight
+from app.services.trial_features import (
+    FEATURE_FIELDS,
+    SignalStats,
+    dominant_frequency,
+    parse_trial_filters,
+    parse_trial_sort,
+)
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+def _signal(samples=120_000, clip=None):
+    rng = np.random.default_rng(0)
+    t = np.arange(samples) / 1000.0
+    values = 2 * np.sin(2 * np.pi * 4 * t) + 0.1 * rng.standard_normal(samples)
+    return values if clip is None else np.clip(values, -clip, clip)
+
+
+def test_signal_stats_are_chunk_independent():
+    values = _signal(clip=1.5)
+    values[100:400] = values[99]
+    values[500] = np.nan
+
+    whole = SignalStats()
+    whole.feed(values)
+    chunked = SignalStats()
+    for start in range(0, len(values), 7_000):
+        chunked.feed(values[start:start + 7_000])
+
+    assert chunked.result() == pytest.approx(whole.result())
+    result = whole.result()
+    finite = values[np.isfinite(values)]
+    assert result["rms"] == pytest.approx(np.sqrt(np.mean(finite ** 2)))
+    assert result["peakToPeak"] == pytest.approx(3.0)
+    # 约一半的正弦被削顶，削顶段与常值段都计入平直比例
+    assert 0.3 < result["saturationFraction"] < 0.6
+    assert 0.3 < result["flatlineFraction"] < 0.6
+
+
+def test_dominant_frequency_finds_sine():
+    t = np.arange(60_000) / 300.0
+    values = np.sin(2 * np.pi * 7.3 * t) + 0.3 * np.sin(2 * np.pi * 22 * t)
+    assert dominant_frequency(values, 300.0, 30.0) == pytest.approx(7.3, abs=0.01)
+
+
+def test_parse_sort_and_filters():
+    assert parse_trial_sort(None) is None
+    assert parse_trial_sort("-rms") == ("features.rms", -1)
+    assert parse_trial_sort("duration") == ("duration", 1)
+    assert parse_trial_filters(["rms>=0.5,rms<2", "flatlineFraction<0.1"]) == {
+        "features.rms": {"$gte": 0.5, "$lt": 2.0},
+        "features.flatlineFraction": {"$lt": 0.1},
+    }
+    for bad in (["rms=1"], ["height>1"], ["rms>high"]):
+        with pytest.raises(ValueError):
+            parse_trial_filters(bad)
+    with pytest.raises(ValueError):
+        parse_trial_sort("-amplitude")
+
+
+def test_features_match_between_pipelines(tmp_path):
+    path = tmp_path / "sample.h5"
+    with h5py.File(path, "w") as f:
+        group = f.create_group("trial_0")
+        # 叠加阶跃，滤波后形成拐点
+        group["sensor"] = _signal() + (np.arange(120_000) // 10_000) % 2
+        group["timestamps"] = (np.arange(120_000) // 100) * 100.0
+
+    svc = H5Service(cache=MemoryCacheBackend(max_bytes=64 * 1024 * 1024), single_flight=SingleFlight())
+    svc.data_root = tmp_path
+    svc.derived_cache_dir = tmp_path / "derived"
+    # 特征不在缩略图流程中计算
+    assert "features" not in svc.load_trial_metadata(str(path), 0)
+    features = svc.load_trial_features(str(path), 0)
+
+    assert set(features) == set(FEATURE_FIELDS)
+    assert features["dominantFrequency"] == pytest.approx(4.0, abs=0.05)
+    assert features["keypointCount"] > 0
+
+    # 超长Trial走分块流程，幅度统计完全一致，频率与拐点数相近
+    svc.streaming_min_samples = 100_000
+    svc.chunk_samples = 30_000
+    streamed = svc.load_trial_features(str(path), 0)
+    for name in ("rms", "peakToPeak", "saturationFraction", "flatlineFraction"):
+        assert streamed[name] == pytest.approx(features[name])
+    assert streamed["dominantFrequency"] == pytest.approx(features["dominantFrequency"], abs=0.05)
+    assert streamed["keypointCount"] == pytest.approx(features["keypointCount"], rel=0.05)
+
+
+class StubRankedRepository:
+    calls: list = []
+
+    def __init__(self, db):
+        pass
+
+    async def find_stale_indices(self, file_id, stamp, start=0, end=None):
+        return []
+
+    async def find_ranked(self, file_id, sort, filters, *, offset=0, limit=None, fields=None):
+        self.calls.append((sort, filters, offset, limit, fields))
+        return [
+            {"trialIndex": 7, "fileId": file_id, "features": {"rms": 3.0}},
+            {"trialIndex": 2, "fileId": file_id, "features": {"rms": 2.0}, "finished": True},
+        ]
+
+    async def count_ranked(self, file_id, filters):
+        return 5
+
+    async def find_feature_pending(self, file_id):
+        return [3, 4]
+
+    async def find_unranked_indices(self, file_id, trial_count):
+        return [3, 4, 9]
+
+    async def find_many(self, file_id, trial_indices):
+        return {3: {"trialIndex": 3, "fileId": file_id, "status": "x", "finished": False, "finishedAt": None}}
+
+
+class StubCountRepository:
+    def __init__(self, db):
+        pass
+
+    async def count_by_trials(self, file_id):
+        return {2: 1}
+
+    async def count_by_files(self, file_ids):
+        return {file_ids[0]: {7: 4}}
+
+
+async def test_ranked_trials_read_only_the_index(monkeypatch):
+    StubRankedRepository.calls = []
+    monkeypatch.setattr(files_module, "TrialMetadataRepository", StubRankedRepository)
+    monkeypatch.setattr(files_module, "AnnotationRepository", StubCountRepository)
+    monkeypatch.setattr(files_module, "AnnotationVersionRepository", StubCountRepository)
+    monkeypatch.setattr(h5_service, "metadata_stamp", lambda path: {})
+
+    def compute(*args):
+        raise AssertionError("ranked listing must not compute metadata")
+
+    monkeypatch.setattr(h5_service, "get_trial_metadata", compute)
+    scheduled = []
+    monkeypatch.setattr(
+        files_module.metadata_revalidator,
+        "schedule_features",
+        lambda db, file_id, file_path, indices: scheduled.extend(indices),
+    )
+
+    trials, ranked, total, pending = await files_module._load_ranked_trials(
+        None, "sample.h5", "unused", 10, ("features.rms", -1), {"features.rms": {"$gte": 1.0}}, 3, 4,
+        {"features", "status", "counts"},
+    )
+
+    # 尚无特征的Trial接在已排序结果之后，总数包含它们
+    assert ranked == 5 and total == 8
+    # 缺少特征的Trial交给后台计算
+    assert pending == 2 and scheduled == [3, 4]
+    assert StubRankedRepository.calls == [
+        (("features.rms", -1), {"features.rms": {"$gte": 1.0}}, 3, 4, {"features", "status", "counts"})
+    ]
+    assert [(trial["trialIndex"], trial["annotationCount"], trial["versionCount"]) for trial in trials] == [
+        (7, 4, 0),
+        (2, 0, 1),
+        (3, 0, 0),
+        (4, 0, 0),
+    ]
+    assert [trial.get("featuresPending", False) for trial in trials] == [False, False, True, True]
+    assert "status" not in trials[2] and trials[3]["finished"] is False
+
+    # 整页都在未排序部分时不再查询排序索引
+    tail, _, _, _ = await files_module._load_ranked_trials(
+        None, "sample.h5", "unused", 10, ("features.rms", -1), {}, 6, 2, {"status"},
+    )
+    assert [trial["trialIndex"] for trial in tail] == [4, 9]
+    assert len(StubRankedRepository.calls) == 1
+    assert trials[0]["finished"] is False and trials[1]["finished"] is True
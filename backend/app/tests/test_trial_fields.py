@@ -0,0 +1,141 @@
+import pytest
+
+from app.api import files as files_module
+from app.db.repositories.trial_metadata_repo import (
+    parse_trial_fields,
+    project_trial_metadata,
+    trial_field_paths,
+)
+from app.services import h5_service
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+FULL_METADATA = {
+    "trialIndex": 1,
+    "fileId": "sample.h5",
+    "duration": 1.0,
+    "sampleRate": 1000.0,
+    "dataPoints": 1000,
+    "finished": True,
+    "finishedAt": None,
+    "thumbnail": {"timestamps": [0, 1], "raw": [0.1, 0.2], "filtered": [0.15, 0.18]},
+}
+
+
+class StubMetadataRepository:
+    queries: list = []
+    created: list = []
+
+    def __init__(self, db):
+        pass
+
+    async def find_by_file(self, file_id, *, offset=0, limit=None, fields=None):
+        self.queries.append((offset, limit, fields))
+        # 仅 Trial 1 已有元数据，模拟数据库投影
+        if not offset <= 1 < offset + limit:
+            return []
+        if fields is None:
+            return [dict(FULL_METADATA, _id="object-id")]
+        return [project_trial_metadata(FULL_METADATA, fields)]
+
+    async def find_or_create(self, file_id, trial_index, create_func, stamp=None):
+        self.created.append(trial_index)
+        return dict(FULL_METADATA, trialIndex=trial_index, finished=False)
+
+    async def find_stale_indices(self, file_id, stamp, start=0, end=None):
+        return []
+
+    @staticmethod
+    def normalize_metadata(metadata):
+        metadata.pop("_id", None)
+        return metadata
+
+
+class StubVersionRepository:
+    def __init__(self, db):
+        pass
+
+    async def count_by_trials(self, file_id):
+        return {1: 3}
+
+
+class StubAnnotationRepository:
+    def __init__(self, db):
+        pass
+
+    async def count_by_files(self, file_ids):
+        return {file_ids[0]: {0: 5}}
+
+
+@pytest.fixture(autouse=True)
+def stub_repositories(monkeypatch):
+    StubMetadataRepository.queries = []
+    StubMetadataRepository.created = []
+    monkeypatch.setattr(files_module, "TrialMetadataRepository", StubMetadataRepository)
+    monkeypatch.setattr(files_module, "AnnotationVersionRepository", StubVersionRepository)
+    monkeypatch.setattr(files_module, "AnnotationRepository", StubAnnotationRepository)
+
+
+def test_parse_trial_fields_rejects_unknown_groups():
+    assert parse_trial_fields(None) is None
+    assert parse_trial_fields(" status, counts ") == {"status", "counts"}
+    with pytest.raises(ValueError):
+        parse_trial_fields("status,thumbnails")
+
+
+def test_field_paths_drop_children_of_requested_parents():
+    assert trial_field_paths({"thumbnail.filtered"}) == ["thumbnail.filtered", "thumbnail.timestamps"]
+    assert trial_field_paths({"thumbnail", "thumbnail.raw"}) == ["thumbnail"]
+
+
+def test_project_trial_metadata_keeps_only_requested_groups():
+    projected = project_trial_metadata(FULL_METADATA, {"status", "thumbnail.filtered"})
+
+    assert projected == {
+        "trialIndex": 1,
+        "fileId": "sample.h5",
+        "finished": True,
+        "finishedAt": None,
+        "thumbnail": {"timestamps": [0, 1], "filtered": [0.15, 0.18]},
+    }
+
+
+async def test_lightweight_fields_never_compute_missing_trials():
+    trials = await files_module._load_trials(None, "sample.h5", "unused", 0, 3, {"status", "counts"})
+
+    assert StubMetadataRepository.created == []
+    assert StubMetadataRepository.queries == [(0, 3, {"status", "counts"})]
+    assert [trial["trialIndex"] for trial in trials] == [0, 1, 2]
+    assert trials[0] == {
+        "trialIndex": 0,
+        "fileId": "sample.h5",
+        "finished": False,
+        "finishedAt": None,
+        "annotationCount": 5,
+        "versionCount": 0,
+    }
+    assert trials[1]["finished"] is True
+    assert trials[1]["versionCount"] == 3
+    assert "thumbnail" not in trials[1]
+
+
+async def test_paged_thumbnail_fields_compute_only_missing_trials(monkeypatch):
+    monkeypatch.setattr(h5_service, "get_trial_metadata", lambda path, idx: None)
+    monkeypatch.setattr(h5_service, "metadata_stamp", lambda path: {})
+
+    trials = await files_module._load_trials(None, "sample.h5", "unused", 1, 3, {"thumbnail.filtered"})
+
+    assert StubMetadataRepository.created == [2]
+    assert [trial["trialIndex"] for trial in trials] == [1, 2]
+    for trial in trials:
+        assert set(trial) == {"trialIndex", "fileId", "thumbnail"}
+        assert set(trial["thumbnail"]) == {"timestamps", "filtered"}
@@ -0,0 +1,171 @@
+import h5py
+import httpx
+import numpy as np
+import orjson
+import pytest
+
+from app.api import files as files_module
+from app.config import settings
+from app.db import get_database
+from app.main import app
+from app.services import h5_service
+from app.services.admission_service import admission_controller
+from app.services.auth_service import AuthService
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+auth_service = AuthService(
+    secret_key=settings.JWT_SECRET_KEY,
+    algorithm=settings.JWT_ALGORITHM,
+    expiration_days=settings.JWT_EXPIRATION_DAYS,
+)
+
+HEADERS = {
+    "Authorization": "Bearer " + auth_service.create_access_token(
+        user_id="user-id",
+        username="tester",
+        role_id="role-annotator",
+        role_name="annotator",
+        permissions=[],
+    )
+}
+
+
+class StubMetadataRepository:
+    storage: dict = {}
+
+    def __init__(self, db):
+        pass
+
+    async def get_file_state(self, file_id):
+        return {"count": len(self.storage)}
+
+    async def find_many(self, file_id, trial_indices):
+        return {idx: dict(self.storage[idx]) for idx in trial_indices if idx in self.storage}
+
+    async def find_or_create(self, file_id, trial_index, create_func, stamp=None):
+        if trial_index not in self.storage:
+            metadata = await create_func()
+            metadata.update({"fileId": file_id, "finished": False, "finishedAt": None})
+            self.storage[trial_index] = metadata
+        return dict(self.storage[trial_index])
+
+    async def get_trial_lengths(self, file_id, trial_indices):
+        return {}
+
+    async def find_stale_indices(self, file_id, stamp, start=0, end=None):
+        return []
+
+
+class StubVersionRepository:
+    def __init__(self, db):
+        pass
+
+    async def get_file_state(self, file_id):
+        return {"count": 0}
+
+    async def count_by_trials(self, file_id):
+        return {0: 2}
+
+
+class StubAnnotationRepository:
+    def __init__(self, db):
+        pass
+
+    async def count_by_files(self, file_ids):
+        return {file_ids[0]: {3: 4}}
+
+
+@pytest.fixture(autouse=True)
+def stub_dependencies(monkeypatch, tmp_path):
+    with h5py.File(tmp_path / "sample.h5", "w") as f:
+        for index in range(5):
+            group = f.create_group(f"trial_{index}")
+            group["sensor"] = np.sin(np.linspace(0, 20, 1000))
+            group["timestamps"] = (np.arange(1000) // 100) * 100.0
+
+    StubMetadataRepository.storage = {
+        3: {"trialIndex": 3, "fileId": "sample.h5", "dataPoints": 1000, "finished": True, "finishedAt": None}
+    }
+    monkeypatch.setattr(files_module, "TrialMetadataRepository", StubMetadataRepository)
+    monkeypatch.setattr(files_module, "AnnotationVersionRepository", StubVersionRepository)
+    monkeypatch.setattr(files_module, "AnnotationRepository", StubAnnotationRepository)
+    monkeypatch.setattr(h5_service, "data_root", tmp_path)
+
+    async def _get_db():
+        return None
+
+    app.dependency_overrides[get_database] = _get_db
+    yield
+    app.dependency_overrides.pop(get_database, None)
+
+
+async def _stream(path: str) -> tuple[httpx.Response, list]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        response = await client.get(path, headers=HEADERS)
+    lines = [orjson.loads(line) for line in response.content.splitlines()] if response.status_code == 200 else []
+    return response, lines
+
+
+async def test_cached_trials_stream_first_then_computed():
+    response, lines = await _stream("/api/files/sample.h5/trials/stream")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["x-trial-count"] == "5"
+    assert lines[0]["trialIndex"] == 3
+    assert lines[0]["annotationCount"] == 4
+    assert sorted(line["trialIndex"] for line in lines) == [0, 1, 2, 3, 4]
+
+    computed = {line["trialIndex"]: line for line in lines[1:]}
+    assert computed[0]["versionCount"] == 2
+    assert len(computed[0]["thumbnail"]["filtered"]) > 0
+
+
+async def test_stream_supports_offset_limit_and_reports_failures(monkeypatch):
+    original = h5_service.get_trial_metadata
+
+    async def flaky(file_path, trial_index):
+        if trial_index == 2:
+            raise ValueError("broken trial")
+        return await original(file_path, trial_index)
+
+    monkeypatch.setattr(h5_service, "get_trial_metadata", flaky)
+
+    _, lines = await _stream("/api/files/sample.h5/trials/stream?offset=1&limit=2")
+
+    by_index = {line["trialIndex"]: line for line in lines}
+    assert sorted(by_index) == [1, 2]
+    assert by_index[2]["error"] == "broken trial"
+    assert "thumbnail" in by_index[1]
+
+
+async def test_stream_is_admitted_before_the_response(monkeypatch):
+    lane = admission_controller.lanes["trials"]
+    monkeypatch.setattr(lane, "active", lane.max_concurrency)
+    monkeypatch.setattr(lane, "max_queue", 0)
+
+    # 已全部缓存的区间无需计算，通道已满也直接返回
+    response, lines = await _stream("/api/files/sample.h5/trials/stream?offset=3&limit=1")
+    assert response.status_code == 200
+    assert [line["trialIndex"] for line in lines] == [3]
+
+    # 需要计算时在发送响应头前拒绝，而不是 200 后在末行报告繁忙
+    response, _ = await _stream("/api/files/sample.h5/trials/stream")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(admission_controller.retry_after)
+
+    monkeypatch.setattr(lane, "active", 0)
+    response, lines = await _stream("/api/files/sample.h5/trials/stream")
+    assert response.status_code == 200 and len(lines) == 5
+    assert lane.active == 0
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from app.utils.responses import dumps
+from app.utils.waveform_encoding import decode_series, encode_series, encode_waveform
+
+
+@pytest.fixture
+def signal_values():
+    rng = np.random.default_rng(0)
+    t = np.arange(100000) / 1000.0
+    return np.sin(2 * np.pi * 2 * t) * 500 + 20 * rng.standard_normal(len(t))
+
+
+@pytest.mark.parametrize("delta", [0, 1, 2])
+def test_int16_roundtrip_stays_within_half_step(signal_values, delta):
+    payload = encode_series(signal_values, "int16", delta=delta)
+    decoded = decode_series(payload)
+
+    error = np.abs(decoded - signal_values)
+    assert payload["count"] == len(signal_values)
+    assert error.max() <= payload["scale"] / 2 + 1e-12
+    assert payload["error"]["maxAbsError"] == pytest.approx(error.max())
+    assert payload["error"]["relativeError"] < 1e-4
+
+
+def test_int16_is_much_smaller_than_float32(signal_values):
+    smooth = np.sin(np.arange(100000) / 300.0) * 500
+    float32 = len(dumps(encode_series(smooth, "float32")))
+    int16 = len(dumps(encode_series(smooth, "int16", delta=2)))
+
+    assert int16 * 4 < float32
+    # 含噪声的原始信号压缩率受限于噪声熵
+    assert len(dumps(encode_series(signal_values, "int16"))) * 6 < len(dumps(signal_values))
+
+
+def test_nan_and_constant_series_roundtrip():
+    values = np.array([1.5, np.nan, 1.5, 1.5])
+    decoded = decode_series(encode_series(values, "int16"))
+
+    assert np.isnan(decoded[1])
+    np.testing.assert_array_equal(decoded[[0, 2, 3]], [1.5, 1.5, 1.5])
+
+
+def test_encode_waveform_keeps_axis_and_keypoints_exact(signal_values):
+    waveform = {
+        "timeAxis": {"type": "uniform", "count": len(signal_values), "t0": 0.0, "sampleRate": 1000.0},
+        "raw": {"values": signal_values},
+        "filtered": {"values": signal_values},
+        "keypoints": np.array([3, 17, 99]),
+    }
+    encoded = encode_waveform(waveform, "int16")
+
+    assert encoded["timeAxis"] is waveform["timeAxis"]
+    assert encoded["keypoints"] is waveform["keypoints"]
+    assert encoded["raw"]["values"]["encoding"] == "int16"
+    assert encode_waveform(waveform, "float64") is waveform
@@ -0,0 +1,253 @@
+import asyncio
+import os
+import threading
+
+import h5py
+import httpx
+import numpy as np
+import pytest
+
+from app.api import files as files_module
+from app.config import settings
+from app.db import get_database
+from app.main import app
+from app.services import h5_service
+from app.services.admission_service import admission_controller
+from app.services.auth_service import AuthService
+from app.services.cache_service import MemoryCacheBackend
+from app.services.h5_derived import PYRAMID_FACTOR, read_time_axis
+from app.services.h5_service import H5Service
+from app.services.single_flight import SingleFlight
+from app.services.waveform_tiles import TILE_POINTS, tile_layout
+
+
+pytestmark = pytest.mark.anyio("asyncio")
+
+SAMPLES = 600_000
+
+
+@pytest.fixture
+def anyio_backend():
+    """强制 AnyIO 使用 asyncio 事件循环"""
+
+    return "asyncio"
+
+
+@pytest.fixture
+def h5_file(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / "sample.h5"
+    with h5py.File(path, "w") as f:
+        group = f.create_group("trial_0")
+        t = np.arange(SAMPLES) / 1000.0
+        group["sensor"] = np.sin(2 * np.pi * 0.5 * t) + 0.1 * rng.standard_normal(SAMPLES)
+        group["timestamps"] = (np.arange(SAMPLES) // 100) * 100.0
+    return str(path)
+
+
+def _service(tmp_path, dataset_write=False):
+    svc = H5Service(cache=MemoryCacheBackend(max_bytes=256 * 1024 * 1024), single_flight=SingleFlight())
+    svc.data_root = tmp_path
+    svc.dataset_write = dataset_write
+    svc.derived_cache_dir = tmp_path / "derived-cache"
+    return svc
+
+
+def _check_envelope(tile, waveform):
+    spp = tile["samplesPerPoint"]
+    for series in ("raw", "filtered"):
+        values = np.asarray(waveform[series]["values"], dtype=np.float32)
+        for j in (0, tile["count"] // 2, tile["count"] - 1):
+            start = tile["startIndex"] + j * spp
+            segment = values[start:min(start + spp, len(values))]
+            assert tile[series]["min"][j] == segment.min()
+            assert tile[series]["max"][j] == segment.max()
+
+
+def test_tile_layout_covers_every_sample():
+    layout = tile_layout(SAMPLES)
+    coarsest = layout["levels"][-1]
+
+    assert layout["levels"][0] == {"level": 0, "samplesPerPoint": 1, "points": SAMPLES, "tiles": -(-SAMPLES // TILE_POINTS)}
+    assert coarsest["samplesPerPoint"] == PYRAMID_FACTOR ** coarsest["level"]
+    assert coarsest["points"] * coarsest["samplesPerPoint"] >= SAMPLES
+
+
+@pytest.mark.parametrize("dataset_write", [False, True])
+async def test_tiles_match_waveform(tmp_path, h5_file, dataset_write):
+    svc = _service(tmp_path, dataset_write)
+    waveform = await svc.get_waveform(h5_file, 0)
+    layout = svc.get_tile_layout(h5_file, 0)
+
+    first = await svc.get_tile(h5_file, 0, 0, 1)
+    np.testing.assert_array_equal(first["raw"]["values"], waveform["raw"]["values"][TILE_POINTS:2 * TILE_POINTS])
+    np.testing.assert_allclose(first["filtered"]["values"], waveform["filtered"]["values"][TILE_POINTS:2 * TILE_POINTS])
+    assert first["timeAxis"]["count"] == TILE_POINTS
+
+    level = layout["levels"][2]
+    middle = await svc.get_tile(h5_file, 0, 2, 3)
+    assert middle["count"] == TILE_POINTS
+    _check_envelope(middle, waveform)
+
+    # 最后一个瓦片包含金字塔截断的尾部
+    tail = await svc.get_tile(h5_file, 0, 2, level["tiles"] - 1)
+    assert tail["endIndex"] == SAMPLES
+    _check_envelope(tail, waveform)
+
+    with pytest.raises(ValueError):
+        await svc.get_tile(h5_file, 0, 2, level["tiles"])
+
+
+async def test_tiles_read_only_their_own_slice(tmp_path, h5_file):
+    svc = _service(tmp_path)
+    await svc.get_tile(h5_file, 0, 0, 0)
+
+    # 首个瓦片生成单Trial派生数据文件，之后的瓦片只按切片读取，不再加载整段波形
+    def whole_trial(*args):
+        raise AssertionError("tile request must not load the whole trial")
+
+    svc._read_trial_data = whole_trial
+    svc._preprocess_data = whole_trial
+    # 读取已生成的单Trial文件不持有文件锁，其它线程持锁 (如正在生成) 时不被阻塞
+    sidecar = next((tmp_path / "derived-cache").glob("*.h5"))
+    locked, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        with svc._file_lock(str(sidecar)):
+            locked.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    locked.wait()
+    try:
+        tile = await asyncio.wait_for(svc.get_tile(h5_file, 0, 1, 5), 10)
+    finally:
+        release.set()
+        holder.join()
+    assert tile["count"] == TILE_POINTS
+    np.testing.assert_array_equal((await svc.get_tile(h5_file, 0, 1, 5))["raw"]["min"], tile["raw"]["min"])
+
+    # 共享缓存中每个瓦片单独一项，不缓存完整波形或整个金字塔
+    keys = list(svc.cache._entries)
+    assert len(keys) == 2 and all(key.startswith("waveform-tile:") for key in keys)
+    assert max(size for _, _, size in svc.cache._entries.values()) < 64 * 1024
+
+
+def test_time_axis_reads_only_the_tile_breakpoints(tmp_path):
+    indices = np.arange(0, 100_000, 100)
+    seconds = indices / 1000.0 + np.repeat([0.0, 5.0], len(indices) // 2)
+    with h5py.File(tmp_path / "axis.h5", "w") as f:
+        f["timeIndices"] = indices
+        f["timeSeconds"] = seconds
+        axis = read_time_axis(f, 12_345, 13_369)
+        edge = read_time_axis(f, 0, 50)
+
+    # 只取覆盖区间的断点及两端外侧各一个
+    assert list(axis["indices"][[0, -1]]) == [12_300, 13_400] and len(axis["indices"]) == 12
+    samples = np.arange(12_345, 13_369)
+    np.testing.assert_array_equal(
+        np.interp(samples, axis["indices"], axis["seconds"]),
+        np.interp(samples, indices, seconds),
+    )
+    assert list(edge["indices"]) == [0, 100]
+
+
+async def test_window_reads_slices_from_derived_data(tmp_path, h5_file):
+    svc = _service(tmp_path)
+    arrays = svc._waveform_arrays(h5_file, 0)
+    await svc.build_derived(h5_file, 0)
+
+    def whole_trial(*args):
+        raise AssertionError("window request must not load the whole trial")
+
+    svc._read_trial_data = whole_trial
+    svc._waveform_arrays = whole_trial
+
+    # 窄窗口按切片读取采样，结果与完整数组一致
+    narrow = await svc.get_waveform_window(h5_file, 0, start=100.0, end=101.5, max_points=500)
+    expected = svc._window_waveform(arrays, 100.0, 101.5, 500, "lttb")
+    assert narrow["window"] == expected["window"] and narrow["window"]["downsampled"] is True
+    np.testing.assert_array_equal(narrow["keypoints"], expected["keypoints"])
+    for series in ("raw", "filtered"):
+        np.testing.assert_array_equal(narrow[series]["indices"], expected[series]["indices"])
+        np.testing.assert_array_equal(narrow[series]["values"], expected[series]["values"])
+
+    # 整段窗口读取金字塔包络：点数不超过 max_points，极值与完整数据一致
+    wide = await svc.get_waveform_window(h5_file, 0, max_points=400, method="m4")
+    assert wide["window"] == svc._window_waveform(arrays, None, None, 400, "m4")["window"]
+    for series in ("raw", "filtered"):
+        values = wide[series]["values"]
+        assert len(values) <= 400
+        assert values.max() == np.float32(arrays[series].max())
+        assert values.min() == np.float32(arrays[series].min())
+        indices = wide[series]["indices"]
+        assert indices[0] == 0 and indices[-1] < SAMPLES and np.all(np.diff(indices) >= 0)
+
+
+async def test_tile_version_changes_with_file(tmp_path, h5_file):
+    svc = _service(tmp_path)
+    version = svc.tile_version(h5_file)
+    assert svc.get_tile_layout(h5_file, 0)["version"] == version
+
+    with h5py.File(h5_file, "a") as f:
+        f["trial_0"]["sensor"][0] = 10.0
+    stat = os.stat(h5_file)
+    os.utime(h5_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10_000_000))
+    assert svc.tile_version(h5_file) != version
+
+
+class StubLengthRepository:
+    def __init__(self, db):
+        pass
+
+    async def get_trial_lengths(self, file_id, indices):
+        return {}
+
+
+async def test_versioned_tile_is_immutable(monkeypatch, tmp_path, h5_file):
+    monkeypatch.setattr(h5_service, "data_root", tmp_path)
+    monkeypatch.setattr(h5_service, "derived_cache_dir", tmp_path / "derived-cache")
+    monkeypatch.setattr(files_module, "TrialMetadataRepository", StubLengthRepository)
+
+    async def _get_db():
+        return None
+
+    app.dependency_overrides[get_database] = _get_db
+    auth_service = AuthService(
+        secret_key=settings.JWT_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM,
+        expiration_days=settings.JWT_EXPIRATION_DAYS,
+    )
+    headers = {
+        "Authorization": "Bearer " + auth_service.create_access_token(
+            user_id="user-id",
+            username="tester",
+            role_id="role-annotator",
+            role_name="annotator",
+            permissions=[],
+        )
+    }
+
+    lane = admission_controller.lanes["waveform"]
+    admitted = lane.admitted
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            layout = (await client.get("/api/files/sample.h5/trials/0/tiles", headers=headers)).json()
+            url = f"/api/files/sample.h5/trials/0/tiles/1/0?v={layout['version']}&precision=int16"
+            tile = await client.get(url, headers=headers)
+            stale = await client.get("/api/files/sample.h5/trials/0/tiles/1/0?v=outdated", headers=headers)
+            revalidated = await client.get(url, headers={**headers, "If-None-Match": tile.headers["etag"]})
+            neighbour = await client.get(url.replace("/1/0?", "/1/1?"), headers=headers)
+    finally:
+        app.dependency_overrides.pop(get_database, None)
+
+    # 只有生成派生数据的首个瓦片经过准入
+    assert lane.admitted == admitted + 1
+    assert neighbour.status_code == 200
+    assert tile.status_code == 200
+    assert tile.headers["cache-control"] == settings.TILE_CACHE_CONTROL
+    assert tile.json()["raw"]["min"]["encoding"] == "int16"
+    assert stale.status_code == 409
+    assert revalidated.status_code == 304
@@ -0,0 +1,47 @@
+"""磁盘缓存目录的容量控制
+
+缓存文件名包含内容版本，源文件或参数变化后旧版本不再被读取；写入后按修改时间
+从旧到新删除，直到目录总大小不超过上限。
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+
+def prune_directory(directory: Path, max_bytes: int) -> int:
+    """删除最旧的缓存文件直到总大小不超过 max_bytes，返回删除的文件数
+
+    正在写入的临时文件 (*.tmp) 不计入也不删除；与其他进程并发清理时忽略已被删除的文件。
+    """
+    entries = []
+    total = 0
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp") or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️  Failed to prune cache file {path}: {e}")
+            continue
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,132 @@
+"""按视口宽度降采样：LTTB 与 M4，只返回被选中的采样下标
+
+桶边界、下一桶均值均一次性向量化计算；LTTB 每个桶依赖上一个选中点，
+逐桶循环中只剩一次面积计算与 argmax。
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+DOWNSAMPLE_METHODS = ("lttb", "m4")
+# 平均桶长不超过该值时逐点用 Python 计算，小数组上的 numpy 调用开销高于计算本身
+SMALL_BUCKET_SIZE = 32
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, target_points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets，保留首末点与每个桶内三角形面积最大的点"""
+    total = len(y)
+    if total <= target_points or target_points < 3:
+        return np.arange(total)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bucket_size = (total - 2) / (target_points - 2)
+    buckets = np.arange(target_points - 2)
+
+    # 当前桶 [start, end)
+    starts = np.floor(buckets * bucket_size).astype(np.int64) + 1
+    ends = np.minimum(np.floor((buckets + 1) * bucket_size).astype(np.int64) + 1, total - 1)
+    empty = starts >= ends
+    starts[empty] = np.minimum(starts[empty], total - 2)
+    ends[empty] = starts[empty] + 1
+
+    # 下一个桶的均值 (前缀和，先减去首值降低累加误差)
+    next_starts = np.minimum(np.floor((buckets + 1) * bucket_size).astype(np.int64) + 1, total - 1)
+    next_ends = np.minimum(np.floor((buckets + 2) * bucket_size).astype(np.int64) + 1, total)
+    empty = next_starts >= next_ends
+    next_starts[empty] = total - 2
+    next_ends[empty] = total - 1
+    x_sums = np.concatenate(([0.0], np.cumsum(x - x[0])))
+    y_sums = np.concatenate(([0.0], np.cumsum(y - y[0])))
+    counts = next_ends - next_starts
+    avg_x = (x_sums[next_ends] - x_sums[next_starts]) / counts + x[0]
+    avg_y = (y_sums[next_ends] - y_sums[next_starts]) / counts + y[0]
+
+    indices = np.empty(target_points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = total - 1
+    if bucket_size <= SMALL_BUCKET_SIZE:
+        indices[1:-1] = _lttb_small_buckets(x, y, starts, ends, avg_x, avg_y)
+        return indices
+
+    a = 0
+    for i in range(target_points - 2):
+        start, end = starts[i], ends[i]
+        a_x, a_y = x[a], y[a]
+        # 三角形面积 (省略常数 0.5)，通过面积甄别最能代表趋势的点
+        area = np.abs((a_x - avg_x[i]) * (y[start:end] - a_y) - (a_x - x[start:end]) * (avg_y[i] - a_y))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def _lttb_small_buckets(x, y, starts, ends, avg_x, avg_y) -> list:
+    """LTTB 主循环的纯 Python 版本，与 numpy 版本选点一致 (面积相同时取靠前的点)"""
+    xs, ys = x.tolist(), y.tolist()
+    picked = []
+    a = 0
+    for start, end, next_x, next_y in zip(starts.tolist(), ends.tolist(), avg_x.tolist(), avg_y.tolist()):
+        a_x, a_y = xs[a], ys[a]
+        dx, dy = a_x - next_x, next_y - a_y
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs(dx * (ys[j] - a_y) - (a_x - xs[j]) * dy)
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        picked.append(a)
+    return picked
+
+
+def m4_indices(y: np.ndarray, columns: int) -> np.ndarray:
+    """M4：每个像素列保留首、末、最小、最大四个点，折线渲染与原始数据逐像素一致"""
+    total = len(y)
+    if total <= 4 * columns or columns < 1:
+        return np.arange(total)
+
+    y = np.asarray(y, dtype=np.float64)
+    starts = (np.arange(columns) * total) // columns
+    ends = np.append(starts[1:], total)
+    sizes = ends - starts
+
+    # 先按列求极值，再定位每列中第一个取到极值的下标；NaN 列退化为首点
+    picked = [starts, ends - 1]
+    for reduce in (np.fmin, np.fmax):
+        extremes = reduce.reduceat(y, starts)
+        hits = np.flatnonzero(y == np.repeat(extremes, sizes))
+        if hits.size == 0:
+            picked.append(starts)
+            continue
+        position = np.minimum(np.searchsorted(hits, starts), hits.size - 1)
+        found = hits[position]
+        picked.append(np.where((found >= starts) & (found < ends), found, starts))
+
+    return np.unique(np.concatenate(picked))
+
+
+def minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """按等长块保留每块最小、最大值的下标 (含首末点)，作为 LTTB 之前的 O(n) 粗筛"""
+    total = len(y)
+    if total <= 2 * buckets or buckets < 1:
+        return np.arange(total)
+
+    y = np.asarray(y)
+    size = -(-total // buckets)
+    full = total // size * size
+    blocks = y[:full].reshape(-1, size)
+    offsets = np.arange(blocks.shape[0]) * size
+    picked = [offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1), np.array([0, total - 1])]
+    if full < total:
+        tail = y[full:]
+        picked.append(np.array([full + tail.argmin(), full + tail.argmax()]))
+    return np.unique(np.concatenate(picked))
+
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, max_points: int, method: str = "lttb") -> np.ndarray:
+    """按最大点数选择采样下标，点数不超过 max_points 时返回全部下标"""
+    if method == "m4":
+        return m4_indices(y, max_points // 4)
+    if method != "lttb":
+        raise ValueError(f"Unsupported downsample method: {method}")
+    return lttb_indices(x, y, max_points)
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+
+# 需携带令牌访问的数据只允许浏览器私有缓存，且每次使用前回源校验
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """由版本要素生成强ETag"""
+
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def query_fingerprint(request: Request) -> str:
+    """与顺序无关的查询参数指纹，处理参数变化时ETag随之变化"""
+
+    return repr(sorted(request.query_params.multi_items()))
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """判断 If-None-Match 是否命中（按弱比较规则）"""
+
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE_CACHE_CONTROL) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def cache_headers(
+    etag: Optional[str],
+    cache_control: str = REVALIDATE_CACHE_CONTROL,
+) -> Dict[str, str]:
+    """直接返回 Response 对象的接口使用的缓存响应头"""
+
+    headers = {"Cache-Control": cache_control}
+    if etag:
+        headers["ETag"] = etag
+    return headers
+
+
+def set_cache_headers(
+    response: Response,
+    etag: Optional[str],
+    cache_control: str = REVALIDATE_CACHE_CONTROL,
+) -> None:
+    response.headers.update(cache_headers(etag, cache_control))
@@ -1,14 +1,41 @@
 from __future__ import annotations
 
 from functools import wraps
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Iterable, List, Optional
 
 from fastapi import HTTPException, Request
 
+from app.config.permissions import ALL_PERMISSIONS, PERMISSION_BITS
+
+
+def encode_permissions(permissions: Iterable[str]) -> int:
+    """将权限列表编码为位掩码（未注册的权限被忽略）"""
+
+    mask = 0
+    for permission in permissions:
+        mask |= PERMISSION_BITS.get(permission, 0)
+    return mask
+
+
+def decode_permissions(mask: int) -> List[str]:
+    """将位掩码还原为按注册顺序排列的权限列表"""
+
+    return [key for key in ALL_PERMISSIONS if mask & PERMISSION_BITS[key]]
+
+
+def has_permission(request: Request, permission: str) -> bool:
+    """基于位掩码判断当前请求是否具备权限"""
+
+    bit = PERMISSION_BITS.get(permission, 0)
+    return bool(bit and getattr(request.state, "permission_mask", 0) & bit)
+
 
 def require_permission(permission: str) -> Callable:
     """权限检查装饰器"""
 
+    # 装饰时预先计算权限位，请求时只需一次位运算
+    bit = PERMISSION_BITS.get(permission, 0)
+
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         async def wrapper(*args: Any, **kwargs: Any) -> Any:
@@ -25,8 +52,8 @@ def require_permission(permission: str) -> Callable:
             if request is None:
                 raise HTTPException(status_code=500, detail="内部错误：未找到请求上下文")
 
-            user_permissions = getattr(request.state, "permissions", [])
-            if permission not in user_permissions:
+            user_mask = getattr(request.state, "permission_mask", 0)
+            if not bit or not user_mask & bit:
                 raise HTTPException(status_code=403, detail=f"权限不足，需要权限: {permission}")
 
             return await func(*args, **kwargs)
@@ -0,0 +1,41 @@
+"""基于 orjson 的 JSON 响应，numpy 数组与标量直接序列化，无需 tolist()"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import orjson
+from bson import ObjectId
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    """orjson 无法原生处理的类型"""
+
+    if isinstance(value, np.ndarray):
+        # 非C连续数组或 float16 等 orjson 不支持的 dtype
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """默认响应类；重型接口直接返回该响应以跳过 jsonable_encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,170 @@
+"""波形数值的紧凑编码：float32 / int16 量化 (可选差分与 zlib 压缩)
+
+压缩前按字节重排 (与HDF5 shuffle 过滤器相同，先放所有低字节再放高字节)，
+差分后的高字节几乎全为 0/0xFF，压缩率明显提高。
+编码后的序列为 JSON 对象，数据以 base64 传输并附带误差报告；
+时间轴、拐点等下标类数据不经过此处，始终保持精确。
+"""
+
+from __future__ import annotations
+
+import base64
+import zlib
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+PRECISIONS = ("float64", "float32", "int16")
+# 量化使用对称区间 [-32767, 32767]，-32768 保留给 NaN
+INT16_LIMIT = 32767
+INT16_NAN = -32768
+# 字节重排后 level 1 与 6 的压缩率接近，速度约快一倍
+ZLIB_LEVEL = 1
+MAX_DELTA_ORDER = 2
+# 波形与瓦片中需要编码的数值字段
+ENCODED_FIELDS = ("values", "min", "max")
+
+
+def _error_report(original: np.ndarray, decoded: np.ndarray, bound: float) -> Dict[str, float]:
+    """误差报告：最大/均方根绝对误差、理论上界及相对信号幅度的最大误差"""
+    finite = np.isfinite(original)
+    if not finite.any():
+        return {"maxAbsError": 0.0, "rmsError": 0.0, "errorBound": 0.0, "relativeError": 0.0}
+
+    error = np.abs(decoded[finite] - original[finite])
+    value_range = float(original[finite].max() - original[finite].min())
+    max_error = float(error.max())
+    return {
+        "maxAbsError": max_error,
+        "rmsError": float(np.sqrt(np.mean(error ** 2))),
+        "errorBound": float(bound),
+        "relativeError": max_error / value_range if value_range > 0 else 0.0,
+    }
+
+
+def _pack(array: np.ndarray, compress: bool) -> Dict[str, Any]:
+    if compress:
+        shuffled = array.view(np.uint8).reshape(-1, array.dtype.itemsize).T
+        data = zlib.compress(np.ascontiguousarray(shuffled).tobytes(), ZLIB_LEVEL)
+    else:
+        data = array.tobytes()
+    return {
+        "compression": "zlib" if compress else "none",
+        "shuffle": compress,
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def _unpack(payload: Dict[str, Any], dtype: str) -> np.ndarray:
+    data = base64.b64decode(payload["data"])
+    if payload["compression"] == "zlib":
+        data = zlib.decompress(data)
+    itemsize = np.dtype(dtype).itemsize
+    if payload.get("shuffle"):
+        data = np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1).T.tobytes()
+    return np.frombuffer(data, dtype=dtype)
+
+
+def quantize_int16(values: np.ndarray) -> Dict[str, Any]:
+    """按序列的取值范围量化到 int16，返回 offset/scale 与量化值"""
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    if finite.any():
+        low = float(values[finite].min())
+        high = float(values[finite].max())
+    else:
+        low = high = 0.0
+
+    offset = (low + high) / 2
+    scale = (high - low) / (2 * INT16_LIMIT) if high > low else 1.0
+    quantized = np.zeros(len(values), dtype=np.int16)
+    quantized[finite] = np.clip(np.rint((values[finite] - offset) / scale), -INT16_LIMIT, INT16_LIMIT)
+    quantized[~finite] = INT16_NAN
+    return {"offset": offset, "scale": scale, "quantized": quantized}
+
+
+def encode_series(
+    values: np.ndarray,
+    precision: str = "float64",
+    delta: int = 1,
+    compress: bool = True,
+) -> Any:
+    """编码一条数值序列；float64 原样返回数组
+
+    delta 为 int16 的差分阶数：0 不差分，1 适合含噪声的原始信号，2 适合平滑的滤波信号。
+    """
+    if precision == "float64":
+        return values
+
+    values = np.asarray(values, dtype=np.float64)
+    if precision == "float32":
+        encoded = values.astype("<f4")
+        payload = {
+            "encoding": "float32",
+            "count": int(len(values)),
+            "error": _error_report(values, encoded.astype(np.float64), 0.0),
+        }
+        payload.update(_pack(encoded, compress))
+        return payload
+
+    if precision != "int16":
+        raise ValueError(f"Unsupported precision: {precision}")
+    if not 0 <= delta <= MAX_DELTA_ORDER:
+        raise ValueError(f"Unsupported delta order: {delta}")
+
+    result = quantize_int16(values)
+    quantized = result["quantized"]
+    decoded = result["offset"] + quantized.astype(np.float64) * result["scale"]
+    # 差分按 16 位回绕，解码端逐阶累加时同样回绕即可还原
+    stored = quantized
+    for _ in range(delta):
+        stored = np.diff(stored, prepend=np.int16(0))
+    stored = stored.astype("<i2")
+    payload = {
+        "encoding": "int16",
+        "count": int(len(values)),
+        "offset": result["offset"],
+        "scale": result["scale"],
+        "delta": delta,
+        "error": _error_report(values, decoded, result["scale"] / 2),
+    }
+    payload.update(_pack(stored, compress))
+    return payload
+
+
+def decode_series(payload: Any) -> np.ndarray:
+    """解码 encode_series 的结果 (用于测试与离线校验)"""
+    if not isinstance(payload, dict):
+        return np.asarray(payload, dtype=np.float64)
+
+    if payload["encoding"] == "float32":
+        return _unpack(payload, "<f4").astype(np.float64)
+
+    quantized = _unpack(payload, "<i2")
+    for _ in range(payload["delta"]):
+        quantized = np.cumsum(quantized, dtype=np.int16)
+    decoded = payload["offset"] + quantized.astype(np.float64) * payload["scale"]
+    decoded[quantized == INT16_NAN] = np.nan
+    return decoded
+
+
+def encode_waveform(waveform: Dict[str, Any], precision: str, delta: int = 1) -> Dict[str, Any]:
+    """对波形/瓦片响应中 raw/filtered 的数值 (values 或 min/max) 编码，时间轴与下标保持不变"""
+    if precision == "float64":
+        return waveform
+
+    encoded = dict(waveform)
+    for series in ("raw", "filtered"):
+        encoded[series] = dict(waveform[series])
+        for field in ENCODED_FIELDS:
+            if field in encoded[series]:
+                encoded[series][field] = encode_series(waveform[series][field], precision, delta)
+    return encoded
+
+
+def pixel_error(report: Dict[str, float], height_px: int) -> Optional[float]:
+    """按满幅显示高度换算的最大误差 (像素)，小于 0.5 即视觉无损"""
+    relative = report.get("relativeError")
+    if relative is None:
+        return None
+    return relative * height_px
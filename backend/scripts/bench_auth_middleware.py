@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""认证中间件单请求开销基准：旧版 BaseHTTPMiddleware 与纯ASGI实现对比"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import settings  # noqa: E402
+from app.config.permissions import ROLE_PRESETS  # noqa: E402
+from app.middleware.auth import AuthMiddleware  # noqa: E402
+from app.services.auth_service import AuthService  # noqa: E402
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """改造前的实现：每次请求新建 AuthService 并完整验签"""
+
+    EXCLUDE_PATHS = AuthMiddleware.EXCLUDE_PATHS
+
+    async def dispatch(self, request: Request, call_next):  # type: ignore[override]
+        if request.url.path in self.EXCLUDE_PATHS or request.url.path.startswith("/docs"):
+            return await call_next(request)
+
+        auth_header = request.headers.get("Authorization")
+        if not auth_header or not auth_header.startswith("Bearer "):
+            return JSONResponse(status_code=401, content={"detail": "未提供认证令牌"})
+
+        token = auth_header.split(" ")[1]
+        auth_service = AuthService(
+            secret_key=settings.JWT_SECRET_KEY,
+            algorithm=settings.JWT_ALGORITHM,
+            expiration_days=settings.JWT_EXPIRATION_DAYS,
+        )
+
+        payload = auth_service.verify_token(token)
+        if not payload:
+            return JSONResponse(status_code=401, content={"detail": "令牌无效或已过期"})
+
+        request.state.user_id = payload["sub"]
+        request.state.permissions = payload["permissions"]
+        return await call_next(request)
+
+
+async def _endpoint(request: Request) -> PlainTextResponse:
+    return PlainTextResponse("ok")
+
+
+def _build_app(middleware_cls) -> Starlette:
+    app = Starlette(routes=[Route("/api/annotations/sync", _endpoint, methods=["POST"])])
+    app.add_middleware(middleware_cls)
+    return app
+
+
+async def _run(app: Starlette, token: str, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/annotations/sync",
+        "raw_path": b"/api/annotations/sync",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+
+    def make_receive():
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+        disconnected = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # 模拟连接保持，直到响应结束被取消
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        return receive
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message["status"]
+
+    # 预热 (包括令牌缓存)
+    for _ in range(100):
+        await app(dict(scope), make_receive(), send)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), make_receive(), send)
+    return (time.perf_counter() - start) / requests
+
+
+async def main(requests: int) -> None:
+    auth_service = AuthService(secret_key=settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    token = auth_service.create_access_token(
+        user_id="bench-user",
+        username="bench",
+        role_id="role-admin",
+        role_name="admin",
+        permissions=ROLE_PRESETS["admin"],
+    )
+
+    baseline = await _run(_build_app(LegacyAuthMiddleware), token, requests)
+    current = await _run(_build_app(AuthMiddleware), token, requests)
+
+    print(f"请求数: {requests}")
+    print(f"BaseHTTPMiddleware + 每次验签: {baseline * 1e6:8.1f} µs/请求")
+    print(f"纯ASGI + 令牌缓存:             {current * 1e6:8.1f} µs/请求")
+    print(f"单请求开销降低:                 {baseline / current:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="认证中间件开销基准")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
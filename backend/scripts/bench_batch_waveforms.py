@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""多Trial波形：逐Trial请求与批量接口 (单文件句柄 + 并行处理) 的冷缓存耗时对比"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.cache_service import MemoryCacheBackend  # noqa: E402
+from app.services.h5_service import H5Service  # noqa: E402
+from app.services.single_flight import SingleFlight  # noqa: E402
+
+
+def _write_file(path: Path, trials: int, samples: int) -> None:
+    rng = np.random.default_rng(0)
+    with h5py.File(path, "w") as f:
+        for index in range(trials):
+            group = f.create_group(f"trial_{index}")
+            t = np.arange(samples) / 1000.0
+            group["sensor"] = np.sin(2 * np.pi * 2 * t) + 0.05 * rng.standard_normal(samples)
+            group["timestamps"] = (np.arange(samples) // 100) * 100.0
+
+
+def _service(root: Path) -> H5Service:
+    service = H5Service(cache=MemoryCacheBackend(max_bytes=2 * 1024 ** 3), single_flight=SingleFlight())
+    service.data_root = root
+    return service
+
+
+async def _per_trial(root: Path, path: str, trials: int, max_points: int) -> float:
+    service = _service(root)
+    started = time.perf_counter()
+    # 与前端并发发出的逐Trial请求相同
+    await asyncio.gather(*(
+        service.get_waveform_window(path, index, max_points=max_points) for index in range(trials)
+    ))
+    elapsed = time.perf_counter() - started
+    service.shutdown()
+    return elapsed
+
+
+async def _batch(root: Path, path: str, trials: int, max_points: int) -> float:
+    service = _service(root)
+    started = time.perf_counter()
+    async for _ in service.iter_waveform_windows(path, list(range(trials)), max_points=max_points):
+        pass
+    elapsed = time.perf_counter() - started
+    service.shutdown()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=200_000)
+    parser.add_argument("--max-points", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        path = root / "bench.h5"
+        _write_file(path, args.trials, args.samples)
+
+        per_trial = asyncio.run(_per_trial(root, str(path), args.trials, args.max_points))
+        batch = asyncio.run(_batch(root, str(path), args.trials, args.max_points))
+
+    print(f"{args.trials} 个Trial × {args.samples} 点，每条 {args.max_points} 点 (冷缓存)")
+    print(f"逐Trial并发请求: {per_trial * 1000:8.1f} ms")
+    print(f"批量接口:        {batch * 1000:8.1f} ms ({per_trial / batch:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""并发登录负载测试：bcrypt 内联执行与专用线程池对事件循环延迟的影响"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+import bcrypt
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.password_service import PasswordHasher  # noqa: E402
+
+
+async def _probe_latency(stop: asyncio.Event, interval: float, samples: List[float]) -> None:
+    """模拟波形请求：按固定间隔调度，记录实际被调度的延迟"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def _run(label: str, login, logins: int, interval: float) -> None:
+    samples: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_latency(stop, interval, samples))
+    await asyncio.sleep(interval * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1000 if len(samples) > 1 else p50
+    worst = samples[-1] * 1000
+    print(
+        f"{label:<10} 登录总耗时 {elapsed:6.2f}s | 事件循环延迟 "
+        f"p50 {p50:7.1f}ms  p99 {p99:7.1f}ms  max {worst:7.1f}ms"
+    )
+
+
+async def main(logins: int, rounds: int, workers: int, interval: float) -> None:
+    password = "correct horse battery staple"
+    password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)).decode()
+    hasher = PasswordHasher(rounds=rounds, max_workers=workers)
+
+    async def inline_login() -> bool:
+        # 改造前：在协程中直接调用 bcrypt
+        return bcrypt.checkpw(password.encode(), password_hash.encode())
+
+    async def pooled_login() -> bool:
+        return await hasher.verify(password, password_hash)
+
+    print(f"并发登录 {logins} 次, bcrypt rounds={rounds}, 线程池 workers={workers}")
+    await _run("内联", inline_login, logins, interval)
+    await _run("线程池", pooled_login, logins, interval)
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并发登录对事件循环延迟的影响")
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--interval", type=float, default=0.01, help="模拟请求调度间隔（秒）")
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.rounds, args.workers, args.interval))
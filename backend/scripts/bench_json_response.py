@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""200个Trial的 list_trials 响应：序列化耗时与传输字节数对比"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import settings  # noqa: E402
+from app.utils.responses import dumps  # noqa: E402
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+def _build_trials(count: int, points: int, as_numpy: bool) -> List[Dict]:
+    """与 _load_trials 输出一致的元数据，缩略图为平滑信号加噪声"""
+
+    rng = np.random.default_rng(0)
+    trials = []
+    for index in range(count):
+        t = np.linspace(0, 10_000, points)
+        raw = np.sin(t / 500.0 + index) + 0.05 * rng.standard_normal(points)
+        filtered = np.sin(t / 500.0 + index)
+        thumbnail = {"timestamps": t, "raw": raw, "filtered": filtered}
+        if not as_numpy:
+            thumbnail = {key: value.tolist() for key, value in thumbnail.items()}
+        trials.append({
+            "trialIndex": index,
+            "duration": 10.0,
+            "sampleRate": 1000.0,
+            "dataPoints": 10_000,
+            "thumbnail": thumbnail,
+            "fileId": "subject_01/session_01.h5",
+            "finished": index % 3 == 0,
+            "finishedAt": None,
+            "annotationCount": index % 7,
+            "versionCount": index % 2,
+        })
+    return trials
+
+
+def _legacy_encode(content: List[Dict]) -> bytes:
+    """FastAPI 默认路径：jsonable_encoder + JSONResponse.render"""
+
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _measure(func: Callable[[], bytes], repeat: int) -> tuple[float, bytes]:
+    best = float("inf")
+    result = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--points", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    as_lists = _build_trials(args.trials, args.points, as_numpy=False)
+    as_arrays = _build_trials(args.trials, args.points, as_numpy=True)
+
+    print(f"list_trials: {args.trials} trials × 3 × {args.points} 点")
+    print(f"{'encoder':<28}{'encode ms':>12}{'bytes':>12}")
+    cases = [
+        ("jsonable_encoder+json", lambda: _legacy_encode(as_lists)),
+        ("orjson (lists)", lambda: dumps(as_lists)),
+        ("orjson (numpy)", lambda: dumps(as_arrays)),
+    ]
+    body = b""
+    for name, func in cases:
+        elapsed, body = _measure(func, args.repeat)
+        print(f"{name:<28}{elapsed:>12.2f}{len(body):>12,}")
+
+    print()
+    print(f"{'wire encoding':<28}{'compress ms':>12}{'bytes':>12}{'ratio':>8}")
+    encodings = [
+        (f"gzip (level {settings.GZIP_COMPRESS_LEVEL})",
+         lambda: gzip.compress(body, compresslevel=settings.GZIP_COMPRESS_LEVEL)),
+    ]
+    if brotli is not None:
+        encodings.append((
+            f"br (quality {settings.BROTLI_QUALITY})",
+            lambda: brotli.compress(body, quality=settings.BROTLI_QUALITY),
+        ))
+    for name, func in encodings:
+        elapsed, compressed = _measure(func, args.repeat)
+        print(f"{name:<28}{elapsed:>12.2f}{len(compressed):>12,}{len(body) / len(compressed):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""超长Trial元数据生成的峰值内存对比：整段预处理与分块预处理"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.cache_service import MemoryCacheBackend  # noqa: E402
+from app.services.h5_service import H5Service  # noqa: E402
+from app.services.single_flight import SingleFlight  # noqa: E402
+
+
+def _write_trial(path: Path, samples: int) -> None:
+    rng = np.random.default_rng(0)
+    with h5py.File(path, "w") as f:
+        group = f.create_group("trial_0")
+        sensor = group.create_dataset("sensor", shape=(samples,), dtype=np.float64, chunks=(1 << 16,))
+        timestamps = group.create_dataset("timestamps", shape=(samples,), dtype=np.float64, chunks=(1 << 16,))
+        for start in range(0, samples, 1 << 20):
+            end = min(start + (1 << 20), samples)
+            t = np.arange(start, end) / 1000.0
+            sensor[start:end] = np.sin(2 * np.pi * 2 * t) + 0.05 * rng.standard_normal(end - start)
+            timestamps[start:end] = (np.arange(start, end) // 100) * 100.0
+
+
+def _measure(service: H5Service, path: Path) -> tuple[float, float]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    service.load_trial_metadata(str(path), 0)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=20_000_000)
+    parser.add_argument("--chunk", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "long.h5"
+        _write_trial(path, args.samples)
+        print(f"Trial: {args.samples:,} 个采样点，分块 {args.chunk:,}")
+
+        for label, threshold in (("整段预处理", args.samples + 1), ("分块预处理", 1)):
+            service = H5Service(cache=MemoryCacheBackend(max_bytes=1024), single_flight=SingleFlight())
+            service.dataset_write = False
+            service.derived_cache_dir = Path(tmp) / f"derived-{threshold}"
+            service.streaming_min_samples = threshold
+            service.chunk_samples = args.chunk
+            elapsed, peak = _measure(service, path)
+            print(f"  {label}: {elapsed:6.2f}s  峰值内存 {peak:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Trial缩略图存储格式对比：BSON double 数组与 float32 二进制的体积及解码耗时"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+import bson
+import numpy as np
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.db.repositories.trial_metadata_repo import pack_thumbnail, unpack_thumbnail  # noqa: E402
+from app.utils.responses import dumps  # noqa: E402
+
+
+def _build_documents(count: int, points: int, packed: bool) -> List[bytes]:
+    rng = np.random.default_rng(0)
+    documents = []
+    for index in range(count):
+        t = np.linspace(0, 10_000, points)
+        thumbnail = {
+            "timestamps": t,
+            "raw": np.sin(t / 500.0) + 0.05 * rng.standard_normal(points),
+            "filtered": np.sin(t / 500.0),
+        }
+        thumbnail = pack_thumbnail(thumbnail) if packed else {
+            key: value.tolist() for key, value in thumbnail.items()
+        }
+        documents.append(bson.encode({
+            "fileId": "subject_01/session_01.h5",
+            "trialIndex": index,
+            "dataPoints": 10_000,
+            "thumbnail": thumbnail,
+        }))
+    return documents
+
+
+def _measure(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _decode_and_render(documents: List[bytes]) -> bytes:
+    """驱动解码 → 仓储解码 → 响应序列化的完整读路径"""
+
+    decoded: List[Dict] = []
+    for raw in documents:
+        doc = bson.decode(raw)
+        doc["thumbnail"] = unpack_thumbnail(doc["thumbnail"])
+        decoded.append(doc)
+    return dumps(decoded)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trials", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.trials} 个Trial，缩略图 3 × {args.points} 点")
+    print(f"{'format':<16}{'BSON MB':>10}{'bson.decode ms':>16}{'read path ms':>14}")
+    for name, packed in (("double array", False), ("float32 binary", True)):
+        documents = _build_documents(args.trials, args.points, packed)
+        size = sum(len(doc) for doc in documents) / 1024 / 1024
+        decode_ms = _measure(lambda: [bson.decode(doc) for doc in documents], args.repeat)
+        read_ms = _measure(lambda: _decode_and_render(documents), args.repeat)
+        print(f"{name:<16}{size:>10.2f}{decode_ms:>16.1f}{read_ms:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
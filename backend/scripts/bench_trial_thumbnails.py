@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Trial列表冷加载：完整预处理后降采样的缩略图与轻量缩略图流程的耗时及差异对比"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.h5_derived import expand_time_axis  # noqa: E402
+from app.services.h5_service import THUMBNAIL_POINTS, H5Service  # noqa: E402
+from app.utils.downsampling import lttb_indices  # noqa: E402
+
+
+def _write_file(path: Path, trials: int, samples: int) -> None:
+    rng = np.random.default_rng(0)
+    with h5py.File(path, "w") as f:
+        for index in range(trials):
+            group = f.create_group(f"trial_{index}")
+            t = np.arange(samples) / 1000.0
+            signal = np.sin(2 * np.pi * 0.5 * t) + 0.5 * np.sin(2 * np.pi * 8 * t) + (t > t[-1] / 2)
+            group["sensor"] = signal + 0.2 * rng.standard_normal(samples)
+            group["timestamps"] = (np.arange(samples) // 100) * 100.0
+
+
+def _full_pipeline(service: H5Service, path: str, index: int) -> dict:
+    """轻量流程之前的做法：完整预处理 (含拐点、逐采样时间戳) 后分别做 LTTB"""
+    processed = service._prepare_waveform(path, index)
+    raw = processed["raw_values"]
+    timestamps = expand_time_axis(processed["time_axis"], len(raw))
+    filtered = processed["filtered_values"]
+    raw_indices = lttb_indices(timestamps, raw, THUMBNAIL_POINTS)
+    filtered_indices = lttb_indices(timestamps, filtered, THUMBNAIL_POINTS)
+    return {
+        "timestamps": timestamps[raw_indices],
+        "raw": raw[raw_indices],
+        "filtered": filtered[filtered_indices],
+        "fullFiltered": filtered,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        path = str(root / "bench.h5")
+        _write_file(Path(path), args.trials, args.samples)
+        service = H5Service()
+        service.data_root = root
+
+        started = time.perf_counter()
+        full = [_full_pipeline(service, path, index) for index in range(args.trials)]
+        full_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        light = [service.load_trial_metadata(path, index) for index in range(args.trials)]
+        light_elapsed = time.perf_counter() - started
+
+        # 降采样后滤波的结果插值回原采样位置，与全采样率滤波比较 (相对值域，不含首末 1%)
+        errors = []
+        for index, reference in enumerate(full):
+            raw, source_timestamps = service._read_trial_data(path, index)
+            sample_rate, _ = service._time_axis(raw, source_timestamps)
+            positions, filtered, _ = service._decimated_lowpass(raw, sample_rate)
+            expected = reference["fullFiltered"]
+            margin = len(expected) // 100
+            interior = np.arange(margin, len(expected) - margin)
+            deviation = np.abs(np.interp(interior, positions, filtered) - expected[interior])
+            errors.append(deviation.max() / float(np.ptp(expected)))
+
+    print(f"{args.trials} 个Trial × {args.samples} 点 (冷加载)")
+    print(f"完整预处理 + LTTB: {full_elapsed / args.trials * 1000:8.2f} ms/Trial")
+    print(f"轻量缩略图流程:    {light_elapsed / args.trials * 1000:8.2f} ms/Trial ({full_elapsed / light_elapsed:.1f}x)")
+    print(f"滤波缩略图最大偏差: {max(errors) * 100:.2f}% 值域")
+
+
+if __name__ == "__main__":
+    main()
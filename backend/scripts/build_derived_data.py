@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""离线为数据集预先写入 derived/ 派生数据 (滤波信号、时间轴、拐点与金字塔)"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.h5_service import H5Service  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="为H5文件写入派生数据")
+    parser.add_argument("files", nargs="*", help="只处理指定的文件 (相对数据集目录)，默认全部")
+    args = parser.parse_args()
+
+    service = H5Service()
+    # 离线脚本总是写入源文件，不受 ENABLE_DATASET_WRITE 影响；源文件指纹随之变化，各级缓存一次性失效
+    service.dataset_write = True
+    service.source_write = True
+
+    file_ids = args.files or [item["fileId"] for item in service.scan_files()]
+    print(f"🔄 开始为 {len(file_ids)} 个文件写入派生数据 ({service.data_root})")
+
+    failed = 0
+    for file_id in file_ids:
+        file_path = str(service.data_root / file_id)
+        started = time.perf_counter()
+        trial_count = service.load_trial_count(file_path)
+        for trial_index in range(trial_count):
+            try:
+                # 已有且有效的 derived/ 组直接读取，不会重复写入
+                service._prepare_waveform(file_path, trial_index)
+            except Exception as e:
+                failed += 1
+                print(f"   ❌ {file_id} trial {trial_index}: {e}")
+        print(f"   ✅ {file_id}: {trial_count} 个Trial，{time.perf_counter() - started:.1f}s", flush=True)
+
+    print(f"🎉 完成，失败 {failed} 个Trial")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
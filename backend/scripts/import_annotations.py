@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""命令行批量导入标注 (CSV / JSONL)"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import settings  # noqa: E402
+from app.services.annotation_import_service import (  # noqa: E402
+    DEFAULT_BATCH_SIZE,
+    IMPORT_MODES,
+    AnnotationImportJob,
+    detect_format,
+    run_import_job,
+)
+
+
+def _print_progress(job: AnnotationImportJob) -> None:
+    print(
+        f"   已处理 {job.processed_rows} 行，写入 {job.inserted_segments} 条，跳过 {job.skipped_rows} 行",
+        flush=True,
+    )
+
+
+async def import_annotations(args: argparse.Namespace) -> int:
+    """导入标注文件并输出进度"""
+
+    client = AsyncIOMotorClient(settings.MONGODB_URI)
+    db = client[settings.MONGODB_DATABASE]
+
+    try:
+        fmt = detect_format(args.path, args.format)
+
+        template = await db["event_templates"].find_one({"_id": ObjectId(args.template_id)})
+        if not template:
+            print(f"❌ 模板不存在: {args.template_id}")
+            return 1
+
+        user = await db["users"].find_one({"username": args.username, "is_deleted": False})
+        if not user:
+            print(f"❌ 用户不存在: {args.username}")
+            return 1
+
+        job = AnnotationImportJob(
+            file_name=args.path,
+            template_id=args.template_id,
+            user_id=str(user["_id"]),
+            mode=args.mode,
+        )
+
+        print(f"🔄 开始导入 {args.path} (格式: {fmt}, 模式: {args.mode})")
+        await run_import_job(
+            db,
+            job,
+            path=args.path,
+            fmt=fmt,
+            template=template,
+            username=user["username"],
+            batch_size=args.batch_size,
+            remove_source=False,
+            on_progress=_print_progress,
+        )
+
+        if job.status != "completed":
+            print(f"❌ 导入失败: {job.message}")
+            return 1
+
+        for error in job.errors:
+            print(f"   ⚠️  第 {error['line']} 行: {error['message']}")
+        print(
+            f"🎉 导入完成: 写入 {job.inserted_segments} 条标注，"
+            f"涉及 {job.version_count} 个版本，跳过 {job.skipped_rows} 行"
+        )
+        return 0
+
+    finally:
+        client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量导入标注")
+    parser.add_argument("path", help="CSV 或 JSONL 文件路径")
+    parser.add_argument("--template-id", required=True, help="用于校验阶段的模板ID")
+    parser.add_argument("--username", required=True, help="导入后标注归属的用户名")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None, help="默认按扩展名推断")
+    parser.add_argument("--mode", choices=IMPORT_MODES, default="replace", help="replace 覆盖已有版本，append 追加")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="每批写入的标注数量")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(import_annotations(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""将 trial_metadata 中以 double 数组保存的缩略图迁移为 float32 二进制"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+import bson
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import settings  # noqa: E402
+from app.db.repositories.trial_metadata_repo import pack_thumbnail  # noqa: E402
+
+# 任一序列仍为数组即视为旧格式
+LEGACY_QUERY = {
+    "$or": [
+        {"thumbnail.timestamps": {"$type": "array"}},
+        {"thumbnail.raw": {"$type": "array"}},
+        {"thumbnail.filtered": {"$type": "array"}},
+    ]
+}
+
+
+async def migrate_thumbnails(args: argparse.Namespace) -> int:
+    """分批改写旧格式缩略图并统计体积变化"""
+
+    client = AsyncIOMotorClient(settings.MONGODB_URI)
+    collection = client[settings.MONGODB_DATABASE].trial_metadata
+
+    try:
+        total = await collection.count_documents(LEGACY_QUERY)
+        if total == 0:
+            print("✅ 没有需要迁移的缩略图")
+            return 0
+
+        print(f"🔄 待迁移 {total} 条Trial元数据{' (仅统计)' if args.dry_run else ''}")
+
+        migrated = 0
+        before_bytes = 0
+        after_bytes = 0
+        batch = []
+
+        async def flush() -> None:
+            nonlocal migrated
+            if not batch:
+                return
+            if not args.dry_run:
+                await collection.bulk_write(batch, ordered=False)
+            migrated += len(batch)
+            batch.clear()
+            print(f"   已处理 {migrated}/{total}", flush=True)
+
+        cursor = collection.find(LEGACY_QUERY, projection={"thumbnail": 1})
+        async for doc in cursor:
+            packed = pack_thumbnail(doc["thumbnail"])
+            before_bytes += len(bson.encode({"thumbnail": doc["thumbnail"]}))
+            after_bytes += len(bson.encode({"thumbnail": packed}))
+            # 过滤条件再次匹配旧格式，避免与并发写入互相覆盖
+            batch.append(UpdateOne({"_id": doc["_id"], **LEGACY_QUERY}, {"$set": {"thumbnail": packed}}))
+            if len(batch) >= args.batch_size:
+                await flush()
+        await flush()
+
+        ratio = before_bytes / after_bytes if after_bytes else 0
+        print(
+            f"🎉 迁移完成: {migrated} 条，缩略图 {before_bytes / 1024 / 1024:.1f} MB → "
+            f"{after_bytes / 1024 / 1024:.1f} MB ({ratio:.1f}x)"
+        )
+        return 0
+
+    finally:
+        client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="迁移Trial缩略图存储格式")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批写入的文档数量")
+    parser.add_argument("--dry-run", action="store_true", help="只统计体积变化，不写入")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(migrate_thumbnails(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""int16 量化误差报告：逐Trial统计误差与传输体积，确认显示上视觉无损"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import Dict, List
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.h5_service import H5Service  # noqa: E402
+from app.utils.responses import dumps  # noqa: E402
+from app.utils.waveform_encoding import encode_series, pixel_error  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="*", help="只检查指定的文件 (相对数据集目录)，默认全部")
+    parser.add_argument("--max-trials", type=int, default=5, help="每个文件最多检查的Trial数")
+    parser.add_argument("--height", type=int, default=2160, help="按该显示高度 (像素) 换算误差")
+    args = parser.parse_args()
+
+    service = H5Service()
+    file_ids = args.files or [item["fileId"] for item in service.scan_files()]
+    totals: Dict[str, int] = {"float64": 0, "float32": 0, "int16": 0}
+    worst: List[float] = []
+
+    print(f"{'文件/Trial':<48} {'序列':<9} {'最大误差':>12} {'相对误差':>10} {'像素误差':>9}")
+    for file_id in file_ids:
+        file_path = str(service.data_root / file_id)
+        for trial_index in range(min(service.load_trial_count(file_path), args.max_trials)):
+            waveform = service.preprocess_waveform(file_path, trial_index, timestamps="compact")
+            for series, delta in (("raw", 1), ("filtered", 2)):
+                values = waveform[series]["values"]
+                quantized = encode_series(values, "int16", delta=delta)
+                report = quantized["error"]
+                px = pixel_error(report, args.height)
+                worst.append(px)
+                totals["float64"] += len(dumps(values))
+                totals["float32"] += len(dumps(encode_series(values, "float32")))
+                totals["int16"] += len(dumps(quantized))
+                print(
+                    f"{file_id + ' #' + str(trial_index):<48} {series:<9} "
+                    f"{report['maxAbsError']:>12.3e} {report['relativeError']:>10.2e} {px:>9.4f}"
+                )
+
+    if not worst:
+        print("⚠️  没有可检查的Trial")
+        return
+
+    print(
+        f"\n最大像素误差 {max(worst):.4f} px (满幅 {args.height} px)，"
+        f"{'视觉无损' if max(worst) < 0.5 else '⚠️  可能可见'}"
+    )
+    print(
+        f"传输体积: float64 JSON {totals['float64'] / 1e6:.1f} MB，"
+        f"float32 {totals['float32'] / 1e6:.1f} MB，int16 {totals['int16'] / 1e6:.1f} MB "
+        f"({totals['float32'] / max(totals['int16'], 1):.1f}x 小于 float32)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""批量校验Trial元数据：重算源文件或预处理参数已变化的Trial，并补算缺少的特征向量"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+from typing import Any, Dict
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# 将项目根目录加入搜索路径，便于复用应用配置
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import settings  # noqa: E402
+from app.services import h5_service  # noqa: E402
+from app.services.metadata_revalidation_service import MetadataRevalidator  # noqa: E402
+
+
+def _print_progress(summary: Dict[str, Any]) -> None:
+    print(
+        f"   已检查 {summary['files']} 个文件，{summary['changedFiles']} 个有变化，"
+        f"重算 {summary['refreshed']} 个Trial，补算 {summary['features']} 个特征",
+        flush=True,
+    )
+
+
+async def revalidate(args: argparse.Namespace) -> int:
+    client = AsyncIOMotorClient(settings.MONGODB_URI)
+    db = client[settings.MONGODB_DATABASE]
+    revalidator = MetadataRevalidator(args.concurrency)
+
+    try:
+        print(f"🔄 开始校验 {h5_service.data_root} 下的Trial元数据")
+        summary = await revalidator.revalidate(db, on_progress=_print_progress)
+        print(
+            f"🎉 校验完成: {summary['files']} 个文件，{summary['changedFiles']} 个有变化，"
+            f"重算 {summary['refreshed']} 个Trial，补算 {summary['features']} 个特征，失败 {summary['failed']} 个，"
+            f"删除 {summary['removed']} 条多余元数据"
+        )
+        return 1 if summary["failed"] else 0
+
+    finally:
+        h5_service.shutdown()
+        client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量校验Trial元数据")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.H5_COMPUTE_WORKERS,
+        help="并发重算的Trial数量 (离线运行时可用满计算线程)",
+    )
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(revalidate(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -88,6 +88,7 @@ export default function TrialList() {
   const {
     trials,
     trialsLoading,
+    trialsStreaming,
     trialsError,
     selectedFile,
     selectedTrial,
@@ -95,6 +96,7 @@ export default function TrialList() {
   } = useWorkspaceStore((state) => ({
     trials: state.trials,
     trialsLoading: state.trialsLoading,
+    trialsStreaming: state.trialsStreaming,
     trialsError: state.trialsError,
     selectedFile: state.selectedFile,
     selectedTrial: state.selectedTrial,
@@ -258,6 +260,11 @@ export default function TrialList() {
             })}
             </ul>
           )}
+          {trialsStreaming && trials.length > 0 && (
+            <div className="px-4 py-2 text-center text-xs text-gray-400">
+              正在加载 {trials.length}/{selectedFile.trialCount ?? '?'}
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -1,5 +1,133 @@
 import { apiClient } from './api'
-import type { FileInfo, TrialMetadata, WaveformResponse } from '../types/waveform'
+import type {
+  CompactTimeAxis,
+  CompactWaveformResponse,
+  EncodedSeries,
+  FileInfo,
+  TileLayout,
+  TrialMetadata,
+  WaveformTile,
+  WaveformResponse,
+  WaveformWindowResponse,
+} from '../types/waveform'
+
+export interface TrialStreamOptions {
+  offset?: number
+  limit?: number
+  signal?: AbortSignal
+}
+
+// fields 为字段组：status / summary / counts / thumbnail / thumbnail.raw / thumbnail.filtered
+export interface TrialQuery {
+  offset?: number
+  limit?: number
+  fields?: string[]
+  // 按特征排序 (如 -rms) 与筛选 (如 rms>=0.5)，尚未计算特征的Trial (featuresPending) 排在最后
+  sort?: string
+  filters?: string[]
+}
+
+// 视口波形：maxPoints 通常取图表宽度 (像素)，窗口足够窄时服务端直接返回原始采样
+export interface WaveformWindowQuery {
+  start?: number
+  end?: number
+  maxPoints?: number
+  method?: 'lttb' | 'm4'
+  signal?: AbortSignal
+}
+
+export interface TrialStreamResult {
+  total: number
+  // 服务繁忙 (503) 时未返回任何Trial，retryAfter 为建议的重试秒数
+  busy: boolean
+  retryAfter?: number
+}
+
+// 服务端渲染的缩略图雪碧图：第 i 行 (高 height) 对应 offset + i 号Trial，url 用完后需 URL.revokeObjectURL
+export interface SparklineSprite {
+  url: string
+  offset: number
+  count: number
+  width: number
+  height: number
+  version: string
+  // 加载失败 (对应行为空) 的Trial，非空时该图片未被缓存，稍后应重新请求
+  failed: number[]
+}
+
+// int16 量化中保留给 NaN 的值
+const INT16_NAN = -32768
+
+// 断点之间线性插值，与后端 expand_time_axis 一致
+export function expandTimeAxis(axis: CompactTimeAxis): number[] {
+  const timestamps = new Array<number>(axis.count)
+  if (axis.type === 'uniform') {
+    for (let i = 0; i < axis.count; i++) {
+      timestamps[i] = axis.t0 + i / axis.sampleRate
+    }
+    return timestamps
+  }
+
+  const { indices, seconds } = axis
+  let segment = 0
+  for (let i = 0; i < axis.count; i++) {
+    while (segment < indices.length - 2 && i >= indices[segment + 1]) {
+      segment++
+    }
+    const startIndex = indices[segment]
+    const endIndex = indices[segment + 1]
+    if (endIndex === undefined || i <= startIndex) {
+      timestamps[i] = seconds[segment]
+    } else if (i >= endIndex) {
+      timestamps[i] = seconds[segment + 1]
+    } else {
+      const ratio = (i - startIndex) / (endIndex - startIndex)
+      timestamps[i] = seconds[segment] + ratio * (seconds[segment + 1] - seconds[segment])
+    }
+  }
+  return timestamps
+}
+
+// 解码 precision=float32/int16 的序列，与后端 decode_series 一致
+export async function decodeSeries(series: number[] | EncodedSeries): Promise<number[]> {
+  if (Array.isArray(series)) return series
+
+  let bytes = Uint8Array.from(atob(series.data), (char) => char.charCodeAt(0))
+  if (series.compression === 'zlib') {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'))
+    bytes = new Uint8Array(await new Response(stream).arrayBuffer())
+  }
+  const itemSize = series.encoding === 'int16' ? 2 : 4
+  if (series.shuffle) {
+    const plain = new Uint8Array(bytes.length)
+    for (let b = 0; b < itemSize; b++) {
+      for (let i = 0; i < series.count; i++) {
+        plain[i * itemSize + b] = bytes[b * series.count + i]
+      }
+    }
+    bytes = plain
+  }
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength)
+  const values = new Array<number>(series.count)
+
+  if (series.encoding === 'float32') {
+    for (let i = 0; i < series.count; i++) values[i] = view.getFloat32(i * 4, true)
+    return values
+  }
+
+  const quantized = new Int16Array(series.count)
+  for (let i = 0; i < series.count; i++) quantized[i] = view.getInt16(i * 2, true)
+  // 差分按 16 位回绕，逐阶累加时 Int16Array 自动回绕
+  for (let order = 0; order < (series.delta ?? 0); order++) {
+    for (let i = 1; i < series.count; i++) quantized[i] += quantized[i - 1]
+  }
+  const offset = series.offset ?? 0
+  const scale = series.scale ?? 1
+  for (let i = 0; i < series.count; i++) {
+    values[i] = quantized[i] === INT16_NAN ? Number.NaN : offset + quantized[i] * scale
+  }
+  return values
+}
 
 class FileService {
   async getFiles(): Promise<FileInfo[]> {
@@ -10,23 +138,278 @@ class FileService {
     return (await response.json()) as FileInfo[]
   }
 
-  async getTrials(fileId: string): Promise<TrialMetadata[]> {
-    const response = await apiClient.get(`/api/files/${fileId}/trials`, { timeout: 30000 } as any)
+  async getTrials(fileId: string, query: TrialQuery = {}): Promise<TrialMetadata[]> {
+    const params = new URLSearchParams()
+    if (query.offset) params.set('offset', String(query.offset))
+    if (query.limit) params.set('limit', String(query.limit))
+    if (query.fields?.length) params.set('fields', query.fields.join(','))
+    if (query.sort) params.set('sort', query.sort)
+    query.filters?.forEach((filter) => params.append('filter', filter))
+    const search = params.toString() ? `?${params.toString()}` : ''
+
+    const response = await apiClient.get(`/api/files/${fileId}/trials${search}`, { timeout: 30000 } as any)
     if (!response.ok) {
       throw new Error('获取试验元数据失败')
     }
     return (await response.json()) as TrialMetadata[]
   }
 
+  // 以NDJSON流式加载Trial，每解析出一批即回调，已缓存的Trial最先到达
+  async streamTrials(
+    fileId: string,
+    onTrials: (trials: TrialMetadata[]) => void,
+    options: TrialStreamOptions = {},
+  ): Promise<TrialStreamResult> {
+    const params = new URLSearchParams()
+    if (options.offset) params.set('offset', String(options.offset))
+    if (options.limit) params.set('limit', String(options.limit))
+    const query = params.toString() ? `?${params.toString()}` : ''
+
+    const response = await apiClient.get(`/api/files/${fileId}/trials/stream${query}`, {
+      signal: options.signal,
+      headers: { Accept: 'application/x-ndjson' },
+    })
+    if (response.status === 503) {
+      return { total: 0, busy: true, retryAfter: Number(response.headers.get('Retry-After') ?? 5) }
+    }
+    if (!response.ok || !response.body) {
+      throw new Error('获取试验元数据失败')
+    }
+
+    const result: TrialStreamResult = {
+      total: Number(response.headers.get('X-Trial-Count') ?? 0),
+      busy: false,
+    }
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+
+    const flush = (text: string) => {
+      const batch: TrialMetadata[] = []
+      for (const line of text.split('\n')) {
+        if (!line.trim()) continue
+        const item = JSON.parse(line)
+        if (item.error) {
+          console.warn(`Trial ${item.trialIndex} 加载失败: ${item.error}`)
+          continue
+        }
+        batch.push(item as TrialMetadata)
+      }
+      if (batch.length > 0) onTrials(batch)
+    }
+
+    for (;;) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+      const lastBreak = buffer.lastIndexOf('\n')
+      if (lastBreak >= 0) {
+        flush(buffer.slice(0, lastBreak))
+        buffer = buffer.slice(lastBreak + 1)
+      }
+    }
+    flush(buffer + decoder.decode())
+
+    return result
+  }
+
   async getWaveform(fileId: string, trialIndex: number): Promise<WaveformResponse> {
+    // 请求紧凑时间轴与 int16 量化数值 (误差远小于 1 像素)，在本地展开
     const response = await apiClient.get(
-      `/api/files/${fileId}/trials/${trialIndex}/waveform`,
+      `/api/files/${fileId}/trials/${trialIndex}/waveform?timestamps=compact&precision=int16&delta=1`,
       { timeout: 60000 } as any,
     )
     if (!response.ok) {
       throw new Error('获取波形数据失败')
     }
-    return (await response.json()) as WaveformResponse
+    const compact = (await response.json()) as CompactWaveformResponse
+    const timestamps = expandTimeAxis(compact.timeAxis)
+    const [raw, filtered] = await Promise.all([
+      decodeSeries(compact.raw.values),
+      decodeSeries(compact.filtered.values),
+    ])
+    return {
+      raw: { timestamps, values: raw },
+      filtered: { timestamps, values: filtered },
+      keypoints: compact.keypoints,
+    }
+  }
+
+  async getWaveformWindow(
+    fileId: string,
+    trialIndex: number,
+    query: WaveformWindowQuery = {},
+  ): Promise<WaveformWindowResponse> {
+    const params = new URLSearchParams({ precision: 'int16', delta: '1' })
+    if (query.start !== undefined) params.set('start', String(query.start))
+    if (query.end !== undefined) params.set('end', String(query.end))
+    if (query.maxPoints) params.set('max_points', String(Math.round(query.maxPoints)))
+    if (query.method) params.set('method', query.method)
+
+    const response = await apiClient.get(
+      `/api/files/${fileId}/trials/${trialIndex}/waveform?${params.toString()}`,
+      { signal: query.signal, timeout: 60000 } as any,
+    )
+    if (!response.ok) {
+      throw new Error('获取波形数据失败')
+    }
+    const windowed = (await response.json()) as WaveformWindowResponse
+    const [raw, filtered] = await Promise.all([
+      decodeSeries(windowed.raw.values),
+      decodeSeries(windowed.filtered.values),
+    ])
+    return {
+      ...windowed,
+      raw: { ...windowed.raw, values: raw },
+      filtered: { ...windowed.filtered, values: filtered },
+    }
+  }
+
+  // 一次请求多个Trial的视口波形 (NDJSON，按完成顺序)，每解析出一个Trial即回调；返回失败的Trial
+  async streamWaveforms(
+    fileId: string,
+    trialIndices: number[],
+    onWaveform: (trialIndex: number, waveform: WaveformWindowResponse) => void,
+    query: WaveformWindowQuery = {},
+  ): Promise<number[]> {
+    const response = await apiClient.post(
+      `/api/files/${fileId}/waveforms`,
+      {
+        trialIndices,
+        start: query.start,
+        end: query.end,
+        maxPoints: query.maxPoints ? Math.round(query.maxPoints) : undefined,
+        method: query.method,
+        precision: 'int16',
+        delta: 1,
+      },
+      { signal: query.signal, headers: { Accept: 'application/x-ndjson' } },
+    )
+    // 服务繁忙 (503) 时整批视为失败，由调用方稍后重试
+    if (response.status === 503) {
+      return [...trialIndices]
+    }
+    if (!response.ok || !response.body) {
+      throw new Error('获取波形数据失败')
+    }
+
+    const failed: number[] = []
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+
+    const flush = async (text: string) => {
+      for (const line of text.split('\n')) {
+        if (!line.trim()) continue
+        const item = JSON.parse(line)
+        if (item.error) {
+          console.warn(`Trial ${item.trialIndex} 波形加载失败: ${item.error}`)
+          failed.push(item.trialIndex)
+          continue
+        }
+        const [raw, filtered] = await Promise.all([decodeSeries(item.raw.values), decodeSeries(item.filtered.values)])
+        onWaveform(item.trialIndex, {
+          ...item,
+          raw: { ...item.raw, values: raw },
+          filtered: { ...item.filtered, values: filtered },
+        })
+      }
+    }
+
+    for (;;) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+      const lastBreak = buffer.lastIndexOf('\n')
+      if (lastBreak >= 0) {
+        const complete = buffer.slice(0, lastBreak)
+        buffer = buffer.slice(lastBreak + 1)
+        await flush(complete)
+      }
+    }
+    await flush(buffer + decoder.decode())
+
+    return failed
+  }
+
+  async getTileLayout(fileId: string, trialIndex: number): Promise<TileLayout> {
+    const response = await apiClient.get(`/api/files/${fileId}/trials/${trialIndex}/tiles`)
+    if (!response.ok) {
+      throw new Error('获取瓦片布局失败')
+    }
+    return (await response.json()) as TileLayout
+  }
+
+  // 瓦片地址带版本号，浏览器可永久缓存；版本过期 (409) 时需重新获取布局
+  async getTile(
+    fileId: string,
+    trialIndex: number,
+    layout: TileLayout,
+    level: number,
+    tileIndex: number,
+    signal?: AbortSignal,
+  ): Promise<WaveformTile> {
+    const response = await apiClient.get(
+      `/api/files/${fileId}/trials/${trialIndex}/tiles/${level}/${tileIndex}?v=${layout.version}&precision=int16&delta=1`,
+      { signal } as any,
+    )
+    if (!response.ok) {
+      throw new Error(response.status === 409 ? '瓦片版本已过期' : '获取波形瓦片失败')
+    }
+    const tile = (await response.json()) as WaveformTile
+    for (const series of [tile.raw, tile.filtered]) {
+      for (const field of ['values', 'min', 'max'] as const) {
+        if (series[field]) series[field] = await decodeSeries(series[field] as number[] | EncodedSeries)
+      }
+    }
+    return tile
+  }
+
+  // 接口需要令牌，<img> 无法直接引用，取回后转为 blob URL；带版本号的地址由浏览器永久缓存
+  async getSparklineSprite(
+    fileId: string,
+    offset: number,
+    limit: number,
+    size: { width?: number; height?: number; version?: string; signal?: AbortSignal } = {},
+  ): Promise<SparklineSprite> {
+    const width = size.width ?? 160
+    const height = size.height ?? 40
+    const params = new URLSearchParams({
+      offset: String(offset),
+      limit: String(limit),
+      width: String(width),
+      height: String(height),
+    })
+    if (size.version) params.set('v', size.version)
+    const response = await apiClient.get(`/api/files/${fileId}/sparklines?${params}`, { signal: size.signal } as any)
+    if (!response.ok) {
+      throw new Error(response.status === 409 ? '缩略图版本已过期' : '获取缩略图失败')
+    }
+    return {
+      url: URL.createObjectURL(await response.blob()),
+      offset,
+      count: Number(response.headers.get('X-Trial-Count') ?? limit),
+      width,
+      height,
+      version: response.headers.get('X-Content-Version') ?? '',
+      failed: (response.headers.get('X-Failed-Trials') ?? '').split(',').filter(Boolean).map(Number),
+    }
+  }
+
+  async getTrialSparkline(
+    fileId: string,
+    trialIndex: number,
+    width = 160,
+    height = 40,
+    format: 'png' | 'svg' = 'png',
+  ): Promise<string> {
+    const response = await apiClient.get(
+      `/api/files/${fileId}/trials/${trialIndex}/sparkline?width=${width}&height=${height}&format=${format}`,
+    )
+    if (!response.ok) {
+      throw new Error('获取缩略图失败')
+    }
+    return URL.createObjectURL(await response.blob())
   }
 
   async updateFileStatus(fileId: string, finished: boolean): Promise<void> {
@@ -15,6 +15,8 @@ interface WorkspaceState {
   // Trial列表
   trials: TrialMetadata[]
   trialsLoading: boolean
+  // 首批Trial已显示，其余仍在流式加载
+  trialsStreaming: boolean
   trialsError: string | null
 
   // 当前选中的Trial
@@ -41,6 +43,19 @@ function deriveFileStatus(trials: TrialMetadata[], fallbackTotal?: number) {
   }
 }
 
+const MAX_STREAM_ATTEMPTS = 3
+
+// 切换文件时中止上一个文件的流式加载
+let trialStreamController: AbortController | null = null
+
+function mergeTrials(current: TrialMetadata[], incoming: TrialMetadata[]) {
+  const byIndex = new Map(current.map((trial) => [trial.trialIndex, trial]))
+  for (const trial of incoming) {
+    byIndex.set(trial.trialIndex, trial)
+  }
+  return Array.from(byIndex.values()).sort((a, b) => a.trialIndex - b.trialIndex)
+}
+
 export const useWorkspaceStore = create<WorkspaceState>((set, get) => ({
   // 初始状态
   files: [],
@@ -51,6 +66,7 @@ export const useWorkspaceStore = create<WorkspaceState>((set, get) => ({
 
   trials: [],
   trialsLoading: false,
+  trialsStreaming: false,
   trialsError: null,
 
   selectedTrial: null,
@@ -79,19 +95,49 @@ export const useWorkspaceStore = create<WorkspaceState>((set, get) => ({
     }
   },
 
-  // 选择文件并加载其Trials
+  // 选择文件并流式加载其Trials，首批到达即结束加载状态
   selectFile: async (file: FileInfo) => {
+    trialStreamController?.abort()
+    const controller = new AbortController()
+    trialStreamController = controller
+
     set({
       selectedFile: file,
+      trials: [],
       trialsLoading: true,
+      trialsStreaming: true,
       trialsError: null,
       selectedTrial: null,
     })
 
+    const isCurrent = () => trialStreamController === controller
+
     try {
-      const trials = await fileService.getTrials(file.fileId)
+      for (let attempt = 1; ; attempt += 1) {
+        const result = await fileService.streamTrials(
+          file.fileId,
+          (batch) => {
+            if (!isCurrent()) return
+            set((state) => ({
+              trials: mergeTrials(state.trials, batch),
+              trialsLoading: false,
+            }))
+          },
+          { signal: controller.signal },
+        )
+
+        if (!isCurrent()) return
+        if (!result.busy) break
+        if (attempt >= MAX_STREAM_ATTEMPTS) {
+          throw new Error('服务繁忙，请稍后重试')
+        }
+        // 服务繁忙：等待后重新请求
+        await new Promise((resolve) => setTimeout(resolve, (result.retryAfter ?? 5) * 1000))
+        if (!isCurrent()) return
+      }
+
       set((state) => {
-        const status = deriveFileStatus(trials, file.trialCount)
+        const status = deriveFileStatus(state.trials, file.trialCount)
         const updatedFiles = state.files.map((item) =>
           item.fileId === file.fileId
             ? {
@@ -104,8 +150,8 @@ export const useWorkspaceStore = create<WorkspaceState>((set, get) => ({
         )
 
         return {
-          trials,
           trialsLoading: false,
+          trialsStreaming: false,
           files: updatedFiles,
           selectedFile: {
             ...file,
@@ -116,11 +162,15 @@ export const useWorkspaceStore = create<WorkspaceState>((set, get) => ({
         }
       })
     } catch (error) {
+      if (!isCurrent()) return
       set({
         trialsError: error instanceof Error ? error.message : 'Failed to load trials',
         trialsLoading: false,
+        trialsStreaming: false,
         trials: [],
       })
+    } finally {
+      if (isCurrent()) trialStreamController = null
     }
   },
 
@@ -138,10 +188,13 @@ export const useWorkspaceStore = create<WorkspaceState>((set, get) => ({
 
   // 清除选择
   clearSelection: () => {
+    trialStreamController?.abort()
+    trialStreamController = null
     set({
       selectedFile: null,
       selectedTrial: null,
       trials: [],
+      trialsStreaming: false,
     })
   },
 
@@ -30,6 +30,19 @@ export interface TrialMetadata {
   finishedAt?: string
   annotationCount?: number
   versionCount?: number
+  features?: TrialFeatures
+  // 按特征排序/筛选时尚未计算特征，排在已排序结果之后
+  featuresPending?: boolean
+}
+
+// Trial特征向量，用于列表排序与筛选
+export interface TrialFeatures {
+  rms: number
+  peakToPeak: number
+  dominantFrequency: number
+  keypointCount: number
+  saturationFraction: number
+  flatlineFraction: number
 }
 
 // 波形数据
@@ -38,6 +51,78 @@ export interface WaveformData {
   values: number[]
 }
 
+// 紧凑时间轴：等间隔采样只返回 t0 与采样率，否则返回断点 (采样下标 -> 秒)
+export type CompactTimeAxis =
+  | { type: 'uniform'; count: number; t0: number; sampleRate: number }
+  | { type: 'breakpoints'; count: number; indices: number[]; seconds: number[] }
+
+// precision=float32/int16 时的编码序列 (base64，可选字节重排 + zlib)
+export interface EncodedSeries {
+  encoding: 'float32' | 'int16'
+  count: number
+  compression: 'zlib' | 'none'
+  shuffle: boolean
+  data: string
+  offset?: number
+  scale?: number
+  delta?: number
+  error: { maxAbsError: number; rmsError: number; errorBound: number; relativeError: number }
+}
+
+// timestamps=compact 时的波形响应
+export interface CompactWaveformResponse {
+  timeAxis: CompactTimeAxis
+  raw: { values: number[] | EncodedSeries }
+  filtered: { values: number[] | EncodedSeries }
+  keypoints: number[]
+}
+
+// 视口波形中的一条序列：indices 为所选采样在整个Trial中的下标
+export interface WaveformWindowSeries {
+  indices: number[]
+  timestamps: number[]
+  values: number[] | EncodedSeries
+}
+
+// start/end/max_points 视口波形响应
+export interface WaveformWindowResponse {
+  raw: WaveformWindowSeries
+  filtered: WaveformWindowSeries
+  keypoints: number[]
+  window: {
+    start: number | null
+    end: number | null
+    startIndex: number
+    endIndex: number
+    totalPoints: number
+    windowPoints: number
+    downsampled: boolean
+    method: 'lttb' | 'm4' | null
+  }
+}
+
+// 瓦片布局：第 0 层逐采样，第 k 层每点覆盖 factor^k 个采样
+export interface TileLayout {
+  version: string
+  length: number
+  factor: number
+  tilePoints: number
+  levels: { level: number; samplesPerPoint: number; points: number; tiles: number }[]
+}
+
+// 金字塔瓦片：timeAxis 以瓦片起始采样为原点，第 j 个点对应第 j * samplesPerPoint 个采样
+export interface WaveformTile {
+  level: number
+  tileIndex: number
+  samplesPerPoint: number
+  startIndex: number
+  endIndex: number
+  count: number
+  timeAxis: CompactTimeAxis
+  raw: { values?: number[]; min?: number[]; max?: number[] }
+  filtered: { values?: number[]; min?: number[]; max?: number[] }
+}
+
 // 完整波形响应
 export interface WaveformResponse {
   raw: WaveformData